@@ -11,6 +11,7 @@ import pandas as pd
 from datetime import datetime, date
 import sys
 import os
+import threading
 
 # Add the modules directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
@@ -20,8 +21,11 @@ from modules.database import (
     init_database, add_patient, search_patients, get_patient_by_id,
     add_visit, get_patient_visits, get_all_patients, update_patient,
     get_database_stats, get_patient_weight_progression, format_date_for_display,
-    format_date_for_storage, get_today_formatted
+    format_date_for_storage, get_today_formatted, get_connection, get_data_version,
+    get_recent_patients
 )
+from modules.visit_timeline import visit_timeline_records
+from modules.vitals import get_vitals_series
 
 # Page configuration
 st.set_page_config(
@@ -109,6 +113,76 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# ==========================================
+# CACHED DATA ACCESS
+# ==========================================
+# Streamlit reruns the whole script on every widget interaction. Clinic data is cached keyed on
+# the database data version, the latest change-log sequence number (triggers log every patient/visit
+# write): a rerun after a write reloads, every other rerun is served from memory.
+
+@st.cache_resource
+def get_version_reader():
+    """Initialize the database once per server process; keep a shared connection for version checks"""
+    success, message = init_database()
+    if not success:
+        raise RuntimeError(message)
+    return get_connection(check_same_thread=False), threading.Lock()
+
+def current_data_version() -> int:
+    """Current data version (a single small-table read on the shared connection)"""
+    conn, lock = get_version_reader()
+    with lock:
+        return get_data_version(conn)
+
+@st.cache_data(max_entries=4)
+def _cached_stats(data_version: int):
+    return get_database_stats()
+
+@st.cache_data(max_entries=4)
+def _cached_recent_patients(data_version: int, limit: int):
+    return [patient.to_dict() for patient in get_recent_patients(limit)]
+
+@st.cache_data(max_entries=2)
+def _cached_all_patients(data_version: int):
+    return [patient.to_dict() for patient in get_all_patients()]
+
+@st.cache_data(max_entries=64)
+def _cached_search(data_version: int, search_term: str):
+    return [patient.to_dict() for patient in search_patients(search_term)]
+
+@st.cache_data(max_entries=64)
+def _cached_visit_timeline(data_version: int, patient_id: int):
+    return visit_timeline_records(get_patient_visits(patient_id))
+
+@st.cache_data(max_entries=64)
+def _cached_vitals_series(data_version: int, patient_id: int, metric: str):
+    return get_vitals_series(patient_id, metric)
+
+@st.cache_data(max_entries=64)
+def _cached_weight_progression(data_version: int, patient_id: int):
+    return get_patient_weight_progression(patient_id)
+
+def load_stats():
+    return _cached_stats(current_data_version())
+
+def load_recent_patients(limit: int = 5):
+    return _cached_recent_patients(current_data_version(), limit)
+
+def load_all_patients():
+    return _cached_all_patients(current_data_version())
+
+def load_search_results(search_term: str):
+    return _cached_search(current_data_version(), search_term)
+
+def load_visit_timeline(patient_id: int):
+    return _cached_visit_timeline(current_data_version(), patient_id)
+
+def load_vitals_series(patient_id: int, metric: str):
+    return _cached_vitals_series(current_data_version(), patient_id, metric)
+
+def load_weight_progression(patient_id: int):
+    return _cached_weight_progression(current_data_version(), patient_id)
+
 def init_session_state():
     """Initialize session state variables"""
     if 'selected_patient' not in st.session_state:
@@ -120,14 +194,8 @@ def show_dashboard():
     """Display the main dashboard"""
     st.markdown('<div class="main-header">🌿 Ayurvedic Clinic Management System</div>', unsafe_allow_html=True)
     
-    # Initialize database
-    success, message = init_database()
-    if not success:
-        st.error(f"Database Error: {message}")
-        return
-    
-    # Get and display statistics
-    stats = get_database_stats()
+    # Get and display statistics (database is initialized once per process in get_version_reader)
+    stats = load_stats()
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -149,10 +217,8 @@ def show_dashboard():
     st.markdown('<div class="sub-header">Recent Activity</div>', unsafe_allow_html=True)
     
     # Show recent patients
-    patients = get_all_patients()
-    if patients:
-        recent_patients = sorted(patients, key=lambda x: x['created_date'], reverse=True)[:5]
-        
+    recent_patients = load_recent_patients(5)
+    if recent_patients:
         st.subheader("Recently Added Patients")
         for patient in recent_patients:
             with st.container():
@@ -236,7 +302,7 @@ def search_and_select_patient():
                                placeholder="Enter patient name or phone number")
     
     if search_term:
-        patients = search_patients(search_term)
+        patients = load_search_results(search_term)
         
         if patients:
             st.success(f"Found {len(patients)} patient(s)")
@@ -268,7 +334,7 @@ def search_and_select_patient():
     
     # Show all patients option
     if st.checkbox("Show all patients"):
-        all_patients = get_all_patients()
+        all_patients = load_all_patients()
         if all_patients:
             st.info(f"Total patients: {len(all_patients)}")
             
@@ -386,7 +452,8 @@ def show_visit_history(patient_id):
     """Display visit history for a patient"""
     st.subheader("Visit History")
     
-    visits = get_patient_visits(patient_id)
+    # Visit numbers, gaps and weight changes come precomputed from modules/visit_timeline.py
+    visits = load_visit_timeline(patient_id)
     
     if visits:
         st.info(f"Total visits: {len(visits)}")
@@ -406,11 +473,8 @@ def show_visit_history(patient_id):
         st.markdown("---")
         
         for i, visit in enumerate(visits):
-            visit_number = len(visits) - i
-            is_return_visit = i < len(visits) - 1
-            
             with st.expander(
-                f"{'🔄 Return ' if is_return_visit else '🆕 First '}Visit #{visit_number} - {visit['visit_date_formatted']}", 
+                f"{'🔄 Return ' if visit['is_return_visit'] else '🆕 First '}Visit #{visit['visit_number']} - {visit['visit_date_formatted']}", 
                 expanded=(i==0)
             ):
                 col1, col2 = st.columns(2)
@@ -427,20 +491,14 @@ def show_visit_history(patient_id):
                     if visit['weight']:
                         # Show weight change if it's a return visit
                         weight_text = f"{visit['weight']} kg"
-                        if i < len(visits) - 1:  # Not the first visit
-                            prev_weight = None
-                            for j in range(i + 1, len(visits)):
-                                if visits[j]['weight']:
-                                    prev_weight = visits[j]['weight']
-                                    break
-                            if prev_weight:
-                                change = visit['weight'] - prev_weight
-                                if change > 0:
-                                    weight_text += f" (+{change:.1f} kg ⬆️)"
-                                elif change < 0:
-                                    weight_text += f" ({change:.1f} kg ⬇️)"
-                                else:
-                                    weight_text += " (No change ➡️)"
+                        change = visit['weight_change']
+                        if change is not None:
+                            if change > 0:
+                                weight_text += f" (+{change:.1f} kg ⬆️)"
+                            elif change < 0:
+                                weight_text += f" ({change:.1f} kg ⬇️)"
+                            else:
+                                weight_text += " (No change ➡️)"
                         st.write(f"**⚖️ Weight:** {weight_text}")
                     
                     if visit['blood_pressure']:
@@ -452,11 +510,8 @@ def show_visit_history(patient_id):
                     st.write(f"**📝 Additional Notes:** {visit['notes']}")
                 
                 # Show time since last visit for return visits
-                if i < len(visits) - 1:
-                    current_date = datetime.strptime(visit['visit_date'], '%Y-%m-%d')
-                    prev_date = datetime.strptime(visits[i + 1]['visit_date'], '%Y-%m-%d')
-                    days_between = (current_date - prev_date).days
-                    st.caption(f"⏱️ {days_between} days since previous visit")
+                if visit['days_since_previous'] is not None:
+                    st.caption(f"⏱️ {visit['days_since_previous']} days since previous visit")
     else:
         st.info("No visits recorded yet. Add the first visit above.")
 
@@ -464,19 +519,33 @@ def show_weight_progress(patient_id):
     """Display weight progression for a patient"""
     st.subheader("Weight Progress")
     
-    weight_records = get_patient_weight_progression(patient_id)
+    weight_records = load_weight_progression(patient_id)
     
     if weight_records:
         st.info(f"Total weight records: {len(weight_records)}")
         
-        # Create a DataFrame for better display
-        df = pd.DataFrame(weight_records)
-        
-        # Display as a chart if we have multiple records
-        if len(weight_records) > 1:
+        # Chart the downsampled visit series (at most a few hundred points however long the history)
+        series = load_vitals_series(patient_id, 'weight')
+        if len(series['points']) > 1:
             st.subheader("Weight Trend Chart")
-            df['date'] = pd.to_datetime(df['date'])
-            st.line_chart(data=df.set_index('date')['weight'])
+            stats = series['stats']
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Change", f"{stats['change']:+.1f} kg")
+            col2.metric("Trend", f"{stats['slope_per_30_days']:+.2f} kg / month" if stats['slope_per_30_days'] is not None else "N/A")
+            col3.metric("Range", f"{stats['min']:.1f} - {stats['max']:.1f} kg")
+            chart = pd.DataFrame(series['points'])
+            chart['date'] = pd.to_datetime(chart['date'])
+            chart['moving average'] = series['moving_average']
+            st.line_chart(data=chart.set_index('date')[['value', 'moving average']])
+        
+        systolic = load_vitals_series(patient_id, 'systolic')
+        if len(systolic['points']) > 1:
+            diastolic = load_vitals_series(patient_id, 'diastolic')
+            st.subheader("Blood Pressure Trend")
+            bp = pd.DataFrame(systolic['points']).rename(columns={'value': 'systolic'})
+            bp = bp.merge(pd.DataFrame(diastolic['points']).rename(columns={'value': 'diastolic'}), on='date', how='outer')
+            bp['date'] = pd.to_datetime(bp['date'])
+            st.line_chart(data=bp.sort_values('date').set_index('date'))
         
         # Display detailed records
         st.subheader("Weight Records")
@@ -554,6 +623,12 @@ def main():
     """Main application function"""
     init_session_state()
     
+    try:
+        current_data_version()
+    except RuntimeError as e:
+        st.error(f"Database Error: {str(e)}")
+        st.stop()
+    
     # Sidebar navigation
     st.sidebar.image("https://via.placeholder.com/200x100/2E8B57/FFFFFF?text=Ayurvedic+Clinic", 
                      caption="Clinic Management System")
@@ -579,7 +654,7 @@ def main():
     # Quick stats in sidebar
     st.sidebar.markdown("---")
     st.sidebar.subheader("Quick Stats")
-    stats = get_database_stats()
+    stats = load_stats()
     st.sidebar.metric("Total Patients", stats['total_patients'])
     st.sidebar.metric("Total Visits", stats['total_visits'])
     
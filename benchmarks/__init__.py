@@ -0,0 +1,8 @@
+"""
+Benchmarks for Ayurvedic Clinic Management System
+Synthetic clinic data plus timing/memory runs of the database and backup modules
+
+Usage:
+    python -m benchmarks.run --patients 2000 --visits 12000 --json results.json
+    python -m benchmarks.run --compare results.json
+"""
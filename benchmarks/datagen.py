@@ -0,0 +1,196 @@
+"""
+Synthetic clinic data generator
+Builds a realistic clinic database (Indian names, chronic and one-off visit patterns) for benchmarks
+"""
+
+import random
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from modules import database
+
+# Given names with rough relative frequencies (most common first)
+MALE_NAMES = [
+    ('Rajesh', 30), ('Amit', 28), ('Suresh', 26), ('Ramesh', 25), ('Mahesh', 22), ('Rahul', 22),
+    ('Sanjay', 20), ('Vijay', 20), ('Anil', 18), ('Sunil', 18), ('Deepak', 16), ('Manoj', 16),
+    ('Harshad', 10), ('Nitin', 12), ('Prakash', 12), ('Kiran', 10), ('Arjun', 9), ('Rohan', 9),
+    ('Vikram', 8), ('Aditya', 8), ('Karthik', 7), ('Venkatesh', 7), ('Imran', 6), ('Gurpreet', 5),
+    ('Bhavesh', 5), ('Jignesh', 5), ('Hitesh', 5), ('Mohan', 6), ('Ganesh', 6), ('Arvind', 5)
+]
+FEMALE_NAMES = [
+    ('Priya', 30), ('Sunita', 26), ('Anita', 25), ('Pooja', 24), ('Neha', 22), ('Kavita', 20),
+    ('Rekha', 18), ('Meena', 18), ('Asha', 16), ('Geeta', 16), ('Lakshmi', 14), ('Savita', 14),
+    ('Shobha', 12), ('Nirmala', 12), ('Jyoti', 12), ('Divya', 10), ('Sneha', 10), ('Anjali', 10),
+    ('Hetal', 7), ('Komal', 7), ('Fatima', 6), ('Harpreet', 5), ('Bhavna', 6), ('Radha', 6),
+    ('Usha', 8), ('Kamala', 6), ('Swati', 7), ('Mansi', 5), ('Ritu', 6), ('Parul', 5)
+]
+SURNAMES = [
+    ('Patel', 40), ('Shah', 30), ('Sharma', 28), ('Singh', 26), ('Kumar', 24), ('Desai', 18),
+    ('Mehta', 16), ('Joshi', 16), ('Agrawal', 14), ('Gupta', 14), ('Rao', 12), ('Reddy', 12),
+    ('Iyer', 8), ('Nair', 8), ('Pillai', 6), ('Verma', 10), ('Yadav', 10), ('Chauhan', 8),
+    ('Trivedi', 8), ('Pandya', 7), ('Parmar', 7), ('Solanki', 6), ('Bhatt', 7), ('Khan', 8),
+    ('Kulkarni', 6), ('Deshmukh', 5), ('Banerjee', 5), ('Das', 6), ('Gill', 4), ('Chaudhary', 6)
+]
+
+CONDITIONS = [
+    None, None, None, 'Diabetes', 'Hypertension', 'Arthritis', 'Obesity', 'Thyroid',
+    'Acidity', 'Asthma', 'PCOD', 'Migraine', 'Diabetes, Hypertension', 'Skin allergy'
+]
+SYMPTOMS = [
+    'Joint pain', 'Acidity and bloating', 'Fatigue', 'Headache', 'Knee pain', 'Back pain',
+    'Indigestion', 'Cough and cold', 'Skin rash', 'Insomnia', 'Constipation', 'Hair fall',
+    'Weight gain', 'Anxiety', 'Irregular periods', 'Sugar levels high'
+]
+MEDICINES = [
+    'Triphala churna 1 tsp at night', 'Ashwagandha 500mg twice daily', 'Chyawanprash 1 tsp morning',
+    'Giloy ghan vati 2 tabs', 'Yograj guggulu 2 tabs twice daily', 'Avipattikar churna before meals',
+    'Brahmi vati at bedtime', 'Sitopaladi churna with honey', 'Arjuna ksheerapaka',
+    'Mahanarayan oil for massage', 'Punarnava mandur 2 tabs', 'Kaishore guggulu twice daily'
+]
+DIET_NOTES = [
+    'Avoid fried and oily food', 'Warm water through the day', 'No curd at night',
+    'Light dinner before 8 pm', 'Include moong dal and khichdi', 'Reduce sugar and maida',
+    'Seasonal fruits, avoid cold drinks', None
+]
+
+# Visit patterns: (weight, number of visits range, days between visits range)
+VISIT_PATTERNS = {
+    'one_off': (40, (1, 1), (0, 0)),
+    'short_course': (30, (2, 4), (7, 21)),
+    'chronic': (20, (6, 30), (14, 45)),
+    'occasional': (10, (2, 6), (60, 240))
+}
+
+def _weighted(rng: random.Random, pairs):
+    names = [name for name, _ in pairs]
+    weights = [weight for _, weight in pairs]
+    return lambda: rng.choices(names, weights)[0]
+
+def generate_patients(count: int, rng: random.Random, start: date, end: date) -> List[Dict]:
+    """Generate patient dicts with unique phones and registration dates in [start, end]"""
+    male, female, surname = _weighted(rng, MALE_NAMES), _weighted(rng, FEMALE_NAMES), _weighted(rng, SURNAMES)
+    span = max((end - start).days, 1)
+    phones = set()
+    patients = []
+
+    for _ in range(count):
+        gender = rng.choices(['Female', 'Male', 'Other'], [52, 47, 1])[0]
+        first = female() if gender == 'Female' else male()
+        phone = None
+        while phone is None or phone in phones:
+            phone = str(rng.choice('6789')) + ''.join(rng.choice('0123456789') for _ in range(9))
+        phones.add(phone)
+
+        patients.append({
+            'name': f"{first} {surname()}",
+            'age': min(95, max(1, int(rng.gauss(42, 16)))),
+            'gender': gender,
+            'phone': phone,
+            'weight': round(min(140, max(8, rng.gauss(68, 14))), 1),
+            'conditions': rng.choice(CONDITIONS),
+            'created_date': (start + timedelta(days=rng.randrange(span))).strftime('%Y-%m-%d')
+        })
+    return patients
+
+def generate_visits(patients: List[Dict], visit_count: int, rng: random.Random, end: date) -> List[Dict]:
+    """
+    Spread roughly visit_count visits over the patients following VISIT_PATTERNS
+    Patients are referenced by their position in the list (patient_index)
+    """
+    patterns = list(VISIT_PATTERNS.items())
+    pattern_weights = [spec[0] for _, spec in patterns]
+    visits = []
+
+    # Assign each patient a pattern, then scale visit numbers to hit the requested total
+    plans = []
+    for index in range(len(patients)):
+        _, (_, count_range, gap_range) = rng.choices(patterns, pattern_weights)[0]
+        plans.append((index, rng.randint(*count_range), gap_range))
+    planned = sum(count for _, count, _ in plans) or 1
+    scale = visit_count / planned
+
+    for index, count, gap_range in plans:
+        patient = patients[index]
+        count = max(1, round(count * scale))
+        visit_day = date.fromisoformat(patient['created_date'])
+        weight = patient['weight']
+        systolic = rng.randint(110, 160)
+
+        for _ in range(count):
+            if visit_day > end:
+                break
+            weight = round(weight + rng.uniform(-1.2, 0.8), 1)
+            systolic = min(190, max(95, systolic + rng.randint(-6, 5)))
+            visits.append({
+                'patient_index': index,
+                'visit_date': visit_day.strftime('%Y-%m-%d'),
+                'symptoms': rng.choice(SYMPTOMS),
+                'medicines': ', '.join(rng.sample(MEDICINES, rng.randint(1, 3))),
+                'diet_notes': rng.choice(DIET_NOTES),
+                'weight': weight,
+                'blood_pressure': f"{systolic}/{systolic - rng.randint(35, 50)}",
+                'notes': None if rng.random() < 0.6 else 'Review after two weeks'
+            })
+            visit_day += timedelta(days=rng.randint(max(1, gap_range[0]), max(1, gap_range[1])))
+
+    return visits[:visit_count] if len(visits) > visit_count else visits
+
+def generate_clinic(db_path: str, patients: int = 1000, visits: int = 6000, years: int = 3,
+                    deleted_fraction: float = 0.02, seed: Optional[int] = 42) -> Dict:
+    """
+    Create a clinic database at db_path filled with synthetic patients and visits
+    Returns: summary dict with counts and the generated patient ids
+    """
+    rng = random.Random(seed)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+
+    original_path = database.DB_PATH
+    database.DB_PATH = db_path
+    try:
+        success, message = database.init_database()
+    finally:
+        database.DB_PATH = original_path
+    if not success:
+        raise RuntimeError(message)
+
+    patient_rows = generate_patients(patients, rng, start, end)
+    visit_rows = generate_visits(patient_rows, visits, rng, end)
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO patients (name, age, gender, phone, weight, conditions, created_date, updated_date)
+            VALUES (:name, :age, :gender, :phone, :weight, :conditions, :created_date, :created_date)
+        ''', patient_rows)
+        cursor.execute("SELECT patient_id FROM patients ORDER BY patient_id")
+        patient_ids = [row[0] for row in cursor.fetchall()]
+
+        for visit in visit_rows:
+            visit['patient_id'] = patient_ids[visit['patient_index']]
+        cursor.executemany('''
+            INSERT INTO visits (patient_id, visit_date, symptoms, medicines, diet_notes, weight,
+                                blood_pressure, notes)
+            VALUES (:patient_id, :visit_date, :symptoms, :medicines, :diet_notes, :weight,
+                    :blood_pressure, :notes)
+        ''', visit_rows)
+
+        deleted_ids = rng.sample(patient_ids, int(len(patient_ids) * deleted_fraction))
+        cursor.executemany("UPDATE patients SET is_deleted = 1 WHERE patient_id = ?",
+                           [(patient_id,) for patient_id in deleted_ids])
+        database.index_new_visit_terms(cursor, 0)
+        database.index_new_vitals(cursor, 0)
+        database.index_new_followups(cursor, 0)
+    conn.close()
+
+    return {
+        'patients': len(patient_rows),
+        'visits': len(visit_rows),
+        'deleted_patients': len(deleted_ids),
+        'patient_ids': patient_ids,
+        'active_patient_ids': sorted(set(patient_ids) - set(deleted_ids)),
+        'names': [row['name'] for row in patient_rows],
+        'phones': [row['phone'] for row in patient_rows]
+    }
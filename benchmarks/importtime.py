@@ -0,0 +1,141 @@
+"""
+Cold-start report for the web app
+Runs fresh interpreters with python -X importtime, reports the slowest imports and the time from
+process start to the first served request, and checks it against a budget
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.datagen import generate_clinic
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the app (with data files redirected to LOADTEST_WORKDIR) and serves one page
+COLD_START_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+from benchmarks.loadtest_app import app
+imported = time.perf_counter()
+response = app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_request_ms': (served - imported) * 1000,
+                  'status': response.status_code}))
+'''
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse -X importtime output into [{'module', 'self_us', 'cumulative_us', 'depth'}]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entries.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': (len(name) - len(name.lstrip())) // 2
+        })
+    return entries
+
+def run_cold_start(workdir: str) -> Dict:
+    """One fresh interpreter: wall time to first response plus its import timings"""
+    env = dict(os.environ, LOADTEST_WORKDIR=workdir, PYTHONPATH=PROJECT_ROOT, PYTHONDONTWRITEBYTECODE='')
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', COLD_START_SCRIPT],
+                            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_ms'] = wall_ms
+    timings['imports'] = parse_importtime(result.stderr)
+    return timings
+
+def summarize_imports(runs: List[Dict], top: int = 15) -> Dict:
+    """Median self/cumulative time per module across runs, plus totals per top-level package"""
+    per_module = {}
+    for run in runs:
+        for entry in run['imports']:
+            stats = per_module.setdefault(entry['module'], {'self': [], 'cumulative': [], 'depth': entry['depth']})
+            stats['self'].append(entry['self_us'])
+            stats['cumulative'].append(entry['cumulative_us'])
+
+    modules = [{
+        'module': name,
+        'self_ms': round(statistics.median(stats['self']) / 1000, 2),
+        'cumulative_ms': round(statistics.median(stats['cumulative']) / 1000, 2),
+        'depth': stats['depth']
+    } for name, stats in per_module.items()]
+
+    packages = {}
+    for entry in modules:
+        package = entry['module'].split('.')[0]
+        packages[package] = packages.get(package, 0) + entry['self_ms']
+
+    return {
+        'slowest_self': sorted(modules, key=lambda m: m['self_ms'], reverse=True)[:top],
+        'slowest_cumulative': sorted((m for m in modules if m['module'].split('.')[0] in ('modules', 'flask_app',
+                                                                                          'config')),
+                                     key=lambda m: m['cumulative_ms'], reverse=True)[:top],
+        'packages': dict(sorted(((name, round(ms, 2)) for name, ms in packages.items()),
+                                key=lambda item: item[1], reverse=True)[:top])
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Measure web app cold start and import times')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to start')
+    parser.add_argument('--top', type=int, default=15, help='modules to list')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='exit 1 if the median time from process start to first response exceeds this')
+    parser.add_argument('--json', dest='json_path', help='write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='clinic_coldstart_')
+    try:
+        generate_clinic(os.path.join(workdir, 'clinic.db'), patients=50, visits=200)
+        run_cold_start(workdir)  # first run also writes bytecode caches; not counted
+        runs = [run_cold_start(workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'process_ms': round(statistics.median(r['process_ms'] for r in runs), 1),
+        'import_ms': round(statistics.median(r['import_ms'] for r in runs), 1),
+        'first_request_ms': round(statistics.median(r['first_request_ms'] for r in runs), 1),
+        'runs': args.runs,
+        **summarize_imports(runs, args.top)
+    }
+
+    print(f"Cold start (median of {args.runs}): process start to first response {report['process_ms']} ms")
+    print(f"  app import {report['import_ms']} ms, first request {report['first_request_ms']} ms")
+    print("\nTime by top-level package (self, ms):")
+    for package, ms in report['packages'].items():
+        print(f"  {package:<28}{ms:>9.2f}")
+    print("\nSlowest app modules (cumulative, ms):")
+    for entry in report['slowest_cumulative']:
+        print(f"  {entry['module']:<28}{entry['cumulative_ms']:>9.2f}")
+    print("\nSlowest imports overall (self, ms):")
+    for entry in report['slowest_self']:
+        print(f"  {entry['module']:<40}{entry['self_ms']:>9.2f}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+    if args.budget_ms is not None and report['process_ms'] > args.budget_ms:
+        print(f"\nCold start {report['process_ms']} ms exceeds the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+HTTP load test for the Flask routes
+Starts the app under gunicorn against a seeded clinic, replays a reception workflow mix from
+concurrent logged-in users and reports throughput, latency percentiles and errors per route
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from benchmarks.datagen import SYMPTOMS, MEDICINES, generate_clinic
+from benchmarks.run import percentile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Credentials the spawned server is started with
+LOADTEST_MOBILE = '9999999999'
+LOADTEST_PIN = '4321'
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Measure each request on its own: redirects are returned, not followed"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class ClinicClient:
+    """One receptionist: a cookie-carrying HTTP client bound to the server"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, path: str, data: Optional[Dict] = None):
+        """Returns (status, location header); network errors raise"""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, body, timeout=self.timeout) as response:
+                response.read()
+                return response.status, response.headers.get('Location', '')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('Location', '')
+
+    def login(self, mobile: str, pin: str) -> bool:
+        status, location = self.request('/login', {'mobile': mobile, 'pin': pin})
+        return status == 302 and '/dashboard' in location
+
+class Recorder:
+    """Thread-safe latency/error collection per route"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, route: str, seconds: float, status: Optional[int], ok: bool):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            key = f"{route}|{status or 'network'}"
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+# Workflow steps: each returns (status, location) and decides itself what counts as success
+def _dashboard(client: ClinicClient, ctx: Dict, rng: random.Random):
+    return client.request('/dashboard'), (200,)
+
+def _search(client: ClinicClient, ctx: Dict, rng: random.Random):
+    name = rng.choice(ctx['names'])
+    term = rng.choice([name.split()[0][:4], name.split()[-1], rng.choice(ctx['phones'])[:5]])
+    return client.request('/search?' + urllib.parse.urlencode({'q': term})), (200,)
+
+def _patient_details(client: ClinicClient, ctx: Dict, rng: random.Random):
+    return client.request(f"/patient/{rng.choice(ctx['patient_ids'])}"), (200,)
+
+def _add_visit(client: ClinicClient, ctx: Dict, rng: random.Random):
+    patient_id = rng.choice(ctx['patient_ids'])
+    systolic = rng.randint(110, 160)
+    form = {
+        'visit_date': date.today().strftime('%Y-%m-%d'),
+        'symptoms': rng.choice(SYMPTOMS),
+        'medicines': rng.choice(MEDICINES),
+        'diet_notes': 'Warm water through the day',
+        'weight': round(rng.uniform(45, 95), 1),
+        'blood_pressure': f"{systolic}/{systolic - 40}",
+        'notes': ''
+    }
+    return client.request(f"/add_visit/{patient_id}", form), (302,)
+
+def _all_patients(client: ClinicClient, ctx: Dict, rng: random.Random):
+    return client.request('/all_patients'), (200,)
+
+def _patient_info(client: ClinicClient, ctx: Dict, rng: random.Random):
+    return client.request(f"/api/patient_info/{rng.choice(ctx['patient_ids'])}"), (200,)
+
+# Reception workflow mix: (route name, relative weight, step)
+WORKFLOW_MIX = [
+    ('dashboard', 30, _dashboard),
+    ('search', 25, _search),
+    ('patient_details', 25, _patient_details),
+    ('add_visit', 10, _add_visit),
+    ('all_patients', 5, _all_patients),
+    ('api_patient_info', 5, _patient_info),
+]
+
+def _virtual_user(base_url: str, ctx: Dict, recorder: Recorder, start_barrier: threading.Barrier,
+                  deadline_holder: List[float], think_seconds: float, seed: int, credentials):
+    rng = random.Random(seed)
+    client = ClinicClient(base_url)
+    names = [name for name, _, _ in WORKFLOW_MIX]
+    weights = [weight for _, weight, _ in WORKFLOW_MIX]
+    steps = {name: step for name, _, step in WORKFLOW_MIX}
+
+    started = time.perf_counter()
+    try:
+        logged_in = client.login(*credentials)
+    except OSError:
+        logged_in = False
+    recorder.record('login', time.perf_counter() - started, 302 if logged_in else None, logged_in)
+    start_barrier.wait()
+    if not logged_in:
+        return
+
+    while time.perf_counter() < deadline_holder[0]:
+        route = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            (status, location), expected = steps[route](client, ctx, rng)
+            # A redirect to the login page means the session was lost
+            ok = status in expected and '/login' not in location
+        except OSError:
+            status, ok = None, False
+        recorder.record(route, time.perf_counter() - started, status, ok)
+        if think_seconds:
+            time.sleep(rng.expovariate(1 / think_seconds))
+
+def run_load(base_url: str, ctx: Dict, users: int = 10, duration: float = 30.0, think_ms: float = 0.0,
+             credentials=(LOADTEST_MOBILE, LOADTEST_PIN), seed: int = 7) -> Dict:
+    """
+    Drive `users` concurrent receptionists for `duration` seconds after they have all logged in
+    Returns: per-route report dict
+    """
+    recorder = Recorder()
+    barrier = threading.Barrier(users + 1)
+    deadline_holder = [float('inf')]
+    threads = [
+        threading.Thread(target=_virtual_user, daemon=True,
+                         args=(base_url, ctx, recorder, barrier, deadline_holder, think_ms / 1000.0,
+                               seed + index, credentials))
+        for index in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Everyone is logged in before the clock starts
+    barrier.wait()
+    measure_started = time.perf_counter()
+    deadline_holder[0] = measure_started + duration
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - measure_started
+
+    return build_report(recorder, elapsed)
+
+def build_report(recorder: Recorder, elapsed: float) -> Dict:
+    routes = {}
+    total_requests = total_errors = 0
+    for route, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        errors = recorder.errors.get(route, 0)
+        routes[route] = {
+            'requests': len(latencies),
+            'requests_per_second': round(len(latencies) / elapsed, 2) if route != 'login' else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'errors': errors,
+            'error_rate': round(errors / len(latencies), 4)
+        }
+        if route != 'login':
+            total_requests += len(latencies)
+            total_errors += errors
+
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'total_requests': total_requests,
+        'requests_per_second': round(total_requests / elapsed, 2) if elapsed else 0,
+        'error_rate': round(total_errors / total_requests, 4) if total_requests else 0,
+        'routes': routes,
+        'statuses': dict(sorted(recorder.statuses.items()))
+    }
+
+def context_from_database(db_path: str) -> Dict:
+    """Patient ids, names and phones of an existing clinic database (for --url runs)"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT patient_id, name, phone FROM patients "
+                        "WHERE is_deleted = 0 OR is_deleted IS NULL").fetchall()
+    conn.close()
+    if not rows:
+        raise RuntimeError(f"No patients found in {db_path}")
+    return {'patient_ids': [row[0] for row in rows], 'names': [row[1] for row in rows],
+            'phones': [row[2] for row in rows]}
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(workdir: str, server: str, port: int, workers: Optional[int] = None,
+                 threads: Optional[int] = None, gunicorn_config: Optional[str] = None) -> subprocess.Popen:
+    """
+    Start the app against the seeded clinic (gunicorn as in the Procfile, or the dev server)
+    gunicorn reads gunicorn.conf.py from the project root unless another config is given;
+    workers/threads override it when set
+    """
+    env = dict(os.environ, LOADTEST_WORKDIR=workdir, CLINIC_MOBILE=LOADTEST_MOBILE, CLINIC_PIN=LOADTEST_PIN,
+               FLASK_ENV='development', FLASK_DEBUG='False', PYTHONPATH=PROJECT_ROOT)
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+        if workers:
+            command += ['--workers', str(workers)]
+        if threads:
+            command += ['--threads', str(threads)]
+        if gunicorn_config:
+            command += ['--config', gunicorn_config]
+        command.append('benchmarks.loadtest_app:app')
+    else:
+        command = [sys.executable, '-m', 'benchmarks.loadtest_app', str(port)]
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+def wait_until_ready(base_url: str, process: Optional[subprocess.Popen], timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup:\n{process.stderr.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(base_url + '/health', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout:.0f}s")
+
+def print_report(report: Dict, label: str):
+    print(f"\n{label}")
+    print(f"  {report['total_requests']} requests in {report['elapsed_seconds']}s = "
+          f"{report['requests_per_second']} req/s, error rate {report['error_rate'] * 100:.2f}%")
+    print(f"  {'route':<18}{'reqs':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for route, stats in report['routes'].items():
+        rps = stats['requests_per_second'] if stats['requests_per_second'] is not None else '-'
+        print(f"  {route:<18}{stats['requests']:>7}{rps:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}{stats['errors']:>8}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Load test the clinic Flask routes')
+    parser.add_argument('--users', type=int, default=10, help='concurrent logged-in users')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--think-ms', type=float, default=0, help='mean pause between a user\'s requests')
+    parser.add_argument('--workers', type=int, help='gunicorn workers (default: from gunicorn.conf.py)')
+    parser.add_argument('--threads', type=int, help='gunicorn threads per worker (default: from gunicorn.conf.py)')
+    parser.add_argument('--gunicorn-config', help='gunicorn config file to start with (-c)')
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn',
+                        help='server to start; werkzeug is a fallback when gunicorn is unavailable')
+    parser.add_argument('--url', help='test an already running server instead (needs --db, --mobile, --pin)')
+    parser.add_argument('--db', help='with --url: the server\'s database, read for patient ids and names')
+    parser.add_argument('--mobile', default=LOADTEST_MOBILE)
+    parser.add_argument('--pin', default=LOADTEST_PIN)
+    parser.add_argument('--patients', type=int, default=2000, help='patients in the seeded clinic')
+    parser.add_argument('--visits', type=int, default=12000, help='visits in the seeded clinic')
+    parser.add_argument('--json', dest='json_path', help='write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.url and not args.db:
+        parser.error('--url needs --db so the workflows can pick real patients')
+
+    workdir = tempfile.mkdtemp(prefix='clinic_load_')
+    process = None
+    try:
+        if args.url:
+            ctx = context_from_database(args.db)
+            base_url = args.url.rstrip('/')
+        else:
+            summary = generate_clinic(os.path.join(workdir, 'clinic.db'), args.patients, args.visits)
+            ctx = {'patient_ids': summary['active_patient_ids'], 'names': summary['names'],
+                   'phones': summary['phones']}
+            port = _free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            process = start_server(workdir, args.server, port, args.workers, args.threads, args.gunicorn_config)
+        wait_until_ready(base_url, process)
+
+        label = (f"{args.server} workers={args.workers or 'auto'} threads={args.threads or 'auto'}"
+                 if not args.url else base_url)
+        print(f"Load test: {args.users} users for {args.duration:.0f}s against {label} "
+              f"({len(ctx['patient_ids'])} patients)")
+        report = run_load(base_url, ctx, args.users, args.duration, args.think_ms, (args.mobile, args.pin))
+        report['config'] = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'server': 'external' if args.url else args.server,
+            'workers': args.workers, 'threads': args.threads, 'users': args.users,
+            'duration': args.duration, 'think_ms': args.think_ms,
+            'patients': len(ctx['patient_ids'])
+        }
+        print_report(report, label)
+
+        if args.json_path:
+            with open(args.json_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\nReport written to {args.json_path}")
+        return 1 if report['routes'].get('login', {}).get('errors') else 0
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+WSGI entry point for load tests
+The normal Flask app, with every data file redirected into LOADTEST_WORKDIR (a seeded temp clinic)
+"""
+
+import os
+import sys
+
+from modules import backup, database, metrics, profiler, ratelimit, sessions
+
+WORKDIR = os.environ.get('LOADTEST_WORKDIR')
+if not WORKDIR:
+    raise RuntimeError("LOADTEST_WORKDIR must point at a directory containing the seeded clinic.db")
+
+database.DB_PATH = backup.DB_PATH = os.path.join(WORKDIR, 'clinic.db')
+backup.BACKUP_DIR = os.path.join(WORKDIR, 'backups')
+metrics.METRICS_DIR = os.path.join(WORKDIR, 'metrics')
+profiler.PROFILE_DIR = os.path.join(WORKDIR, 'profiles')
+sessions.SESSIONS_DB = os.path.join(WORKDIR, 'sessions.db')
+ratelimit.RATELIMIT_DB = os.path.join(WORKDIR, 'ratelimit.db')
+
+# Every virtual user shares one IP, so rate limits are off unless explicitly set for the run
+for name in ('RATE_LIMIT_LOGIN', 'RATE_LIMIT_ADD_PATIENT', 'RATE_LIMIT_ADD_VISIT'):
+    os.environ.setdefault(name, '')
+
+from flask_app import app  # noqa: E402  (paths must be redirected before the app is imported)
+
+if __name__ == '__main__':
+    # Development-server fallback when gunicorn is not installed: python -m benchmarks.loadtest_app PORT
+    app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True, debug=False, use_reloader=False)
@@ -0,0 +1,381 @@
+"""
+Benchmark runner for the database and backup modules
+Times every public function against a synthetic clinic and reports p50/p95 and peak memory
+"""
+
+import argparse
+import inspect
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.datagen import generate_clinic
+from modules import backup, database
+
+BENCHMARKED_MODULES = (database, backup)
+
+class BenchmarkContext:
+    """Synthetic clinic facts plus pools of ids consumed by the mutating benchmarks"""
+
+    def __init__(self, summary: Dict, seed: int):
+        self.rng = random.Random(seed)
+        self.summary = summary
+        self.active_ids = list(summary['active_patient_ids'])
+        self.rng.shuffle(self.active_ids)
+        self.soft_deleted = []
+        self.merges = []
+        self.phone_counter = 5000000000
+
+        conn = sqlite3.connect(database.DB_PATH)
+        self.visit_ids = [row[0] for row in conn.execute(
+            "SELECT visit_id FROM visits WHERE is_deleted = 0 OR is_deleted IS NULL")]
+        conn.close()
+        self.rng.shuffle(self.visit_ids)
+
+    def patient_id(self) -> int:
+        """A random active patient (not consumed)"""
+        return self.rng.choice(self.active_ids)
+
+    def take_patient_id(self) -> int:
+        """Remove and return an active patient, for deletes/merges"""
+        return self.active_ids.pop()
+
+    def name_fragment(self) -> str:
+        name = self.rng.choice(self.summary['names'])
+        return self.rng.choice(name.split())[:4]
+
+    def phone(self) -> str:
+        return self.rng.choice(self.summary['phones'])
+
+    def new_phone(self) -> str:
+        self.phone_counter += 1
+        return str(self.phone_counter)
+
+def _soft_delete(ctx: BenchmarkContext):
+    patient_id = ctx.take_patient_id()
+    ctx.soft_deleted.append(patient_id)
+    return database.soft_delete_patient(patient_id, 'benchmark', 'benchmark')
+
+def _restore(ctx: BenchmarkContext):
+    patient_id = ctx.soft_deleted.pop() if ctx.soft_deleted else ctx.patient_id()
+    return database.restore_deleted_patient(patient_id, 'benchmark')
+
+def _hard_delete(ctx: BenchmarkContext):
+    patient_id = ctx.take_patient_id()
+    return database.hard_delete_patient(patient_id, f"DELETE-{patient_id}-PERMANENT", 'benchmark')
+
+def _merge(ctx: BenchmarkContext):
+    success, message, merge_id = database.merge_patients(
+        ctx.take_patient_id(), [ctx.take_patient_id(), ctx.take_patient_id()], 'benchmark')
+    if merge_id:
+        ctx.merges.append(merge_id)
+    return success, message
+
+def _undo_merge(ctx: BenchmarkContext):
+    if not ctx.merges:
+        _merge(ctx)
+    return database.undo_merge(ctx.merges.pop(), 'benchmark')
+
+def _connect(ctx: BenchmarkContext):
+    database.get_connection().close()
+
+def _index_new_visit_terms(ctx: BenchmarkContext):
+    conn = database.get_connection()
+    with conn:
+        database.index_new_visit_terms(conn.cursor(), max(ctx.visit_ids) - 50)
+    conn.close()
+
+def _index_new_vitals(ctx: BenchmarkContext):
+    conn = database.get_connection()
+    with conn:
+        database.index_new_vitals(conn.cursor(), max(ctx.visit_ids) - 50)
+    conn.close()
+
+def _index_new_followups(ctx: BenchmarkContext):
+    conn = database.get_connection()
+    with conn:
+        database.index_new_followups(conn.cursor(), max(ctx.visit_ids) - 50)
+    conn.close()
+
+def _advance_queue(ctx: BenchmarkContext):
+    waiting = [entry for entry in database.get_queue()['entries'] if entry['status'] == 'waiting']
+    if not waiting:
+        database.check_in_patient(ctx.patient_id())
+        return _advance_queue(ctx)
+    entry = waiting[0]
+    return database.update_queue_entry(entry['token'], 'in_consultation', entry['version'])
+
+def _consume_changes(ctx: BenchmarkContext):
+    database.register_change_consumer('benchmark', from_start=True)
+    return database.consume_changes('benchmark', lambda changes: None, 1000)
+
+def _query_listener_roundtrip(ctx: BenchmarkContext):
+    def listener(*args):
+        pass
+    database.add_query_listener(listener)
+    database.remove_query_listener(listener)
+
+def _latest_backup(ctx: BenchmarkContext) -> str:
+    backups = backup.get_backup_list()
+    if not backups:
+        backup.create_backup('benchmark')
+        backups = backup.get_backup_list()
+    return backups[0]['filename']
+
+# (benchmark name, callable(ctx), repeat cap or None); order matters: reads, writes, deletes
+CASES = [
+    ('database.get_connection', _connect, None),
+    ('database.add_query_listener', _query_listener_roundtrip, None),
+    ('database.remove_query_listener', _query_listener_roundtrip, None),
+    ('database.format_date_for_display', lambda ctx: database.format_date_for_display('2025-01-15'), None),
+    ('database.format_date_for_storage', lambda ctx: database.format_date_for_storage('15/01/2025'), None),
+    ('database.get_today_formatted', lambda ctx: database.get_today_formatted(), None),
+    ('database.init_database', lambda ctx: database.init_database(), None),
+    ('database.get_schema_version', lambda ctx: database.get_schema_version(), None),
+    ('database.search_patients', lambda ctx: database.search_patients(ctx.name_fragment()), None),
+    ('database.get_patient_by_id', lambda ctx: database.get_patient_by_id(ctx.patient_id()), None),
+    ('database.find_existing_patient_by_phone', lambda ctx: database.find_existing_patient_by_phone(ctx.phone()), None),
+    ('database.find_similar_patients',
+     lambda ctx: database.find_similar_patients(ctx.name_fragment(), ctx.phone()), None),
+    ('database.get_patient_visits', lambda ctx: database.get_patient_visits(ctx.patient_id()), None),
+    ('database.get_all_patients', lambda ctx: database.get_all_patients(), None),
+    ('database.get_patient_weight_progression',
+     lambda ctx: database.get_patient_weight_progression(ctx.patient_id()), None),
+    ('database.get_patient_visit_count', lambda ctx: database.get_patient_visit_count(ctx.patient_id()), None),
+    ('database.get_patient_summary', lambda ctx: database.get_patient_summary(ctx.patient_id()), None),
+    ('database.search_patients_with_visit_info',
+     lambda ctx: database.search_patients_with_visit_info(ctx.name_fragment()), None),
+    ('database.get_database_stats', lambda ctx: database.get_database_stats(), None),
+    ('database.get_data_version', lambda ctx: database.get_data_version(), None),
+    ('database.get_recent_patients', lambda ctx: database.get_recent_patients(5), None),
+    ('database.tokenize_visit_text',
+     lambda ctx: database.tokenize_visit_text('Triphala churna 1 tsp at night, Ashwagandha tablets twice daily'), None),
+    ('database.get_top_terms', lambda ctx: database.get_top_terms('medicine', 20), None),
+    ('database.get_term_cooccurrence', lambda ctx: database.get_term_cooccurrence('pain', 'symptom', 'medicine'), None),
+    ('database.find_patients_by_term', lambda ctx: database.find_patients_by_term('triphala', 'medicine'), None),
+    ('database.get_patient_terms', lambda ctx: database.get_patient_terms(ctx.patient_id()), None),
+    ('database.index_new_visit_terms', _index_new_visit_terms, None),
+    ('database.rebuild_visit_terms', lambda ctx: database.rebuild_visit_terms(), 3),
+    ('database.parse_blood_pressure', lambda ctx: database.parse_blood_pressure('BP 130/85 mmHg'), None),
+    ('database.get_patient_vitals', lambda ctx: database.get_patient_vitals(ctx.patient_id(), 'weight'), None),
+    ('database.index_new_vitals', _index_new_vitals, None),
+    ('database.backfill_vitals', lambda ctx: database.backfill_vitals(), 3),
+    ('database.get_patient_followup', lambda ctx: database.get_patient_followup(ctx.patient_id()), None),
+    ('database.get_followup_lists', lambda ctx: database.get_followup_lists(), None),
+    ('database.index_new_followups', _index_new_followups, None),
+    ('database.rebuild_followups', lambda ctx: database.rebuild_followups(), 3),
+    ('database.get_queue', lambda ctx: database.get_queue(), None),
+    ('database.get_queue_version', lambda ctx: database.get_queue_version(), None),
+    ('database.get_changes', lambda ctx: database.get_changes(max(database.get_data_version() - 500, 0)), None),
+    ('database.register_change_consumer', lambda ctx: database.register_change_consumer('benchmark'), None),
+    ('database.get_consumer_offset', lambda ctx: database.get_consumer_offset('benchmark'), None),
+    ('database.read_changes', lambda ctx: database.read_changes('benchmark', 500), None),
+    ('database.get_change_consumers', lambda ctx: database.get_change_consumers(), None),
+    ('database.get_deleted_records', lambda ctx: database.get_deleted_records(50), None),
+    ('database.get_audit_log', lambda ctx: database.get_audit_log(100), None),
+    ('database.get_merge_history', lambda ctx: database.get_merge_history(50), None),
+    ('database.add_patient',
+     lambda ctx: database.add_patient('Benchmark Patient', 40, 'Female', ctx.new_phone(), 60.0, None), None),
+    ('database.add_visit',
+     lambda ctx: database.add_visit(ctx.patient_id(), datetime.now().strftime('%Y-%m-%d'), 'Joint pain',
+                                    'Triphala churna', 'Warm water', 62.5, '130/85', None), None),
+    ('database.schedule_followup',
+     lambda ctx: database.schedule_followup(ctx.patient_id(),
+                                            (datetime.now() + timedelta(days=ctx.rng.randint(1, 60))).strftime('%Y-%m-%d')),
+     None),
+    ('database.clear_followup', lambda ctx: database.clear_followup(ctx.patient_id()), None),
+    ('database.check_in_patient', lambda ctx: database.check_in_patient(ctx.patient_id()), None),
+    ('database.update_queue_entry', _advance_queue, None),
+    ('database.acknowledge_changes',
+     lambda ctx: database.acknowledge_changes('benchmark', database.get_data_version()), None),
+    ('database.consume_changes', _consume_changes, None),
+    ('database.prune_change_log', lambda ctx: database.prune_change_log(0), 5),
+    ('database.update_patient_info',
+     lambda ctx: database.update_patient_info(ctx.patient_id(), weight=round(ctx.rng.uniform(50, 90), 1)), None),
+    ('database.update_patient',
+     lambda ctx: database.update_patient(ctx.patient_id(), weight=round(ctx.rng.uniform(50, 90), 1)), None),
+    ('database.log_audit_action',
+     lambda ctx: database.log_audit_action('BENCHMARK', 'patients', ctx.patient_id(), None, None,
+                                           'benchmark', 'benchmark run'), None),
+    ('database.soft_delete_patient', _soft_delete, None),
+    ('database.restore_deleted_patient', _restore, None),
+    ('database.soft_delete_visit',
+     lambda ctx: database.soft_delete_visit(ctx.visit_ids.pop(), 'benchmark', 'benchmark'), None),
+    ('database.merge_patient_records',
+     lambda ctx: database.merge_patient_records(ctx.take_patient_id(), ctx.take_patient_id()), None),
+    ('database.merge_patients', _merge, None),
+    ('database.undo_merge', _undo_merge, None),
+    ('database.hard_delete_patient', _hard_delete, None),
+    ('backup.ensure_backup_directory', lambda ctx: backup.ensure_backup_directory(), None),
+    ('backup.create_backup', lambda ctx: backup.create_backup('benchmark'), 5),
+    ('backup.get_backup_list', lambda ctx: backup.get_backup_list(), None),
+    ('backup.cleanup_old_backups', lambda ctx: backup.cleanup_old_backups(10), None),
+    ('backup.verify_database_integrity', lambda ctx: backup.verify_database_integrity(), None),
+    ('backup.auto_backup_if_needed', lambda ctx: backup.auto_backup_if_needed(), 5),
+    ('backup.get_database_stats', lambda ctx: backup.get_database_stats(), None),
+    ('backup.restore_backup', lambda ctx: backup.restore_backup(_latest_backup(ctx)), 3),
+]
+
+def public_functions() -> List[str]:
+    """Every public function defined in the benchmarked modules, as module.function"""
+    names = []
+    for module in BENCHMARKED_MODULES:
+        short = module.__name__.split('.')[-1]
+        for name, obj in inspect.getmembers(module, inspect.isfunction):
+            if not name.startswith('_') and obj.__module__ == module.__name__:
+                names.append(f"{short}.{name}")
+    return sorted(names)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_case(fn: Callable, ctx: BenchmarkContext, repeat: int) -> Dict:
+    """One traced call for peak memory (doubles as warm-up), then `repeat` timed calls"""
+    tracemalloc.start()
+    fn(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(ctx)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    return {
+        'calls': repeat,
+        'p50_ms': round(percentile(timings, 50) * 1000, 4),
+        'p95_ms': round(percentile(timings, 95) * 1000, 4),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 4),
+        'max_ms': round(timings[-1] * 1000, 4),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+def run_benchmarks(patients: int = 2000, visits: int = 12000, repeat: int = 30, seed: int = 42,
+                   only: Optional[str] = None, verbose: bool = True) -> Dict:
+    """
+    Build a synthetic clinic in a temporary directory and benchmark every case against it
+    Returns: {'meta': {...}, 'results': {name: stats}}
+    """
+    workdir = tempfile.mkdtemp(prefix='clinic_bench_')
+    db_path = os.path.join(workdir, 'clinic.db')
+    saved = (database.DB_PATH, backup.DB_PATH, backup.BACKUP_DIR)
+
+    try:
+        started = time.perf_counter()
+        summary = generate_clinic(db_path, patients, visits, seed=seed)
+        generation_seconds = time.perf_counter() - started
+
+        database.DB_PATH = backup.DB_PATH = db_path
+        backup.BACKUP_DIR = os.path.join(workdir, 'backups')
+        ctx = BenchmarkContext(summary, seed)
+
+        if verbose:
+            print(f"Synthetic clinic: {summary['patients']} patients, {summary['visits']} visits "
+                  f"({generation_seconds:.1f}s to generate)")
+
+        # Mutating cases consume ids; keep enough patients for the deletes and merges
+        needed = repeat * 5 + 10
+        if len(ctx.active_ids) < needed:
+            raise ValueError(f"--patients is too small for --repeat {repeat}; need at least {needed} active patients")
+
+        results = {}
+        for name, fn, cap in CASES:
+            if only and only not in name:
+                continue
+            results[name] = run_case(fn, ctx, min(repeat, cap) if cap else repeat)
+            if verbose:
+                stats = results[name]
+                print(f"  {name:<45} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  "
+                      f"peak {stats['peak_memory_kb']:>9.1f} KB")
+
+        missing = sorted(set(public_functions()) - {name for name, _, _ in CASES})
+        if missing and verbose:
+            print(f"Not benchmarked (add cases to benchmarks/run.py): {', '.join(missing)}")
+
+        return {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'patients': summary['patients'],
+                'visits': summary['visits'],
+                'repeat': repeat,
+                'seed': seed,
+                'not_benchmarked': missing
+            },
+            'results': results
+        }
+    finally:
+        database.DB_PATH, backup.DB_PATH, backup.BACKUP_DIR = saved
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 1.25) -> List[str]:
+    """
+    Print p50/p95 ratios against a baseline run
+    Returns: names whose p50 slowed down by more than `threshold` times
+    """
+    regressions = []
+    print(f"\nComparison with baseline from {baseline.get('meta', {}).get('timestamp', 'unknown')}:")
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('p50_ms'):
+            print(f"  {name:<45} (new)")
+            continue
+        ratio = stats['p50_ms'] / base['p50_ms']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print(f"  {name:<45} p50 {base['p50_ms']:>9.3f} -> {stats['p50_ms']:>9.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the clinic database and backup modules')
+    parser.add_argument('--patients', type=int, default=2000, help='synthetic patients to generate')
+    parser.add_argument('--visits', type=int, default=12000, help='synthetic visits to generate')
+    parser.add_argument('--repeat', type=int, default=30, help='timed calls per function')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the synthetic clinic')
+    parser.add_argument('--only', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file from an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='p50 slowdown ratio reported as a regression (default 1.25)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.patients, args.visits, args.repeat, args.seed, args.only)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
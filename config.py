@@ -4,10 +4,13 @@ Handles environment variables and secure settings
 """
 
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file next to this module. Deployments set real environment
+# variables and have no .env, so python-dotenv is only imported when there is a file to read
+_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+if os.path.exists(_ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
 
 class Config:
     """Configuration class with secure defaults"""
@@ -32,6 +35,51 @@ class Config:
     CLINIC_EMAIL = os.getenv('CLINIC_EMAIL', 'clinic@example.com')
     CLINIC_PHONE = os.getenv('CLINIC_PHONE', '9898143702')
     
+    # Monitoring (/metrics endpoint; scrapers send METRICS_TOKEN as a bearer token, without one
+    # the endpoint needs a signed-in session)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+    
+    # Request profiling: logged-in users can add ?_profile=1 or an "X-Profile: 1" header;
+    # PROFILE_SAMPLE_RATE additionally profiles that fraction of all requests (0 = off)
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+    
+    # Server-side sessions (data/sessions.db); the cookie only carries a random token
+    SESSION_LIFETIME_HOURS = float(os.getenv('SESSION_LIFETIME_HOURS', '12'))
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1024'))
+    SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '600'))
+    
+    # Compress responses larger than this many bytes (gzip, or brotli when installed); 0 disables
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '500'))
+    
+    # Live queue page: the page polls /api/queue every QUEUE_POLL_INTERVAL seconds. Event streams are
+    # opt-in: QUEUE_STREAM_SECONDS is how long one stays open before the browser reconnects; keep it to
+    # a few seconds, as it holds a worker thread (0 = off; streams count toward EVENT_MAX_STREAMS)
+    QUEUE_POLL_INTERVAL = float(os.getenv('QUEUE_POLL_INTERVAL', '2'))
+    QUEUE_STREAM_SECONDS = float(os.getenv('QUEUE_STREAM_SECONDS', '0'))
+    
+    # Live dashboard: the page polls /api/dashboard every DASHBOARD_POLL_INTERVAL seconds. Event
+    # streams are opt-in: each one holds a gthread worker thread, so keep EVENT_STREAM_SECONDS to a
+    # few seconds (0 = off) and EVENT_MAX_STREAMS per worker below GUNICORN_THREADS; streams past the
+    # cap get 503 and the page polls. The worker's event publisher checks for changes every
+    # EVENT_POLL_INTERVAL seconds while a stream is open
+    DASHBOARD_POLL_INTERVAL = float(os.getenv('DASHBOARD_POLL_INTERVAL', '10'))
+    EVENT_POLL_INTERVAL = float(os.getenv('EVENT_POLL_INTERVAL', '1'))
+    EVENT_STREAM_SECONDS = float(os.getenv('EVENT_STREAM_SECONDS', '0'))
+    EVENT_MAX_STREAMS = int(os.getenv('EVENT_MAX_STREAMS', '2'))
+    
+    # Rate limits per endpoint ("METHOD endpoint" or just "endpoint"), as "<count>/<period>";
+    # applied per client IP and per session, empty string disables a rule
+    RATE_LIMITS = {
+        'POST login': os.getenv('RATE_LIMIT_LOGIN', '10/minute'),
+        'POST add_patient_route': os.getenv('RATE_LIMIT_ADD_PATIENT', '30/minute'),
+        'force_add_patient': os.getenv('RATE_LIMIT_ADD_PATIENT', '30/minute'),
+        'add_visit_route': os.getenv('RATE_LIMIT_ADD_VISIT', '30/minute')
+    }
+    
     @classmethod
     def get_auth_credentials(cls):
         """Get authentication credentials securely"""
@@ -3,10 +3,11 @@ Flask Web Application for Ayurvedic Clinic Management
 Simple, fast, and easy-to-use interface for clinic management
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, send_file
 from datetime import datetime, date
 import sys
 import os
+import click
 
 # Add the modules directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
@@ -17,14 +18,21 @@ from modules.database import (
     get_database_stats, get_patient_weight_progression, format_date_for_display,
     format_date_for_storage, get_today_formatted, get_patient_visit_count,
     get_patient_summary, search_patients_with_visit_info, find_existing_patient_by_phone,
-    find_similar_patients, merge_patient_records, update_patient_info,
+    find_similar_patients, merge_patients as merge_patient_group, undo_merge, get_merge_history,
+    MERGE_MAX_DUPLICATES, update_patient_info,
     soft_delete_patient, hard_delete_patient, soft_delete_visit, restore_deleted_patient,
-    get_deleted_records, get_audit_log, log_audit_action
+    get_deleted_records, get_audit_log, log_audit_action, get_schema_version,
+    get_recent_patients, TERM_FIELDS, get_top_terms, get_term_cooccurrence, find_patients_by_term,
+    get_patient_terms, rebuild_visit_terms, backfill_vitals, get_patient_followup, get_followup_lists,
+    schedule_followup, clear_followup, rebuild_followups, FOLLOWUP_DEFAULT_DAYS, FOLLOWUP_MIN_DAYS, FOLLOWUP_MAX_DAYS,
+    check_in_patient, update_queue_entry, get_queue, get_queue_version, prune_change_log, get_change_consumers,
+    get_data_version
 )
 
 from modules.validation import (
-    validate_patient_data, validate_visit_data, validate_search_term,
-    sanitize_input, format_phone_number, get_validation_summary
+    validate_patient_data, validate_visit_data, validate_search_term, validate_follow_up_date,
+    sanitize_input, format_phone_number, get_validation_summary,
+    validate_patient_batch, validate_visit_batch, get_batch_validation_summary
 )
 
 from modules.auth import (
@@ -40,6 +48,35 @@ from modules.backup import (
     auto_backup_if_needed, get_database_stats as get_backup_stats
 )
 
+from modules.export import (
+    EXPORT_DATASETS, EXPORT_FORMATS, validate_export_request, stream_export,
+    get_export_filename, export_to_file, get_export_counts
+)
+
+from modules.bulk_import import IMPORTERS, is_supported_register
+
+from modules.metrics import init_metrics, collect_metrics
+
+from modules.query_stats import enable_query_stats, get_top_queries
+
+from modules.sessions import (
+    init_sessions, regenerate_session, list_active_sessions, revoke_session, revoke_user_sessions
+)
+
+from modules.ratelimit import init_rate_limits
+
+from modules.compression import etag_matches, init_compression
+
+from modules.events import TOPICS, init_events, stream_response
+
+from modules.visit_timeline import visit_timeline_records
+from modules.vitals import DOWNSAMPLE_METHODS, VITAL_METRICS, get_vitals_series
+from modules.analytics import PERIODS as ANALYTICS_PERIODS, get_analytics_summary, refresh_analytics
+
+from modules.profiler import (
+    init_profiler, list_profiles, get_profile, get_profile_path, folded_stacks_text, top_stacks
+)
+
 from config import get_config
 
 app = Flask(__name__)
@@ -49,6 +86,28 @@ config = get_config()
 app.secret_key = config.SECRET_KEY
 app.config['DEBUG'] = config.DEBUG
 
+# Statement statistics and slow-query logging for every database call
+enable_query_stats(config.SLOW_QUERY_MS)
+
+# Per-endpoint latency, status and database usage metrics (served on /metrics)
+if config.METRICS_ENABLED:
+    init_metrics(app, config.METRICS_FLUSH_INTERVAL, config.METRICS_TOKEN or None)
+
+# Server-side sessions with an in-process cache (manage under /admin/sessions)
+init_sessions(app, config.SESSION_LIFETIME_HOURS, config.SESSION_CACHE_SIZE, config.SESSION_SWEEP_INTERVAL)
+
+# Throttle login and write endpoints (429 + Retry-After when exceeded)
+init_rate_limits(app, config.RATE_LIMITS)
+
+# gzip/brotli for pages, precompressed fingerprinted static files with long cache lifetimes
+init_compression(app, config.COMPRESSION_MIN_SIZE)
+
+# On-demand request profiling (results under /admin/profiles)
+init_profiler(app, config.PROFILE_SAMPLE_RATE, config.PROFILE_SAMPLE_INTERVAL_MS)
+
+# One change-watching thread per worker feeds every live dashboard and queue stream
+init_events(app, config.EVENT_POLL_INTERVAL, config.EVENT_MAX_STREAMS)
+
 # Make health facts available globally in templates
 @app.context_processor
 def inject_health_facts():
@@ -82,7 +141,7 @@ def dashboard():
             flash(f'Database initializing, please refresh page', 'info')
     
     # Get recent patients
-    recent_patients = get_all_patients()[:5]  # Last 5 patients
+    recent_patients = get_recent_patients(5)  # Last 5 patients
     
     # Get backup status
     backup_stats = get_backup_stats()
@@ -90,16 +149,17 @@ def dashboard():
     # Get health tip for dashboard
     health_tip = get_daily_health_fact()
     
+    # Follow-ups due today and overdue this week
+    followups = get_followup_lists(days=7, limit=10)
+    
     return render_template('dashboard.html', 
                          stats=stats, 
                          recent_patients=recent_patients,
                          backup_stats=backup_stats,
-                         health_tip=health_tip)
-
-from modules.backup import (
-    create_backup, get_backup_list, restore_backup, verify_database_integrity,
-    auto_backup_if_needed, get_database_stats as get_backup_stats
-)
+                         health_tip=health_tip,
+                         followups=followups,
+                         poll_interval=config.DASHBOARD_POLL_INTERVAL,
+                         stream_enabled=config.EVENT_STREAM_SECONDS > 0)
 
 # Health check route for deployment
 @app.route('/health')
@@ -119,6 +179,8 @@ def login():
         pin = request.form.get('pin', '').strip()
         
         if verify_credentials(mobile, pin):
+            session.clear()
+            regenerate_session(session)
             session['logged_in'] = True
             session['user_mobile'] = mobile
             flash('🏥 Welcome to your Ayurvedic Clinic Management System!', 'success')
@@ -132,6 +194,7 @@ def login():
 def logout():
     """Logout and clear session"""
     session.clear()
+    regenerate_session(session)
     flash('👋 You have been logged out successfully.', 'info')
     return redirect(url_for('login'))
 
@@ -251,28 +314,24 @@ def force_add_patient():
         flash(f'❌ {message}', 'error')
         return redirect(url_for('add_patient_route'))
 
+def _duplicate_ids(values):
+    """Patient ids from repeated and/or comma-separated duplicate_id values"""
+    ids = []
+    for value in values:
+        for part in str(value).split(','):
+            part = part.strip()
+            if not part.isdigit():
+                return None
+            ids.append(int(part))
+    return ids
+
 @app.route('/merge_patients')
+@login_required
 def merge_patients():
-    """Merge duplicate patient records"""
-    keep_id = request.args.get('keep_id', type=int)
-    duplicate_id = request.args.get('duplicate_id', type=int)
-    
-    if not keep_id or not duplicate_id:
-        flash('Invalid patient IDs for merging', 'error')
-        return redirect(url_for('dashboard'))
-    
-    if keep_id == duplicate_id:
-        flash('Cannot merge a patient with themselves', 'error')
-        return redirect(url_for('dashboard'))
-    
-    success, message = merge_patient_records(keep_id, duplicate_id)
-    
-    if success:
-        flash(f'✅ {message}', 'success')
-        return redirect(url_for('patient_details', patient_id=keep_id))
-    else:
-        flash(f'❌ {message}', 'error')
-        return redirect(url_for('dashboard'))
+    """Old merge links: open the merge form filled in, merging only happens when it is submitted"""
+    duplicate_ids = _duplicate_ids(request.args.getlist('duplicate_id')) or []
+    return redirect(url_for('admin_merges', keep_id=request.args.get('keep_id', type=int),
+                            duplicate_ids=', '.join(str(patient_id) for patient_id in duplicate_ids) or None))
 
 @app.route('/search')
 @login_required
@@ -303,7 +362,7 @@ def patient_details(patient_id):
         flash('Patient not found', 'error')
         return redirect(url_for('search'))
     
-    visits = get_patient_visits(patient_id)
+    visits = visit_timeline_records(get_patient_visits(patient_id))
     weight_progression = get_patient_weight_progression(patient_id)
     
     # Get current date for the form
@@ -314,6 +373,7 @@ def patient_details(patient_id):
                          summary=summary, 
                          visits=visits, 
                          weight_progression=weight_progression,
+                         followup=get_patient_followup(patient_id),
                          current_date=current_date)
 
 @app.route('/edit_patient/<int:patient_id>', methods=['GET', 'POST'])
@@ -382,11 +442,16 @@ def add_visit_route(patient_id):
     weight = request.form.get('weight', type=float)
     blood_pressure = sanitize_input(request.form.get('blood_pressure', ''))
     notes = sanitize_input(request.form.get('notes', ''))
+    follow_up_date = request.form.get('follow_up_date') or None
     
     # Validate visit data
     is_valid, validation_errors = validate_visit_data(
         visit_date, symptoms, medicines, diet_notes, weight, blood_pressure, notes
     )
+    if follow_up_date:
+        follow_up_valid, follow_up_errors = validate_follow_up_date(follow_up_date, visit_date)
+        is_valid = is_valid and follow_up_valid
+        validation_errors = validation_errors + follow_up_errors
     
     if not is_valid:
         for error in validation_errors:
@@ -402,7 +467,8 @@ def add_visit_route(patient_id):
         diet_notes if diet_notes else None,
         weight_value,
         blood_pressure if blood_pressure else None,
-        notes if notes else None
+        notes if notes else None,
+        follow_up_date
     )
     
     if success:
@@ -420,7 +486,7 @@ def api_patient_info(patient_id):
     if summary:
         return jsonify({
             'success': True,
-            'patient': summary['patient'],
+            'patient': summary['patient'].to_dict(),
             'visit_count': summary['visit_count'],
             'is_new_patient': summary['is_new_patient'],
             'is_returning_patient': summary['is_returning_patient'],
@@ -429,6 +495,36 @@ def api_patient_info(patient_id):
     else:
         return jsonify({'success': False, 'message': 'Patient not found'})
 
+@app.route('/api/patient/<int:patient_id>/vitals')
+@login_required
+def api_patient_vitals(patient_id):
+    """API endpoint with a chart-ready (downsampled) vitals series and its trend statistics"""
+    metric = request.args.get('metric', 'weight')
+    method = request.args.get('method', 'lttb')
+    if metric not in VITAL_METRICS or method not in DOWNSAMPLE_METHODS:
+        return jsonify({'success': False, 'message': 'Unknown metric or downsampling method'}), 400
+    points = max(3, min(request.args.get('points', 120, type=int), 1000))
+    series = get_vitals_series(patient_id, metric, points, method, request.args.get('window', 3, type=int),
+                               request.args.get('start') or None, request.args.get('end') or None)
+    return jsonify({'success': True, **series})
+
+@app.route('/api/validate/<kind>', methods=['POST'])
+@login_required
+def api_validate_batch(kind):
+    """API endpoint to validate a JSON list of patient or visit records in one call"""
+    validators = {'patients': validate_patient_batch, 'visits': validate_visit_batch}
+    records = request.get_json(silent=True)
+    
+    if kind not in validators:
+        return jsonify({'success': False, 'message': 'Unknown record type'}), 404
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        return jsonify({'success': False, 'message': 'Expected a JSON list of records'}), 400
+    if not records:
+        return jsonify({'success': True, **get_batch_validation_summary([])})
+    
+    summary = get_batch_validation_summary(validators[kind](records))
+    return jsonify({'success': True, **summary})
+
 @app.route('/all_patients')
 @login_required
 def all_patients():
@@ -536,6 +632,353 @@ def admin_audit_log():
     audit_logs = get_audit_log(200)
     return render_template('admin_audit_log.html', audit_logs=audit_logs)
 
+@app.route('/admin/query_stats')
+@login_required
+def admin_query_stats():
+    """Admin view of the most expensive database statements across all workers"""
+    order_by = request.args.get('order', 'total_seconds')
+    if order_by not in ('total_seconds', 'calls', 'max_seconds', 'rows', 'slow_calls'):
+        order_by = 'total_seconds'
+    limit = request.args.get('limit', 25, type=int)
+
+    totals, live_workers = collect_metrics()
+    queries = get_top_queries(totals['queries'], max(1, min(limit, 200)), order_by)
+    return render_template('admin_query_stats.html',
+                         queries=queries,
+                         order_by=order_by,
+                         limit=limit,
+                         workers=live_workers,
+                         slow_query_ms=config.SLOW_QUERY_MS)
+
+@app.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    """Admin list of stored request profiles"""
+    return render_template('admin_profiles.html', profiles=list_profiles(), profile=None,
+                         sample_rate=config.PROFILE_SAMPLE_RATE)
+
+@app.route('/admin/profiles/<profile_id>')
+@login_required
+def admin_profile_detail(profile_id):
+    """Admin view of one request profile: per-function summary and hottest stacks"""
+    profile = get_profile(profile_id)
+    if not profile:
+        flash('Profile not found', 'error')
+        return redirect(url_for('admin_profiles'))
+    return render_template('admin_profiles.html', profiles=None, profile=profile,
+                         stacks=top_stacks(profile), sample_rate=config.PROFILE_SAMPLE_RATE)
+
+@app.route('/admin/profiles/<profile_id>/download/<kind>')
+@login_required
+def admin_profile_download(profile_id, kind):
+    """Download folded stacks (for flamegraph.pl / speedscope) or the raw pstats file"""
+    if kind == 'folded':
+        profile = get_profile(profile_id)
+        if profile:
+            return Response(folded_stacks_text(profile), mimetype='text/plain',
+                          headers={'Content-Disposition': f'attachment; filename={profile_id}.folded'})
+    elif kind == 'prof':
+        path = get_profile_path(profile_id, '.prof')
+        if path:
+            return send_file(path, as_attachment=True, download_name=f'{profile_id}.prof')
+    flash('Profile not found', 'error')
+    return redirect(url_for('admin_profiles'))
+
+@app.route('/admin/sessions')
+@login_required
+def admin_sessions():
+    """Admin list of signed-in devices"""
+    return render_template('admin_sessions.html', sessions=list_active_sessions(),
+                         current_key=getattr(session, 'key', None),
+                         lifetime_hours=config.SESSION_LIFETIME_HOURS)
+
+@app.route('/admin/sessions/revoke', methods=['POST'])
+@login_required
+def admin_revoke_session():
+    """Sign out one device, or every device except this one"""
+    if request.form.get('scope') == 'others':
+        count = revoke_user_sessions(session.get('user_mobile'), getattr(session, 'key', None))
+        flash(f'🔒 Signed out {count} other session(s)', 'success')
+    elif revoke_session(request.form.get('session_key', '')):
+        flash('🔒 Session signed out', 'success')
+    else:
+        flash('❌ Session not found or already expired', 'error')
+    return redirect(url_for('admin_sessions'))
+
+@app.route('/admin/merges', methods=['GET', 'POST'])
+@login_required
+def admin_merges():
+    """Merge duplicate patients into one record, and list past merges with undo"""
+    if request.method == 'POST':
+        keep_id = request.form.get('keep_id', type=int)
+        duplicate_ids = _duplicate_ids([request.form.get('duplicate_ids', '')])
+        if not keep_id or not duplicate_ids:
+            flash('❌ Enter the patient ID to keep and at least one duplicate ID', 'error')
+        else:
+            success, message, _ = merge_patient_group(keep_id, duplicate_ids, 'admin')
+            if success:
+                flash(f'✅ {message}', 'success')
+            else:
+                flash(f'❌ {message}', 'error')
+        return redirect(url_for('admin_merges'))
+    return render_template('admin_merges.html', merges=get_merge_history(50),
+                         max_duplicates=MERGE_MAX_DUPLICATES,
+                         keep_id=request.args.get('keep_id', type=int),
+                         duplicate_ids=request.args.get('duplicate_ids', ''))
+
+@app.route('/admin/merges/<int:merge_id>/undo', methods=['POST'])
+@login_required
+def admin_undo_merge(merge_id):
+    """Split a merge back into the original records"""
+    success, message = undo_merge(merge_id, 'admin')
+    if success:
+        flash(f'♻️ {message}', 'success')
+    else:
+        flash(f'❌ {message}', 'error')
+    return redirect(url_for('admin_merges'))
+
+@app.route('/admin/analytics')
+@login_required
+def admin_analytics():
+    """Clinic analytics dashboard (served from the incrementally maintained rollup tables)"""
+    period = request.args.get('period', 'month')
+    if period not in ANALYTICS_PERIODS:
+        period = 'month'
+    limit = max(1, min(request.args.get('limit', 12, type=int), 366))
+    try:
+        analytics = get_analytics_summary(period, limit)
+    except Exception as e:
+        print(f"Error loading analytics: {str(e)}")
+        flash('❌ Analytics are unavailable; run flask init-db to apply pending migrations', 'error')
+        return redirect(url_for('dashboard'))
+    return render_template('admin_analytics.html', analytics=analytics,
+                         periods=list(ANALYTICS_PERIODS), limit=limit)
+
+@app.route('/admin/terms')
+@login_required
+def admin_terms():
+    """Medicine and symptom frequencies, who was prescribed/complained of a term, and what it occurs with"""
+    field = request.args.get('field', 'medicine')
+    if field not in TERM_FIELDS:
+        field = 'medicine'
+    other_field = 'symptom' if field == 'medicine' else 'medicine'
+    query = sanitize_input(request.args.get('q', ''))
+    start_date = request.args.get('start') or None
+    end_date = request.args.get('end') or None
+    patient_id = request.args.get('patient_id', type=int)
+
+    context = {
+        'field': field,
+        'other_field': other_field,
+        'query': query,
+        'start_date': start_date,
+        'end_date': end_date,
+        'top_medicines': get_top_terms('medicine', 20, start_date, end_date),
+        'top_symptoms': get_top_terms('symptom', 20, start_date, end_date),
+        'patients': [],
+        'related': [],
+        'same_field': [],
+        'patient': None,
+        'patient_terms': None
+    }
+    if query:
+        context['patients'] = find_patients_by_term(query, field, start_date, end_date)
+        context['related'] = get_term_cooccurrence(query, field, other_field, 20, start_date, end_date)
+        context['same_field'] = get_term_cooccurrence(query, field, field, 20, start_date, end_date)
+    if patient_id:
+        context['patient'] = get_patient_by_id(patient_id)
+        context['patient_terms'] = get_patient_terms(patient_id) if context['patient'] else None
+    return render_template('admin_terms.html', **context)
+
+@app.route('/followups')
+@login_required
+def followups():
+    """Follow-up work lists: due today, overdue and upcoming within the chosen number of days"""
+    days = min(max(request.args.get('days', 7, type=int), 1), 90)
+    return render_template('followups.html', followups=get_followup_lists(days=days, limit=200),
+                         days=days, current_date=date.today().strftime('%Y-%m-%d'),
+                         limits={'min': FOLLOWUP_MIN_DAYS, 'max': FOLLOWUP_MAX_DAYS, 'default': FOLLOWUP_DEFAULT_DAYS})
+
+@app.route('/followups/<int:patient_id>', methods=['POST'])
+@login_required
+def update_followup(patient_id):
+    """Reschedule or clear a patient's follow-up"""
+    if request.form.get('action') == 'clear':
+        success, message = clear_followup(patient_id)
+    else:
+        due_date = request.form.get('due_date', '')
+        is_valid, errors = validate_follow_up_date(due_date)
+        if is_valid:
+            success, message = schedule_followup(patient_id, due_date)
+        else:
+            success, message = False, '; '.join(errors)
+    flash(f'✅ {message}' if success else f'❌ {message}', 'success' if success else 'error')
+    return redirect(url_for('followups', days=request.form.get('days', 7, type=int)))
+
+@app.route('/queue')
+@login_required
+def queue_page():
+    """Today's queue; ?fragment=1 returns just the token table for live refreshes"""
+    queue = get_queue(request.args.get('date') or None)
+    today = date.today().isoformat()
+    if request.args.get('fragment'):
+        return render_template('queue_table.html', queue=queue, today=today)
+    return render_template('queue.html', queue=queue, today=today,
+                         poll_interval=config.QUEUE_POLL_INTERVAL, stream_enabled=config.QUEUE_STREAM_SECONDS > 0)
+
+@app.route('/queue/check_in', methods=['POST'])
+@login_required
+def queue_check_in():
+    """Give a patient today's next token; the patient is a patient_id or looked up by phone number"""
+    patient_id = request.form.get('patient_id', type=int)
+    lookup = sanitize_input(request.form.get('patient', ''))
+    if not patient_id and lookup:
+        patient = find_existing_patient_by_phone(format_phone_number(lookup)) if len(lookup) >= 10 else None
+        if patient:
+            patient_id = patient.patient_id
+        elif lookup.isdigit():
+            patient_id = int(lookup)
+    if not patient_id:
+        flash('❌ Enter a patient ID or registered phone number', 'error')
+        return redirect(url_for('queue_page'))
+
+    success, message, token = check_in_patient(patient_id, sanitize_input(request.form.get('notes', '')) or None)
+    flash(f'✅ {message}' if success else f'❌ {message}', 'success' if success else 'error')
+    if request.form.get('return_to') == 'patient':
+        return redirect(url_for('patient_details', patient_id=patient_id))
+    return redirect(url_for('queue_page'))
+
+@app.route('/queue/<int:token>', methods=['POST'])
+@login_required
+def queue_update(token):
+    """Move a token to another status; rejected if the entry changed since the page showed it"""
+    success, message = update_queue_entry(token, request.form.get('status', ''),
+                                          request.form.get('version', 0, type=int))
+    flash(f'✅ {message}' if success else f'⚠️ {message}', 'success' if success else 'warning')
+    return redirect(url_for('queue_page'))
+
+@app.route('/api/queue')
+@login_required
+def api_queue():
+    """Today's queue as JSON; send If-None-Match with the last ETag to get 304 while nothing changed"""
+    etag = f"{date.today().isoformat()}-{get_queue_version()}"
+    if etag_matches(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(get_queue())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/queue/stream')
+@login_required
+def api_queue_stream():
+    """
+    Server-sent events: a 'queue' event with {date, version, counts} whenever today's queue changes
+    Fed by the worker's event publisher; the stream closes after QUEUE_STREAM_SECONDS and the
+    browser reconnects, so it never holds a worker thread for long (503 at the stream cap)
+    """
+    if config.QUEUE_STREAM_SECONDS <= 0:
+        return jsonify({'error': 'Queue event stream is disabled; poll /api/queue'}), 404
+    return stream_response(('queue',), config.QUEUE_STREAM_SECONDS)
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """
+    Server-sent events for the dashboard: 'stats' (changed counters only), 'patient' and 'visit'
+    (newly added), 'queue' (today's queue counts); the first events are a snapshot
+    All open streams of a worker share one publisher thread, so tabs add no database load; each
+    stream closes after EVENT_STREAM_SECONDS, and past EVENT_MAX_STREAMS per worker the answer is 503
+    """
+    if config.EVENT_STREAM_SECONDS <= 0:
+        return jsonify({'error': 'Live dashboard events are disabled; poll /api/dashboard'}), 404
+    return stream_response(TOPICS, config.EVENT_STREAM_SECONDS)
+
+@app.route('/api/dashboard')
+@login_required
+def api_dashboard():
+    """Dashboard counters and today's queue counts as JSON; If-None-Match with the last ETag gets 304"""
+    etag = f"{date.today().isoformat()}-{get_data_version()}-{get_queue_version()}"
+    if etag_matches(etag):
+        response = Response(status=304)
+    else:
+        clinic_queue = get_queue()
+        response = jsonify({'stats': get_database_stats(),
+                            'queue': {'date': clinic_queue['date'], 'version': clinic_queue['version'],
+                                      'counts': clinic_queue['counts']}})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/admin/export')
+@login_required
+def admin_export():
+    """Admin page for downloading data exports"""
+    return render_template('admin_export.html',
+                         datasets=list(EXPORT_DATASETS),
+                         formats=list(EXPORT_FORMATS),
+                         counts=get_export_counts())
+
+@app.route('/admin/export/download')
+@app.route('/admin/export/<dataset>.<fmt>')
+@login_required
+def admin_export_download(dataset=None, fmt=None):
+    """Stream a CSV/JSONL export as a chunked download"""
+    dataset = dataset or request.args.get('dataset', '')
+    fmt = fmt or request.args.get('format', 'csv')
+    start_date = request.args.get('start') or None
+    end_date = request.args.get('end') or None
+    compress = request.args.get('gzip') == '1'
+    include_deleted = request.args.get('include_deleted') == '1'
+    
+    is_valid, validation_errors = validate_export_request(dataset, fmt, start_date, end_date)
+    if not is_valid:
+        for error in validation_errors:
+            flash(f'❌ {error}', 'error')
+        return redirect(url_for('admin_export'))
+    
+    filename = get_export_filename(dataset, fmt, compress)
+    log_audit_action('EXPORT', dataset, None, None, None, 'admin',
+                     f"Exported {dataset} as {fmt} (from: {start_date or 'start'}, to: {end_date or 'now'}, "
+                     f"deleted included: {include_deleted})")
+    
+    # No Content-Length is set, so the response is sent with chunked transfer encoding
+    return Response(
+        stream_export(dataset, fmt, start_date, end_date, include_deleted, compress),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+def admin_import():
+    """Bulk import patients or visits from a CSV/XLSX register"""
+    report = None
+    
+    if request.method == 'POST':
+        kind = request.form.get('kind', 'patients')
+        dry_run = request.form.get('dry_run') == '1'
+        upload = request.files.get('register')
+        
+        if kind not in IMPORTERS:
+            flash('❌ Please choose what to import (patients or visits)', 'error')
+        elif not upload or not upload.filename:
+            flash('❌ Please choose a CSV or Excel file to import', 'error')
+        elif not is_supported_register(upload.filename):
+            flash('❌ Only .csv and .xlsx files can be imported', 'error')
+        else:
+            success, message, report = IMPORTERS[kind](upload.stream, upload.filename, dry_run, 'admin')
+            if success:
+                flash(f'✅ {message}', 'success')
+            else:
+                flash(f'❌ {message}', 'error')
+    
+    return render_template('admin_import.html', report=report)
+
 @app.route('/restore_patient/<int:patient_id>', methods=['POST'])
 def restore_patient_route(patient_id):
     """Restore a deleted patient"""
@@ -547,6 +990,111 @@ def restore_patient_route(patient_id):
     
     return redirect(url_for('admin_deleted_records'))
 
+# ==========================================
+# COMMAND LINE TOOLS
+# ==========================================
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or migrate the clinic database schema (run once per deploy)"""
+    success, message = init_database()
+    if success:
+        click.echo(f"✅ {message} (schema version {get_schema_version()})")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('analytics')
+@click.option('--rebuild', is_flag=True, help='Recompute the rollups from every visit')
+def analytics_command(rebuild):
+    """Update the analytics rollup tables (only new visits unless --rebuild)"""
+    success, message = refresh_analytics(rebuild)
+    if success:
+        click.echo(f"✅ {message}")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('index-terms')
+def index_terms_command():
+    """Rebuild the medicine/symptom term index from every visit"""
+    success, message = rebuild_visit_terms()
+    if success:
+        click.echo(f"✅ {message}")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('backfill-vitals')
+@click.option('--batch-size', default=2000, show_default=True, help='Visits per transaction')
+def backfill_vitals_command(batch_size):
+    """Record weight and blood pressure readings for visits that have none in the vitals table"""
+    success, message = backfill_vitals(batch_size)
+    if success:
+        click.echo(f"✅ {message}")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('schedule-followups')
+def schedule_followups_command():
+    """Re-derive every patient's next follow-up from their visits (replaces dates entered by hand)"""
+    success, message = rebuild_followups()
+    if success:
+        click.echo(f"✅ {message}")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('prune-changes')
+@click.option('--keep-days', default=30, show_default=True, help='Always keep changes newer than this')
+def prune_changes_command(keep_days):
+    """Delete change-log entries that every registered consumer has processed"""
+    success, message = prune_change_log(keep_days)
+    for consumer in get_change_consumers():
+        click.echo(f"  {consumer['consumer']}: at change {consumer['last_seq']} ({consumer['lag']} behind)")
+    if success:
+        click.echo(f"✅ {message}")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(list(EXPORT_DATASETS)))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', help='Output format')
+@click.option('--output', '-o', default=None, help='Output file (defaults to a timestamped name)')
+@click.option('--start', default=None, help='Only rows on or after this date (YYYY-MM-DD)')
+@click.option('--end', default=None, help='Only rows on or before this date (YYYY-MM-DD)')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output file')
+@click.option('--include-deleted', is_flag=True, help='Include soft-deleted records')
+def export_command(dataset, fmt, output, start, end, compress, include_deleted):
+    """Export patients, visits or the audit log to CSV/JSONL"""
+    output = output or get_export_filename(dataset, fmt, compress)
+    success, message = export_to_file(dataset, output, fmt, start, end, include_deleted, compress)
+    if success:
+        log_audit_action('EXPORT', dataset, None, None, None, 'cli', message)
+        click.echo(f"✅ {message}")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(list(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate the register without writing to the database')
+def import_command(kind, path, dry_run):
+    """Bulk import patients or visits from a CSV/XLSX register"""
+    success, message, report = IMPORTERS[kind](path, path, dry_run, 'cli')
+    for entry in report['errors']:
+        click.echo(f"Row {entry['row']}: {'; '.join(entry['errors'])}", err=True)
+    if report['errors_truncated']:
+        click.echo(f"... {report['rejected'] - len(report['errors'])} more rejected rows not shown", err=True)
+    if success:
+        click.echo(f"✅ {message} ({report['rows_per_second']} rows/sec)")
+    else:
+        click.echo(f"❌ {message}", err=True)
+        sys.exit(1)
+
 if __name__ == '__main__':
     # Initialize database on startup
     try:
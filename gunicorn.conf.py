@@ -0,0 +1,72 @@
+"""
+Gunicorn production settings for Ayurvedic Clinic Management System
+Used by the Procfile and render.yaml: gunicorn -c gunicorn.conf.py flask_app:app
+
+Every setting can be overridden from the environment (GUNICORN_WORKERS, GUNICORN_THREADS, ...)
+or on the command line. Send HUP to the master for a graceful reload of the workers.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# SQLite allows one writer at a time, so a few processes with threads beat many processes.
+# Default: one worker per core (minimum 2, capped for small instances), 4 threads each
+_cpus = multiprocessing.cpu_count()
+workers = int(os.getenv('GUNICORN_WORKERS', os.getenv('WEB_CONCURRENCY', min(max(2, _cpus), 4))))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+# Import the app once in the master and fork it: workers start already loaded and share
+# read-only memory. Note: with preload, HUP restarts workers but does not pick up new code
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Recycle workers now and then (jittered so they do not all restart together)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Worker heartbeat files on tmpfs avoid stalls on slow container disks
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def on_starting(server):
+    """Apply pending database migrations once, in the master, before any worker serves requests"""
+    from modules.database import init_database
+    success, message = init_database()
+    if success:
+        server.log.info("Database ready: %s", message)
+    else:
+        server.log.error("Database migration failed: %s", message)
+
+def when_ready(server):
+    """
+    Master is up: with preload, compile templates and import pandas for the visit timeline once,
+    so every forked worker inherits them instead of loading its own copy
+    """
+    if preload_app:
+        from modules.warmup import warm_shared
+        timings = warm_shared(server.app.wsgi())
+        server.log.info("Warmed up before forking workers: %s",
+                        ', '.join(f"{name} {ms:.0f} ms" for name, ms in timings.items()))
+
+def post_fork(server, worker):
+    """Per-worker warmup before the first request: database pages and daily content"""
+    from modules.warmup import warm_worker
+    timings = warm_worker(server.app.wsgi(), include_shared=not preload_app)
+    server.log.info("Worker %s warmed up: %s", worker.pid,
+                    ', '.join(f"{name} {ms:.0f} ms" for name, ms in timings.items()))
+
+def on_reload(server):
+    server.log.info("Graceful reload: starting new workers, old ones finish their requests")
+
+def worker_int(worker):
+    worker.log.info("Worker %s interrupted, shutting down", worker.pid)
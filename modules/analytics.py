@@ -0,0 +1,322 @@
+"""
+Clinic analytics for Ayurvedic Clinic Management System
+Maintains rollup tables (daily volume, intervals, weight changes, patient activity months) incrementally
+from the last processed visit_id, and builds the analytics dashboard from them
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from modules.database import get_connection, get_data_version
+from modules.validation import require_pandas
+
+# Days between visits are counted into these buckets (lower bound of each bucket)
+INTERVAL_BUCKETS = (0, 8, 15, 31, 61, 91, 181, 366)
+
+# Weight changes per visit are rounded to whole kilograms and capped at +/- this many
+WEIGHT_CHANGE_LIMIT = 10
+
+ROLLUP_TABLES = ('analytics_daily', 'analytics_patients', 'analytics_patient_months',
+                 'analytics_intervals', 'analytics_weight_changes')
+
+PERIODS = {
+    'day': 'day',
+    'week': "strftime('%Y-W%W', day)",
+    'month': "substr(day, 1, 7)",
+}
+
+# Visits counted in the rollups: not deleted, belonging to a patient that is not deleted
+ACTIVE_VISITS = '''
+    FROM visits v JOIN patients p ON p.patient_id = v.patient_id
+    WHERE (v.is_deleted = 0 OR v.is_deleted IS NULL) AND (p.is_deleted = 0 OR p.is_deleted IS NULL)
+'''
+
+# SQLite's default limit on host parameters per statement is 999
+_CHUNK = 500
+
+def interval_label(bucket: int) -> str:
+    """Human label for an INTERVAL_BUCKETS entry"""
+    position = INTERVAL_BUCKETS.index(bucket)
+    if position == len(INTERVAL_BUCKETS) - 1:
+        return f"{bucket}+ days"
+    return f"{bucket}-{INTERVAL_BUCKETS[position + 1] - 1} days"
+
+# ==========================================
+# ROLLUP MAINTENANCE
+# ==========================================
+
+def _visits_signature(cursor, last_visit_id: int) -> str:
+    """
+    Cheap fingerprint of the already-processed visits
+    Changes when one of them is deleted, restored, moved to another patient or has its date/weight edited,
+    which the incremental path cannot account for
+    """
+    cursor.execute(f'''
+        SELECT COUNT(*), TOTAL(v.patient_id), TOTAL(v.weight), TOTAL(julianday(v.visit_date))
+        {ACTIVE_VISITS} AND v.visit_id <= ?
+    ''', (last_visit_id,))
+    count, patients, weights, days = cursor.fetchone()
+    return f"{count}:{patients:.0f}:{weights:.3f}:{days:.1f}"
+
+def _patient_state(cursor, patient_ids: List[int]) -> Dict[int, Tuple]:
+    """analytics_patients rows for these patients: {patient_id: (first_visit_date, last_visit_date, visits, last_weight)}"""
+    state = {}
+    for start in range(0, len(patient_ids), _CHUNK):
+        chunk = patient_ids[start:start + _CHUNK]
+        cursor.execute(f'''
+            SELECT patient_id, first_visit_date, last_visit_date, visits, last_weight
+            FROM analytics_patients WHERE patient_id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        for row in cursor.fetchall():
+            state[row[0]] = tuple(row[1:])
+    return state
+
+def _apply_visits(cursor, rows: List[Tuple]) -> Optional[int]:
+    """
+    Fold new visits (visit_id, patient_id, visit_date, weight) into the rollups
+    Returns the number applied, or None if a visit is dated before that patient's latest processed
+    visit (the rollups must then be rebuilt)
+    """
+    pd = require_pandas('Clinic analytics')
+    import numpy as np
+
+    visits = pd.DataFrame(rows, columns=['visit_id', 'patient_id', 'visit_date', 'weight'])
+    visits['date'] = pd.to_datetime(visits['visit_date'], format='%Y-%m-%d', errors='coerce')
+    visits = visits[visits['date'].notna()].sort_values(['patient_id', 'date', 'visit_id'], kind='mergesort')
+    if visits.empty:
+        return 0
+
+    state = _patient_state(cursor, visits['patient_id'].unique().tolist())
+    known = visits['patient_id'].map(lambda pid: state.get(pid, (None, None, 0, None)))
+    state_last_date = pd.to_datetime(known.str[1], format='%Y-%m-%d', errors='coerce')
+    state_visits = known.str[2].astype(int)
+    state_weight = pd.to_numeric(known.str[3], errors='coerce')
+
+    if (visits['date'] < state_last_date).any():
+        return None
+
+    by_patient = visits.groupby('patient_id', sort=False)
+    ordinal = by_patient.cumcount()
+    is_first = (ordinal == 0) & (state_visits == 0)
+
+    previous_date = by_patient['date'].shift(1).fillna(state_last_date)
+    interval = (visits['date'] - previous_date).dt.days
+
+    weight = pd.to_numeric(visits['weight'], errors='coerce')
+    weight = weight.where(weight != 0)  # 0 means "not recorded", as elsewhere in the app
+    previous_weight = weight.groupby(visits['patient_id']).shift(1)
+    previous_weight = previous_weight.groupby(visits['patient_id']).ffill().fillna(state_weight)
+    weight_change = (weight - previous_weight).dropna()
+
+    visits['first'] = is_first.astype(int)
+    visits['interval'] = interval
+    daily = visits.groupby('visit_date').agg(visits=('visit_id', 'size'), first_visits=('first', 'sum'),
+                                             interval_days=('interval', 'sum'), intervals=('interval', 'count'))
+    cursor.executemany('''
+        INSERT INTO analytics_daily (day, visits, first_visits, return_visits, interval_days, intervals)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET
+            visits = visits + excluded.visits,
+            first_visits = first_visits + excluded.first_visits,
+            return_visits = return_visits + excluded.return_visits,
+            interval_days = interval_days + excluded.interval_days,
+            intervals = intervals + excluded.intervals
+    ''', [(day, int(row.visits), int(row.first_visits), int(row.visits - row.first_visits),
+           int(row.interval_days), int(row.intervals)) for day, row in daily.iterrows()])
+
+    buckets = np.asarray(INTERVAL_BUCKETS)[np.searchsorted(INTERVAL_BUCKETS, interval.dropna(), side='right') - 1]
+    bucket_values, bucket_counts = np.unique(buckets, return_counts=True)
+    cursor.executemany('''
+        INSERT INTO analytics_intervals (bucket, visits) VALUES (?, ?)
+        ON CONFLICT(bucket) DO UPDATE SET visits = visits + excluded.visits
+    ''', [(int(bucket), int(count)) for bucket, count in zip(bucket_values, bucket_counts)])
+
+    changes = np.clip(np.round(weight_change.to_numpy()), -WEIGHT_CHANGE_LIMIT, WEIGHT_CHANGE_LIMIT) + 0.0
+    change_values, change_counts = np.unique(changes, return_counts=True)
+    cursor.executemany('''
+        INSERT INTO analytics_weight_changes (bucket, visits) VALUES (?, ?)
+        ON CONFLICT(bucket) DO UPDATE SET visits = visits + excluded.visits
+    ''', [(float(bucket), int(count)) for bucket, count in zip(change_values, change_counts)])
+
+    months = visits[['patient_id']].assign(month=visits['visit_date'].str[:7]).drop_duplicates()
+    cursor.executemany("INSERT OR IGNORE INTO analytics_patient_months (patient_id, month) VALUES (?, ?)",
+                       [(int(pid), month) for pid, month in months.itertuples(index=False)])
+
+    visits['weight'] = weight
+    patients = visits.groupby('patient_id').agg(first_visit_date=('visit_date', 'first'),
+                                               last_visit_date=('visit_date', 'last'),
+                                               visits=('visit_id', 'size'), last_weight=('weight', 'last'))
+    cursor.executemany('''
+        INSERT INTO analytics_patients (patient_id, first_visit_date, last_visit_date, visits, last_weight)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(patient_id) DO UPDATE SET
+            last_visit_date = excluded.last_visit_date,
+            visits = visits + excluded.visits,
+            last_weight = COALESCE(excluded.last_weight, last_weight)
+    ''', [(int(pid), row.first_visit_date, row.last_visit_date, int(row.visits),
+           None if row.last_weight != row.last_weight else float(row.last_weight))
+          for pid, row in patients.iterrows()])
+
+    return len(visits)
+
+def refresh_analytics(rebuild: bool = False) -> Tuple[bool, str]:
+    """
+    Bring the rollups up to date
+    Processes only visits added since the last refresh; skipped entirely when the data version has not
+    changed, and rebuilt from scratch when already-processed visits were changed or deleted
+    """
+    try:
+        conn = get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT key, value FROM analytics_state")
+            state = dict(cursor.fetchall())
+            data_version = str(get_data_version(conn))
+            if not rebuild and state.get('data_version') == data_version:
+                cursor.execute("COMMIT")
+                return True, "Analytics already up to date"
+
+            last_visit_id = int(state.get('last_visit_id') or 0)
+            if not rebuild and state.get('signature') != _visits_signature(cursor, last_visit_id):
+                rebuild = True
+            if rebuild:
+                for table in ROLLUP_TABLES:
+                    cursor.execute(f"DELETE FROM {table}")
+                last_visit_id = 0
+
+            cursor.execute(f'''
+                SELECT v.visit_id, v.patient_id, v.visit_date, v.weight
+                {ACTIVE_VISITS} AND v.visit_id > ?
+            ''', (last_visit_id,))
+            rows = cursor.fetchall()
+
+            applied = _apply_visits(cursor, rows) if rows else 0
+            if applied is None:
+                # A back-dated visit: start over rather than fold it in out of order
+                cursor.execute("ROLLBACK")
+                conn.close()
+                return refresh_analytics(rebuild=True)
+
+            if rows:
+                last_visit_id = max(row[0] for row in rows)
+            cursor.executemany("INSERT OR REPLACE INTO analytics_state (key, value) VALUES (?, ?)", [
+                ('last_visit_id', str(last_visit_id)),
+                ('signature', _visits_signature(cursor, last_visit_id)),
+                ('data_version', data_version),
+                ('refreshed_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            ])
+            cursor.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        action = "Rebuilt" if rebuild else "Updated"
+        return True, f"{action} analytics with {applied} new visit(s)"
+
+    except Exception as e:
+        print(f"Error refreshing analytics: {str(e)}")
+        return False, f"Error refreshing analytics: {str(e)}"
+
+# ==========================================
+# REPORTS (read from the rollups only)
+# ==========================================
+
+def get_visit_volume(period: str = 'day', limit: int = 30) -> List[Dict]:
+    """Visits per day/week/month (newest first) with first vs return visits and average interval"""
+    conn = get_connection()
+    try:
+        rows = conn.execute(f'''
+            SELECT {PERIODS[period]} AS period, SUM(visits), SUM(first_visits), SUM(return_visits),
+                   SUM(interval_days), SUM(intervals)
+            FROM analytics_daily
+            GROUP BY period ORDER BY period DESC LIMIT ?
+        ''', (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [{
+        'period': row[0],
+        'visits': row[1],
+        'first_visits': row[2],
+        'return_visits': row[3],
+        'avg_interval_days': round(row[4] / row[5], 1) if row[5] else None
+    } for row in rows]
+
+def get_retention_cohorts(months: int = 6, cohorts: int = 12) -> List[Dict]:
+    """
+    Patients grouped by registration month; for each later month (0..months) the share of the cohort
+    that visited in that month
+    """
+    pd = require_pandas('Clinic analytics')
+    conn = get_connection()
+    try:
+        sizes = dict(conn.execute('''
+            SELECT substr(created_date, 1, 7) AS cohort, COUNT(*) FROM patients
+            WHERE is_deleted = 0 OR is_deleted IS NULL
+            GROUP BY cohort ORDER BY cohort DESC LIMIT ?
+        ''', (cohorts,)).fetchall())
+        activity = pd.DataFrame(conn.execute('''
+            SELECT substr(p.created_date, 1, 7) AS cohort, m.month, COUNT(*) AS patients
+            FROM analytics_patient_months m JOIN patients p ON p.patient_id = m.patient_id
+            WHERE p.is_deleted = 0 OR p.is_deleted IS NULL
+            GROUP BY cohort, m.month
+        ''').fetchall(), columns=['cohort', 'month', 'patients'])
+    finally:
+        conn.close()
+
+    if not sizes:
+        return []
+    activity = activity[activity['cohort'].isin(list(sizes))]
+    cohort_index = activity['cohort'].str[:4].astype(int) * 12 + activity['cohort'].str[5:7].astype(int)
+    month_index = activity['month'].str[:4].astype(int) * 12 + activity['month'].str[5:7].astype(int)
+    activity = activity.assign(offset=month_index - cohort_index)
+    activity = activity[(activity['offset'] >= 0) & (activity['offset'] <= months)]
+    table = activity.pivot_table(index='cohort', columns='offset', values='patients', aggfunc='sum', fill_value=0)
+    table = table.reindex(index=list(sizes), columns=range(months + 1), fill_value=0)
+
+    return [{
+        'cohort': cohort,
+        'patients': sizes[cohort],
+        'retention': [round(100.0 * count / sizes[cohort], 1) for count in table.loc[cohort].tolist()]
+    } for cohort in table.index]
+
+def get_analytics_summary(period: str = 'month', limit: int = 12) -> Dict:
+    """Everything the analytics dashboard shows, refreshed incrementally first"""
+    refresh_analytics()
+
+    conn = get_connection()
+    try:
+        totals = conn.execute('''
+            SELECT TOTAL(visits), TOTAL(first_visits), TOTAL(return_visits), TOTAL(interval_days), TOTAL(intervals)
+            FROM analytics_daily
+        ''').fetchone()
+        patients_seen = conn.execute("SELECT COUNT(*) FROM analytics_patients").fetchone()[0]
+        intervals = conn.execute("SELECT bucket, visits FROM analytics_intervals ORDER BY bucket").fetchall()
+        weight_changes = conn.execute("SELECT bucket, visits FROM analytics_weight_changes ORDER BY bucket").fetchall()
+        refreshed_at = conn.execute("SELECT value FROM analytics_state WHERE key = 'refreshed_at'").fetchone()
+    finally:
+        conn.close()
+
+    interval_total = sum(count for _, count in intervals) or 1
+    change_total = sum(count for _, count in weight_changes) or 1
+    return {
+        'period': period,
+        'totals': {
+            'visits': int(totals[0]),
+            'first_visits': int(totals[1]),
+            'return_visits': int(totals[2]),
+            'patients_seen': patients_seen,
+            'avg_interval_days': round(totals[3] / totals[4], 1) if totals[4] else None
+        },
+        'volume': get_visit_volume(period, limit),
+        'intervals': [{'label': interval_label(bucket), 'visits': count,
+                       'percent': round(100.0 * count / interval_total, 1)} for bucket, count in intervals],
+        'weight_changes': [{'kg': bucket, 'visits': count,
+                            'percent': round(100.0 * count / change_total, 1)} for bucket, count in weight_changes],
+        'cohorts': get_retention_cohorts(),
+        'refreshed_at': refreshed_at[0] if refreshed_at else None
+    }
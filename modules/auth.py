@@ -3,6 +3,7 @@ Simple authentication system for Ayurvedic Clinic
 Secure login for clinic staff using environment variables
 """
 
+import hmac
 from functools import wraps
 from flask import session, request, redirect, url_for, flash
 from config import get_config
@@ -10,11 +11,14 @@ from config import get_config
 # Get secure configuration
 config = get_config()
 
+# Credentials are fixed for the life of the process, so read them once
+_credentials = config.get_auth_credentials()
+
 def login_required(f):
     """Decorator to require login for protected routes"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session:
+        if not session.get('logged_in'):
             flash('Please login to access the clinic management system', 'warning')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
@@ -22,8 +26,10 @@ def login_required(f):
 
 def verify_credentials(mobile, pin):
     """Verify login credentials using secure configuration"""
-    credentials = config.get_auth_credentials()
-    return (mobile == credentials['mobile'] and pin == credentials['pin'])
+    # Constant-time comparisons so response timing does not reveal how much of the input matched
+    mobile_ok = hmac.compare_digest(str(mobile).encode(), _credentials['mobile'].encode())
+    pin_ok = hmac.compare_digest(str(pin).encode(), _credentials['pin'].encode())
+    return mobile_ok and pin_ok
 
 def get_clinic_info():
     """Get clinic and doctor information from secure configuration"""
@@ -9,7 +9,8 @@ import sqlite3
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
-import zipfile
+
+from modules.database import get_connection
 
 # Backup directory
 BACKUP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'backups')
@@ -52,7 +53,8 @@ def create_backup(backup_type: str = "manual") -> Tuple[bool, str]:
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
         
-        # Create comprehensive backup zip
+        # Create comprehensive backup zip (zipfile is only needed here and in restore)
+        import zipfile
         zip_path = backup_path.replace('.db', '.zip')
         with zipfile.ZipFile(zip_path, 'w') as zipf:
             zipf.write(backup_path, backup_filename)
@@ -153,6 +155,7 @@ def restore_backup(backup_filename: str) -> Tuple[bool, str]:
             shutil.rmtree(temp_dir)
         os.makedirs(temp_dir)
         
+        import zipfile
         with zipfile.ZipFile(backup_path, 'r') as zipf:
             zipf.extractall(temp_dir)
         
@@ -205,7 +208,7 @@ def verify_database_integrity() -> Tuple[bool, List[str]]:
             issues.append("Database file does not exist")
             return False, issues
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         cursor = conn.cursor()
         
         # Check if main tables exist
@@ -310,7 +313,7 @@ def auto_backup_if_needed() -> Tuple[bool, str]:
 def get_database_stats() -> Dict:
     """Get comprehensive database statistics"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         cursor = conn.cursor()
         
         # Basic counts
@@ -0,0 +1,274 @@
+"""
+Bulk import utilities for Ayurvedic Clinic Management System
+Loads legacy patient and visit registers (CSV/XLSX) in validated, chunked batches
+"""
+
+import os
+import re
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from modules import database
+from modules.validation import (
+    NON_DIGIT_PATTERN, prepare_patient_batch, prepare_visit_batch, require_pandas
+)
+
+# Rows validated and inserted per transaction
+IMPORT_CHUNK_SIZE = 5000
+
+# Per-row errors kept in the report (the counts always cover every row)
+MAX_REPORTED_ERRORS = 1000
+
+PATIENT_COLUMNS = ['name', 'age', 'gender', 'phone', 'weight', 'conditions', 'registration_date']
+VISIT_COLUMNS = ['phone', 'visit_date', 'symptoms', 'medicines', 'diet_notes', 'weight',
+                 'blood_pressure', 'notes']
+
+# Common spreadsheet headings mapped onto our column names
+COLUMN_ALIASES = {
+    'patient_name': 'name',
+    'full_name': 'name',
+    'sex': 'gender',
+    'mobile': 'phone',
+    'mobile_number': 'phone',
+    'phone_number': 'phone',
+    'contact': 'phone',
+    'weight_kg': 'weight',
+    'medical_conditions': 'conditions',
+    'registered_on': 'registration_date',
+    'registration': 'registration_date',
+    'date_of_registration': 'registration_date',
+    'date': 'visit_date',
+    'visit': 'visit_date',
+    'bp': 'blood_pressure',
+    'diet': 'diet_notes',
+    'medicine': 'medicines',
+    'symptom': 'symptoms'
+}
+
+def _normalize_columns(df):
+    """Lower-case and alias column headings so registers with varied headings load"""
+    renamed = {}
+    for column in df.columns:
+        key = re.sub(r'[^a-z0-9]+', '_', str(column).strip().lower()).strip('_')
+        renamed[column] = COLUMN_ALIASES.get(key, key)
+    return df.rename(columns=renamed)
+
+def read_register(source, filename: Optional[str] = None, chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    Read a CSV or XLSX register as an iterator of DataFrame chunks (all values as strings)
+    CSV files are read chunk by chunk; XLSX files are loaded once and sliced
+    """
+    pd = require_pandas()
+    name = (filename or str(source)).lower()
+
+    if name.endswith('.xlsx'):
+        frame = pd.read_excel(source, dtype=str, keep_default_na=False)
+        for start in range(0, len(frame), chunk_size):
+            yield _normalize_columns(frame.iloc[start:start + chunk_size])
+    else:
+        for chunk in pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                                 skipinitialspace=True):
+            yield _normalize_columns(chunk)
+
+def prepare_patient_chunk(df) -> Tuple[object, List[List[str]]]:
+    """
+    Normalize and validate a chunk of patient rows
+    Rows without a registration date are registered today
+    Returns: (normalized DataFrame, per-row error lists)
+    """
+    normalized, row_errors = prepare_patient_batch(df)
+    normalized['registration_date'] = normalized['registration_date'].fillna(date.today().strftime('%Y-%m-%d'))
+    return normalized, row_errors
+
+def prepare_visit_chunk(df) -> Tuple[object, List[List[str]]]:
+    """
+    Normalize and validate a chunk of visit rows, which must carry the patient's phone
+    Unlike the visit form, old visits are allowed: legacy registers go back many years
+    Returns: (normalized DataFrame, per-row error lists)
+    """
+    pd = require_pandas()
+    normalized, row_errors = prepare_visit_batch(df, max_past_days=None)
+    phone = df['phone'] if 'phone' in df.columns else pd.Series('', index=df.index)
+    normalized['phone'] = phone.fillna('').astype(str).str.replace(NON_DIGIT_PATTERN, '', regex=True)
+    for position in (normalized['phone'].str.len() != 10).to_numpy().nonzero()[0]:
+        row_errors[position].insert(0, "Phone number must be exactly 10 digits")
+    return normalized, row_errors
+
+def _none_if_blank(series):
+    """Convert empty strings / NaN to None for SQLite"""
+    return [value if value == value and value != '' else None for value in series.tolist()]
+
+class ImportReport:
+    """Accumulates counts and per-row errors for one import run"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.total_rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def add_errors(self, row_number: int, messages: List[str]):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': messages})
+
+    def as_dict(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'kind': self.kind,
+            'total_rows': self.total_rows,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.total_rows / elapsed) if elapsed > 0 else 0
+        }
+
+def import_patients(source, filename: Optional[str] = None, dry_run: bool = False,
+                    user_id: str = 'admin', chunk_size: int = IMPORT_CHUNK_SIZE) -> Tuple[bool, str, Dict]:
+    """
+    Bulk import patients from a CSV/XLSX register
+    Phones are de-duplicated in memory against the database and the file itself
+    Returns: (success: bool, message: str, report: Dict)
+    """
+    report = ImportReport('patients')
+
+    conn = None
+    try:
+        conn = database.get_connection()
+        cursor = conn.cursor()
+
+        # Load every registered phone once instead of querying per row
+        cursor.execute("SELECT phone FROM patients")
+        known_phones = {row[0] for row in cursor.fetchall()}
+
+        for chunk in read_register(source, filename, chunk_size):
+            normalized, row_errors = prepare_patient_chunk(chunk)
+            first_row = report.total_rows + 2  # +1 for the header, +1 for 1-based rows
+            report.total_rows += len(chunk)
+
+            rows = []
+            for offset, (errors, record) in enumerate(zip(row_errors, normalized.itertuples(index=False))):
+                if not errors:
+                    if record.phone in known_phones:
+                        errors = [f"Phone number {record.phone} already exists"]
+                    else:
+                        known_phones.add(record.phone)
+                if errors:
+                    report.add_errors(first_row + offset, errors)
+                    continue
+                rows.append((
+                    record.name, int(record.age), record.gender, record.phone,
+                    float(record.weight) if record.weight == record.weight else None,
+                    record.conditions or None, record.registration_date
+                ))
+
+            if rows and not dry_run:
+                with conn:
+                    cursor.executemany('''
+                        INSERT INTO patients (name, age, gender, phone, weight, conditions, created_date)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', rows)
+            report.imported += len(rows)
+
+    except Exception as e:
+        return False, f"Import failed: {str(e)}", report.as_dict()
+    finally:
+        if conn is not None:
+            conn.close()
+
+    result = report.as_dict()
+    action = "validated" if dry_run else "imported"
+    message = (f"{result['imported']} of {result['total_rows']} patients {action} "
+               f"({result['rejected']} rejected) in {result['elapsed_seconds']}s")
+    if not dry_run and result['imported']:
+        database.log_audit_action('BULK_IMPORT', 'patients', None, None, None, user_id, message)
+    return True, message, result
+
+def import_visits(source, filename: Optional[str] = None, dry_run: bool = False,
+                  user_id: str = 'admin', chunk_size: int = IMPORT_CHUNK_SIZE) -> Tuple[bool, str, Dict]:
+    """
+    Bulk import visits from a CSV/XLSX register, matched to patients by phone number
+    Returns: (success: bool, message: str, report: Dict)
+    """
+    report = ImportReport('visits')
+
+    conn = None
+    try:
+        conn = database.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT phone, patient_id FROM patients WHERE is_deleted = 0 OR is_deleted IS NULL")
+        patient_ids = dict(cursor.fetchall())
+
+        for chunk in read_register(source, filename, chunk_size):
+            normalized, row_errors = prepare_visit_chunk(chunk)
+            first_row = report.total_rows + 2
+            report.total_rows += len(chunk)
+
+            normalized['patient_id'] = normalized['phone'].map(patient_ids)
+            missing = normalized['patient_id'].isna().to_numpy()
+
+            valid_positions = []
+            for position, errors in enumerate(row_errors):
+                if not errors and missing[position]:
+                    errors = [f"No patient registered with phone {normalized['phone'].iat[position]}"]
+                if errors:
+                    report.add_errors(first_row + position, errors)
+                else:
+                    valid_positions.append(position)
+
+            valid = normalized.iloc[valid_positions]
+            rows = list(zip(
+                valid['patient_id'].astype(int).tolist(),
+                valid['visit_date'].tolist(),
+                _none_if_blank(valid['symptoms']),
+                _none_if_blank(valid['medicines']),
+                _none_if_blank(valid['diet_notes']),
+                _none_if_blank(valid['weight']),
+                _none_if_blank(valid['blood_pressure']),
+                _none_if_blank(valid['notes'])
+            ))
+
+            if rows and not dry_run:
+                with conn:
+                    # Take the write lock first so no other insert lands between MAX() and ours
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute("SELECT COALESCE(MAX(visit_id), 0) FROM visits")
+                    last_visit_id = cursor.fetchone()[0]
+                    cursor.executemany('''
+                        INSERT INTO visits (patient_id, visit_date, symptoms, medicines, diet_notes,
+                                          weight, blood_pressure, notes)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    database.index_new_visit_terms(cursor, last_visit_id)
+                    database.index_new_vitals(cursor, last_visit_id)
+                    database.index_new_followups(cursor, last_visit_id)
+            report.imported += len(rows)
+
+    except Exception as e:
+        return False, f"Import failed: {str(e)}", report.as_dict()
+    finally:
+        if conn is not None:
+            conn.close()
+
+    result = report.as_dict()
+    action = "validated" if dry_run else "imported"
+    message = (f"{result['imported']} of {result['total_rows']} visits {action} "
+               f"({result['rejected']} rejected) in {result['elapsed_seconds']}s")
+    if not dry_run and result['imported']:
+        database.log_audit_action('BULK_IMPORT', 'visits', None, None, None, user_id, message)
+    return True, message, result
+
+IMPORTERS = {
+    'patients': import_patients,
+    'visits': import_visits
+}
+
+def is_supported_register(filename: str) -> bool:
+    """Check the uploaded file has a supported extension"""
+    return os.path.splitext(filename.lower())[1] in ('.csv', '.xlsx')
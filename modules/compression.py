@@ -0,0 +1,178 @@
+"""
+Response compression and static asset caching for Ayurvedic Clinic Management System
+Compresses rendered pages (brotli or gzip), serves fingerprinted static files with long cache lifetimes
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, Response, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Responses smaller than this are sent as-is (compression overhead outweighs the saving)
+MIN_SIZE = 500
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml'
+}
+
+# Precompressed variants written next to static files: (Content-Encoding, suffix)
+STATIC_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+STATIC_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+
+# Fingerprinted static URLs (?v=<hash>) may be cached for a year; plain ones briefly
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_STATIC_MAX_AGE = 3600
+
+def accepted_encodings() -> List[str]:
+    """Encodings the client accepts that we can produce, preferred first"""
+    header = request.headers.get('Accept-Encoding', '').lower()
+    offered = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.strip()] = quality
+    available = (['br'] if brotli else []) + ['gzip']
+    return [name for name in available if offered.get(name, offered.get('*', 0)) > 0]
+
+def etag_matches(etag: str) -> bool:
+    """
+    Whether the request's If-None-Match names this entity tag in any encoding; compressed responses
+    carry it with a -gzip/-br suffix, and that is what the browser sends back
+    """
+    tags = request.if_none_match
+    return tags.contains(etag) or any(tags.contains(f'{etag}-{encoding}') for encoding in ('gzip', 'br'))
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Compress with brotli or gzip; dynamic responses use fast levels, static files the maximum"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+# ==========================================
+# STATIC ASSETS
+# ==========================================
+
+_fingerprints: Dict[str, Tuple[float, str]] = {}
+
+def asset_fingerprint(static_folder: str, filename: str) -> Optional[str]:
+    """Short content hash of a static file, recomputed only when its mtime changes"""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    _fingerprints[path] = (mtime, digest)
+    return digest
+
+def precompress_static(static_folder: str) -> int:
+    """Write .br/.gz next to each text asset that is missing or older than its source; returns files written"""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(STATIC_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            data = None
+            for encoding, suffix in STATIC_ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                target = source + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                    continue
+                if data is None:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                try:
+                    with open(target, 'wb') as f:
+                        f.write(compress(data, encoding, 11 if encoding == 'br' else 9))
+                    written += 1
+                except OSError as e:
+                    print(f"Error precompressing {source}: {str(e)}")
+    return written
+
+def _serve_static(app: Flask, filename: str) -> Response:
+    """Static view: precompressed variant when the client accepts it, cache lifetime by fingerprint"""
+    folder = app.static_folder
+    response = None
+    for encoding in accepted_encodings():
+        suffix = dict(STATIC_ENCODINGS)[encoding]
+        variant = os.path.join(folder, filename + suffix)
+        source = os.path.join(folder, filename)
+        if (os.path.isfile(variant) and os.path.isfile(source)
+                and os.path.getmtime(variant) >= os.path.getmtime(source)):
+            response = send_from_directory(folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(folder, filename)
+    response.vary.add('Accept-Encoding')
+
+    version = request.args.get('v')
+    if version and version == asset_fingerprint(folder, filename):
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={DEFAULT_STATIC_MAX_AGE}'
+    return response
+
+# ==========================================
+# FLASK INTEGRATION
+# ==========================================
+
+def init_compression(app: Flask, min_size: int = MIN_SIZE):
+    """
+    Serve precompressed fingerprinted static files, add asset_url() to templates and
+    compress dynamic responses of at least min_size bytes (0 leaves them uncompressed)
+    """
+    if app.static_folder and os.path.isdir(app.static_folder):
+        precompress_static(app.static_folder)
+        app.view_functions['static'] = lambda filename: _serve_static(app, filename)
+
+    @app.template_global()
+    def asset_url(filename: str) -> str:
+        """URL of a static file with its content hash, so browsers can cache it for a year"""
+        version = asset_fingerprint(app.static_folder, filename)
+        return url_for('static', filename=filename, v=version) if version else url_for('static', filename=filename)
+
+    if not min_size:
+        return
+
+    @app.after_request
+    def _compress_response(response):
+        if (request.endpoint == 'static' or response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encodings = accepted_encodings()
+        if not encodings:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encodings[0]))
+        response.headers['Content-Encoding'] = encodings[0]
+        if response.headers.get('ETag'):
+            # A compressed body is a different representation from the identity one
+            response.headers['ETag'] = response.headers['ETag'].rstrip('"') + f'-{encodings[0]}"'
+        return response
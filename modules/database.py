@@ -3,129 +3,2006 @@ Database module for Ayurvedic Clinic Management System
 Handles SQLite database operations for patients and visits
 """
 
+import json
 import sqlite3
 import os
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import re
+import time
+import weakref
+from bisect import bisect_left
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, List, Dict, Optional, Tuple
 
 # Database file path
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'clinic.db')
 
+# ==========================================
+# CONNECTIONS AND QUERY HOOKS
+# ==========================================
+
+# Callbacks notified once a statement has finished:
+# listener(sql, duration_seconds, rows, parameters, connection)
+# parameters is None for executemany(); connection is still open when listeners run
+_query_listeners: List[Callable] = []
+
+def add_query_listener(listener: Callable) -> None:
+    """Register a callback that is told about every statement run through get_connection()"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+def remove_query_listener(listener: Callable) -> None:
+    """Unregister a query listener"""
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that measures each statement, including the time spent fetching its rows
+    SELECTs are reported once fully fetched (or when the cursor/connection closes)
+    """
+
+    _sql = None
+    _parameters = None
+    _elapsed = 0.0
+    _rows = 0
+
+    def _start(self, sql: str, parameters):
+        self._finish()
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._sql is None:
+            return
+        sql, parameters, elapsed, rows = self._sql, self._parameters, self._elapsed, self._rows
+        self._sql = self._parameters = None
+        for listener in list(_query_listeners):
+            try:
+                listener(sql, elapsed, rows, parameters, self.connection)
+            except Exception as e:
+                print(f"Error in query listener: {str(e)}")
+
+    def _run(self, method, sql, parameters, reported_parameters):
+        self._start(sql, reported_parameters)
+        started = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            self._elapsed += time.perf_counter() - started
+            if self.description is None:
+                # Writes and DDL have no rows to fetch, so they are complete now
+                self._rows = max(self.rowcount, 0)
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, None)
+
+    def executescript(self, sql_script):
+        return self._run(lambda script, _: super(TimedCursor, self).executescript(script), sql_script, None, None)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - started
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size if size is not None else self.arraysize)
+        self._elapsed += time.perf_counter() - started
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - started
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._elapsed += time.perf_counter() - started
+            self._finish()
+            raise
+        self._elapsed += time.perf_counter() - started
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # conn.execute(...).fetchone() drops the cursor before its result is exhausted
+        self._finish()
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors report statement timings to the query listeners
+    conn.execute()/executemany()/executescript() go through a TimedCursor too
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Weak, so long-lived connections do not keep every cursor they ever made
+        self._cursors = weakref.WeakSet()
+
+    def cursor(self, factory=TimedCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, TimedCursor):
+            self._cursors.add(cursor)
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def close(self):
+        # Report statements whose results were only partly fetched (e.g. a single fetchone)
+        for cursor in list(self._cursors):
+            cursor._finish()
+        self._cursors = weakref.WeakSet()
+        super().close()
+
+def get_connection(db_path: str = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Open a connection to the clinic database (or another SQLite file) with query hooks
+    SQL can call display_date(col) / storage_date(col) to convert dates inside a query
+    check_same_thread=False is for long-lived connections shared between threads (callers must lock)
+    """
+    conn = sqlite3.connect(db_path or DB_PATH, factory=TimedConnection, check_same_thread=check_same_thread)
+    conn.create_function('display_date', 1, format_date_for_display, deterministic=True)
+    conn.create_function('storage_date', 1, format_date_for_storage, deterministic=True)
+    return conn
+
+# ==========================================
+# ROW TYPES
+# ==========================================
+
+class Row(Mapping):
+    """
+    Compact, slotted query result that still behaves like the dicts it replaces:
+    row['name'], row.name (templates), row['visit_count'] = 3, row.update({...}), dict(row)
+    Formatted date fields are computed on access instead of per row up front
+    """
+
+    __slots__ = ('_extra',)
+    _fields: Tuple[str, ...] = ()
+    _computed: Tuple[str, ...] = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_extra', None)
+
+    @classmethod
+    def from_rows(cls, rows) -> List['Row']:
+        """Build row objects from cursor result tuples (columns in _fields order)"""
+        return [cls(*row) for row in rows]
+
+    def __getitem__(self, key):
+        if key in self._fields or key in self._computed:
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            object.__setattr__(self, key, value)
+        elif key in self._computed:
+            raise KeyError(f"{key} is derived and cannot be set")
+        else:
+            if self._extra is None:
+                object.__setattr__(self, '_extra', {})
+            self._extra[key] = value
+
+    def __getattr__(self, name):
+        # Only reached for names that are not slots/properties: extra fields set via row[key] = value
+        extra = object.__getattribute__(self, '_extra')
+        if extra is not None and name in extra:
+            return extra[name]
+        raise AttributeError(name)
+
+    def __iter__(self):
+        yield from self._fields
+        yield from self._computed
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self._fields) + len(self._computed) + (len(self._extra) if self._extra else 0)
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields or key in self._computed or bool(self._extra and key in self._extra)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{k}={self[k]!r}' for k in self)})"
+
+    def update(self, other=(), **kwargs):
+        """dict.update() equivalent"""
+        items = other.items() if isinstance(other, Mapping) else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def copy(self) -> 'Row':
+        duplicate = type(self)(*(getattr(self, name) for name in self._fields))
+        if self._extra:
+            object.__setattr__(duplicate, '_extra', dict(self._extra))
+        return duplicate
+
+    def to_dict(self) -> Dict:
+        """Plain dict (for JSON responses and other code that needs a real dict)"""
+        return {key: self[key] for key in self}
+
+class Patient(Row):
+    """Patient listing row"""
+    _fields = ('patient_id', 'name', 'age', 'gender', 'phone', 'weight', 'conditions', 'created_date')
+    _computed = ('created_date_formatted',)
+    __slots__ = _fields
+
+    @property
+    def created_date_formatted(self) -> str:
+        return format_date_for_display(self.created_date)
+
+class Visit(Row):
+    """Visit history row"""
+    _fields = ('visit_id', 'visit_date', 'symptoms', 'medicines', 'diet_notes', 'weight',
+               'blood_pressure', 'notes', 'created_timestamp')
+    _computed = ('visit_date_formatted',)
+    __slots__ = _fields
+
+    @property
+    def visit_date_formatted(self) -> str:
+        return format_date_for_display(self.visit_date)
+
+class AuditEntry(Row):
+    """audit_log row"""
+    _fields = ('log_id', 'action', 'table_name', 'record_id', 'old_data', 'new_data', 'user_id',
+               'timestamp', 'ip_address', 'details')
+    __slots__ = _fields
+
+class DeletedRecord(Row):
+    """deleted_records row plus the name of the deleted patient"""
+    _fields = ('deletion_id', 'table_name', 'record_id', 'original_data', 'deleted_by', 'deletion_reason',
+               'deletion_timestamp', 'can_restore', 'record_name')
+    _computed = ('merged',)
+    __slots__ = _fields
+
+    def __init__(self, *values):
+        super().__init__(*values)
+        object.__setattr__(self, 'can_restore', bool(self.can_restore))
+
+    @property
+    def merged(self) -> bool:
+        """Deleted by merge_patients (brought back with undo_merge, not restore)"""
+        return (self.deletion_reason or '').startswith('Merged into')
+
+# ==========================================
+# DATE CONVERSION
+# ==========================================
+
+# Distinct date strings remembered per process; visit and registration dates repeat heavily
+DATE_CACHE_SIZE = 4096
+
+# Days per month, February checked separately for leap years
+_MONTH_DAYS = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _valid_ymd(year: str, month: str, day: str) -> bool:
+    """True when the digit strings form a real calendar date"""
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return False
+    y, m, d = int(year), int(month), int(day)
+    if y < 1000 or not 1 <= m <= 12 or not 1 <= d <= _MONTH_DAYS[m - 1]:
+        return False
+    return m != 2 or d < 29 or (y % 4 == 0 and (y % 100 != 0 or y % 400 == 0))
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _display_date(date_str: str) -> str:
+    # Fast path: slice well-formed YYYY-MM-DD[...] without going through strptime/strftime
+    if len(date_str) >= 10 and date_str[4] == '-' and date_str[7] == '-':
+        year, month, day = date_str[:4], date_str[5:7], date_str[8:10]
+        if _valid_ymd(year, month, day):
+            return f"{day}/{month}/{year}"
+    try:
+        return datetime.strptime(date_str[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return date_str
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _storage_date(date_str: str) -> str:
+    # Fast path: slice well-formed DD/MM/YYYY
+    if len(date_str) == 10 and date_str[2] == '/' and date_str[5] == '/':
+        day, month, year = date_str[:2], date_str[3:5], date_str[6:]
+        if _valid_ymd(year, month, day):
+            return f"{year}-{month}-{day}"
+    try:
+        return datetime.strptime(date_str, '%d/%m/%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return date_str
+
 def format_date_for_display(date_str: str) -> str:
     """Convert date from YYYY-MM-DD to DD/MM/YYYY format for display"""
-    try:
-        if date_str:
-            date_obj = datetime.strptime(date_str[:10], '%Y-%m-%d')
-            return date_obj.strftime('%d/%m/%Y')
+    if not date_str:
         return ""
-    except:
+    if not isinstance(date_str, str):
         return date_str
+    return _display_date(date_str)
 
 def format_date_for_storage(date_str: str) -> str:
     """Convert date from DD/MM/YYYY to YYYY-MM-DD format for storage"""
-    try:
-        if '/' in date_str:
-            date_obj = datetime.strptime(date_str, '%d/%m/%Y')
-            return date_obj.strftime('%Y-%m-%d')
-        return date_str
-    except:
+    if not isinstance(date_str, str) or '/' not in date_str:
         return date_str
+    return _storage_date(date_str)
 
 def get_today_formatted() -> str:
     """Get today's date in DD/MM/YYYY format"""
     return datetime.now().strftime('%d/%m/%Y')
 
-def init_database():
-    """Initialize the database and create tables if they don't exist"""
+# ==========================================
+# VISIT TERM INDEX
+# ==========================================
+
+# visit_terms field -> visits column it is built from
+TERM_FIELDS = {'medicine': 'medicines', 'symptom': 'symptoms'}
+
+# Words that carry no meaning on their own in prescriptions and complaints
+TERM_STOPWORDS = frozenset('''
+    and with the for after before from into onto over under then than this that also
+    once twice thrice daily day days week weeks month months time times morning noon evening night bedtime
+    tab tabs tablet tablets cap caps capsule capsules dose doses drop drops tsp tbsp spoon spoons gram grams
+    bd od tds qid sos per each every half full empty stomach food meal meals warm hot cold water milk honey
+    mild moderate severe slight slightly very some since past last few many more less not has have had
+'''.split())
+
+_TERM_PATTERN = re.compile(r'[a-z]+')
+
+# Medicine and symptom texts repeat heavily ("Triphala churna"), so tokenized texts are cached
+TERM_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=TERM_CACHE_SIZE)
+def _tokenize(text: str) -> Tuple[str, ...]:
+    terms = []
+    for word in _TERM_PATTERN.findall(text.lower()):
+        if len(word) < 3 or word in TERM_STOPWORDS:
+            continue
+        # Light plural folding: pains -> pain, headaches -> headache (not sinus, abdominis, loss)
+        if len(word) > 4 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        if word not in terms:
+            terms.append(word)
+    return tuple(terms)
+
+def tokenize_visit_text(text: str) -> List[str]:
+    """Normalized index terms of a medicines/symptoms text (lowercase words, no doses or filler, singular)"""
+    if not text or not isinstance(text, str):
+        return []
+    return list(_tokenize(text))
+
+def _index_visits(cursor: sqlite3.Cursor, condition: str, params: Tuple = ()) -> int:
+    """(Re)index the terms of active visits matching condition (on visits v); returns terms written"""
+    cursor.execute(f"DELETE FROM visit_terms WHERE visit_id IN (SELECT v.visit_id FROM visits v WHERE {condition})",
+                   params)
+    cursor.execute(f'''
+        SELECT v.visit_id, v.patient_id, v.visit_date, v.symptoms, v.medicines
+        FROM visits v JOIN patients p ON p.patient_id = v.patient_id
+        WHERE (v.is_deleted = 0 OR v.is_deleted IS NULL) AND (p.is_deleted = 0 OR p.is_deleted IS NULL)
+          AND {condition}
+    ''', params)
+    rows = []
+    for visit_id, patient_id, visit_date, symptoms, medicines in cursor.fetchall():
+        for field, text in (('symptom', symptoms), ('medicine', medicines)):
+            for term in tokenize_visit_text(text):
+                rows.append((field, term, visit_id, patient_id, visit_date))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO visit_terms (field, term, visit_id, patient_id, visit_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
+
+def index_new_visit_terms(cursor: sqlite3.Cursor, after_visit_id: int) -> int:
+    """Index visits inserted after after_visit_id in the caller's transaction (bulk imports)"""
+    return _index_visits(cursor, 'v.visit_id > ?', (after_visit_id,))
+
+def rebuild_visit_terms() -> Tuple[bool, str]:
+    """
+    Rebuild the whole term index from the visits table
+    Returns: (success: bool, message: str)
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
-        
-        # Create patients table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS patients (
-                patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                gender TEXT NOT NULL,
-                phone TEXT UNIQUE NOT NULL,
-                weight REAL,
-                conditions TEXT,
-                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create visits table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS visits (
-                visit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cursor.execute("DELETE FROM visit_terms")
+        count = _index_visits(cursor, '1')
+        conn.commit()
+        conn.close()
+        return True, f"Indexed {count} medicine/symptom terms"
+    except Exception as e:
+        return False, f"Error rebuilding term index: {str(e)}"
+
+def _term_filters(field: str, terms: List[str], start_date: str = None, end_date: str = None,
+                  alias: str = 't') -> Tuple[str, List]:
+    """WHERE clause (and parameters) for rows of one field matching any of terms within a date range"""
+    clauses = [f"{alias}.field = ?"]
+    params = [field]
+    if terms:
+        clauses.append(f"{alias}.term IN ({','.join('?' * len(terms))})")
+        params.extend(terms)
+    if start_date:
+        clauses.append(f"{alias}.visit_date >= ?")
+        params.append(format_date_for_storage(start_date))
+    if end_date:
+        clauses.append(f"{alias}.visit_date <= ?")
+        params.append(format_date_for_storage(end_date))
+    return ' AND '.join(clauses), params
+
+def get_top_terms(field: str = 'medicine', limit: int = 20, start_date: str = None,
+                  end_date: str = None) -> List[Dict]:
+    """Most frequent medicine or symptom terms: [{'term', 'visits', 'patients'}]"""
+    try:
+        where, params = _term_filters(field, [], start_date, end_date)
+        conn = get_connection()
+        rows = conn.execute(f'''
+            SELECT t.term, COUNT(*) AS visits, COUNT(DISTINCT t.patient_id)
+            FROM visit_terms t WHERE {where}
+            GROUP BY t.term ORDER BY visits DESC, t.term LIMIT ?
+        ''', params + [limit]).fetchall()
+        conn.close()
+        return [{'term': term, 'visits': visits, 'patients': patients} for term, visits, patients in rows]
+    except Exception as e:
+        print(f"Error getting top terms: {str(e)}")
+        return []
+
+def _matching_visits_sql(field: str, terms: List[str], start_date: str = None,
+                         end_date: str = None) -> Tuple[str, List]:
+    """Subquery of visits whose field contains every one of terms (driven by the first, the rest probed by key)"""
+    where, params = _term_filters(field, terms[:1], start_date, end_date)
+    for term in terms[1:]:
+        where += (" AND EXISTS (SELECT 1 FROM visit_terms o"
+                  " WHERE o.field = t.field AND o.term = ? AND o.visit_id = t.visit_id)")
+        params.append(term)
+    return f"SELECT t.visit_id, t.patient_id, t.visit_date FROM visit_terms t WHERE {where}", params
+
+def get_term_cooccurrence(query: str, field: str = 'symptom', other_field: str = 'medicine', limit: int = 20,
+                          start_date: str = None, end_date: str = None) -> List[Dict]:
+    """
+    Terms of other_field recorded in the same visits as query (all of its words) in field
+    e.g. medicines prescribed for 'joint pain': [{'term', 'visits'}]
+    """
+    terms = tokenize_visit_text(query)
+    if not terms:
+        return []
+    try:
+        matches, params = _matching_visits_sql(field, terms, start_date, end_date)
+        params.append(other_field)
+        exclude = ''
+        if other_field == field:
+            exclude = f"AND o.term NOT IN ({','.join('?' * len(terms))})"
+            params.extend(terms)
+        conn = get_connection()
+        # CROSS JOIN fixes the join order: matching visits first, then their terms by index
+        rows = conn.execute(f'''
+            SELECT o.term, COUNT(*) AS visits
+            FROM ({matches}) m CROSS JOIN visit_terms o ON o.visit_id = m.visit_id
+            WHERE o.field = ? {exclude}
+            GROUP BY o.term ORDER BY visits DESC, o.term LIMIT ?
+        ''', params + [limit]).fetchall()
+        conn.close()
+        return [{'term': term, 'visits': visits} for term, visits in rows]
+    except Exception as e:
+        print(f"Error getting term co-occurrence: {str(e)}")
+        return []
+
+def find_patients_by_term(query: str, field: str = 'medicine', start_date: str = None, end_date: str = None,
+                          limit: int = 100) -> List[Dict]:
+    """
+    Patients with visits whose field contains every word of query (e.g. prescribed 'Triphala' this year)
+    Returns [{'patient_id', 'name', 'phone', 'visits', 'last_visit_date', 'last_visit_date_formatted'}]
+    """
+    terms = tokenize_visit_text(query)
+    if not terms:
+        return []
+    try:
+        matches, params = _matching_visits_sql(field, terms, start_date, end_date)
+        conn = get_connection()
+        rows = conn.execute(f'''
+            SELECT p.patient_id, p.name, p.phone, COUNT(*) AS visits, MAX(m.visit_date) AS last_visit_date
+            FROM ({matches}) m JOIN patients p ON p.patient_id = m.patient_id
+            GROUP BY p.patient_id ORDER BY last_visit_date DESC, p.name LIMIT ?
+        ''', params + [limit]).fetchall()
+        conn.close()
+        return [{
+            'patient_id': patient_id,
+            'name': name,
+            'phone': phone,
+            'visits': visits,
+            'last_visit_date': last_visit_date,
+            'last_visit_date_formatted': format_date_for_display(last_visit_date)
+        } for patient_id, name, phone, visits, last_visit_date in rows]
+    except Exception as e:
+        print(f"Error finding patients by term: {str(e)}")
+        return []
+
+def get_patient_terms(patient_id: int) -> Dict[str, List[Dict]]:
+    """A patient's medicine and symptom terms, most frequent first: {field: [{'term', 'visits', 'last_visit_date'}]}"""
+    result = {field: [] for field in TERM_FIELDS}
+    try:
+        conn = get_connection()
+        rows = conn.execute('''
+            SELECT field, term, COUNT(*) AS visits, MAX(visit_date)
+            FROM visit_terms WHERE patient_id = ?
+            GROUP BY field, term ORDER BY field, visits DESC, term
+        ''', (patient_id,)).fetchall()
+        conn.close()
+        for field, term, visits, last_visit_date in rows:
+            result[field].append({'term': term, 'visits': visits, 'last_visit_date': last_visit_date,
+                                  'last_visit_date_formatted': format_date_for_display(last_visit_date)})
+        return result
+    except Exception as e:
+        print(f"Error getting patient terms: {str(e)}")
+        return result
+
+# ==========================================
+# VITALS TIME SERIES
+# ==========================================
+
+# Metrics stored in vitals, one row per visit and metric
+VITAL_METRICS = ('weight', 'systolic', 'diastolic')
+
+_BP_READING = re.compile(r'(\d{2,3})\s*/\s*(\d{2,3})')
+
+def parse_blood_pressure(text: str) -> Optional[Tuple[int, int]]:
+    """(systolic, diastolic) from free text like '130/85' or 'BP 130 / 85 mmHg'; None if no plausible reading"""
+    if not text or not isinstance(text, str):
+        return None
+    match = _BP_READING.search(text)
+    if not match:
+        return None
+    systolic, diastolic = int(match.group(1)), int(match.group(2))
+    if not (50 <= systolic <= 300 and 30 <= diastolic <= 200 and systolic > diastolic):
+        return None
+    return systolic, diastolic
+
+def _index_vitals(cursor: sqlite3.Cursor, condition: str, params: Tuple = ()) -> int:
+    """(Re)write the vitals of active visits matching condition (on visits v); returns rows written"""
+    cursor.execute(f"DELETE FROM vitals WHERE visit_id IN (SELECT v.visit_id FROM visits v WHERE {condition})", params)
+    cursor.execute(f'''
+        SELECT v.visit_id, v.patient_id, v.visit_date, v.weight, v.blood_pressure
+        FROM visits v JOIN patients p ON p.patient_id = v.patient_id
+        WHERE (v.is_deleted = 0 OR v.is_deleted IS NULL) AND (p.is_deleted = 0 OR p.is_deleted IS NULL)
+          AND (v.weight > 0 OR v.blood_pressure IS NOT NULL) AND {condition}
+    ''', params)
+    rows = []
+    for visit_id, patient_id, visit_date, weight, blood_pressure in cursor.fetchall():
+        if weight and weight > 0:
+            rows.append((patient_id, 'weight', visit_date, visit_id, float(weight)))
+        reading = parse_blood_pressure(blood_pressure)
+        if reading:
+            rows.append((patient_id, 'systolic', visit_date, visit_id, reading[0]))
+            rows.append((patient_id, 'diastolic', visit_date, visit_id, reading[1]))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO vitals (patient_id, metric, recorded_date, visit_id, value)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
+
+def index_new_vitals(cursor: sqlite3.Cursor, after_visit_id: int) -> int:
+    """Record vitals of visits inserted after after_visit_id in the caller's transaction (bulk imports)"""
+    return _index_vitals(cursor, 'v.visit_id > ?', (after_visit_id,))
+
+def backfill_vitals(batch_size: int = 2000) -> Tuple[bool, str]:
+    """
+    Fill vitals for visits that have a weight or blood pressure but no vitals rows yet
+    Runs in batches of visit ids, one short transaction each, so the clinic stays writable meanwhile
+    Returns: (success: bool, message: str)
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        last_visit_id = written = visits = 0
+        while True:
+            cursor.execute('''
+                SELECT v.visit_id FROM visits v
+                WHERE v.visit_id > ? AND (v.weight > 0 OR v.blood_pressure IS NOT NULL)
+                  AND NOT EXISTS (SELECT 1 FROM vitals s WHERE s.visit_id = v.visit_id)
+                ORDER BY v.visit_id LIMIT ?
+            ''', (last_visit_id, batch_size))
+            visit_ids = [row[0] for row in cursor.fetchall()]
+            if not visit_ids:
+                break
+            written += _index_vitals(cursor, 'v.visit_id BETWEEN ? AND ? AND NOT EXISTS '
+                                             '(SELECT 1 FROM vitals s WHERE s.visit_id = v.visit_id)',
+                                     (visit_ids[0], visit_ids[-1]))
+            conn.commit()
+            visits += len(visit_ids)
+            last_visit_id = visit_ids[-1]
+        conn.close()
+        return True, f"Backfilled {written} vitals readings ({visits} visits checked)"
+    except Exception as e:
+        return False, f"Error backfilling vitals: {str(e)}"
+
+def get_patient_vitals(patient_id: int, metric: str = 'weight', start_date: str = None,
+                       end_date: str = None) -> List[Dict]:
+    """One metric of a patient's vitals, oldest first: [{'date', 'value', 'visit_id'}]"""
+    try:
+        sql = "SELECT recorded_date, value, visit_id FROM vitals WHERE patient_id = ? AND metric = ?"
+        params = [patient_id, metric]
+        if start_date:
+            sql += " AND recorded_date >= ?"
+            params.append(format_date_for_storage(start_date))
+        if end_date:
+            sql += " AND recorded_date <= ?"
+            params.append(format_date_for_storage(end_date))
+        conn = get_connection()
+        # The primary key already orders rows by date within (patient, metric)
+        rows = conn.execute(sql + " ORDER BY recorded_date, visit_id", params).fetchall()
+        conn.close()
+        return [{'date': date, 'value': value, 'visit_id': visit_id} for date, value, visit_id in rows]
+    except Exception as e:
+        print(f"Error getting patient vitals: {str(e)}")
+        return []
+
+# ==========================================
+# FOLLOW-UPS
+# ==========================================
+
+# Next-due date = latest visit + the patient's usual gap (median of recent gaps), clamped to this range
+FOLLOWUP_DEFAULT_DAYS = 30
+FOLLOWUP_MIN_DAYS = 7
+FOLLOWUP_MAX_DAYS = 90
+FOLLOWUP_HISTORY = 5
+
+def _followup_interval(visit_dates: List[str]) -> int:
+    """Median gap in days between the given visit dates (newest first); the default for a first visit"""
+    days = []
+    for visit_date in visit_dates:
+        try:
+            days.append(datetime.strptime(visit_date[:10], '%Y-%m-%d').toordinal())
+        except (TypeError, ValueError):
+            continue
+    gaps = sorted(newer - older for newer, older in zip(days, days[1:]) if newer > older)
+    if not gaps:
+        return FOLLOWUP_DEFAULT_DAYS
+    median = gaps[len(gaps) // 2] if len(gaps) % 2 else (gaps[len(gaps) // 2 - 1] + gaps[len(gaps) // 2]) // 2
+    return min(max(median, FOLLOWUP_MIN_DAYS), FOLLOWUP_MAX_DAYS)
+
+def _schedule_followup(cursor: sqlite3.Cursor, patient_id: int, due_date: str = None) -> Optional[str]:
+    """
+    Set a patient's next follow-up: due_date if given, otherwise derived from their latest visits
+    (removed when they have none). One indexed upsert; returns the due date
+    """
+    cursor.execute('''
+        SELECT visit_id, visit_date FROM visits
+        WHERE patient_id = ? AND (is_deleted = 0 OR is_deleted IS NULL)
+        ORDER BY visit_date DESC, visit_id DESC LIMIT ?
+    ''', (patient_id, FOLLOWUP_HISTORY + 1))
+    visits = cursor.fetchall()
+    visit_id = visits[0][0] if visits else None
+
+    if due_date:
+        source, interval = 'explicit', None
+    elif visits:
+        source, interval = 'interval', _followup_interval([row[1] for row in visits])
+        try:
+            due_date = (datetime.strptime(visits[0][1][:10], '%Y-%m-%d') + timedelta(days=interval)).strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            due_date = None
+    if not due_date:
+        cursor.execute('DELETE FROM followups WHERE patient_id = ?', (patient_id,))
+        return None
+
+    cursor.execute('''
+        INSERT INTO followups (patient_id, due_date, source, visit_id, interval_days, updated_at)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(patient_id) DO UPDATE SET
+            due_date = excluded.due_date, source = excluded.source, visit_id = excluded.visit_id,
+            interval_days = excluded.interval_days, updated_at = excluded.updated_at
+    ''', (patient_id, due_date, source, visit_id, interval))
+    return due_date
+
+def _reschedule_after_visit_removed(cursor: sqlite3.Cursor, patient_id: int, visit_id: int):
+    """Re-derive the follow-up if it was scheduled from the visit that was just removed"""
+    cursor.execute('SELECT visit_id FROM followups WHERE patient_id = ?', (patient_id,))
+    row = cursor.fetchone()
+    if row and row[0] == visit_id:
+        _schedule_followup(cursor, patient_id)
+
+def _schedule_followups(cursor: sqlite3.Cursor, condition: str, params: Tuple = ()) -> int:
+    """Re-derive follow-ups of active patients with active visits matching condition (on visits v)"""
+    cursor.execute(f'''
+        SELECT DISTINCT v.patient_id FROM visits v JOIN patients p ON p.patient_id = v.patient_id
+        WHERE (v.is_deleted = 0 OR v.is_deleted IS NULL) AND (p.is_deleted = 0 OR p.is_deleted IS NULL)
+          AND {condition}
+    ''', params)
+    patient_ids = [row[0] for row in cursor.fetchall()]
+    for patient_id in patient_ids:
+        _schedule_followup(cursor, patient_id)
+    return len(patient_ids)
+
+def index_new_followups(cursor: sqlite3.Cursor, after_visit_id: int) -> int:
+    """Reschedule patients with visits inserted after after_visit_id in the caller's transaction (bulk imports)"""
+    return _schedule_followups(cursor, 'v.visit_id > ?', (after_visit_id,))
+
+def rebuild_followups() -> Tuple[bool, str]:
+    """
+    Re-derive every active patient's follow-up from their visits (explicit dates are replaced)
+    Returns: (success: bool, message: str)
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM followups")
+        scheduled = _schedule_followups(cursor, '1')
+        conn.commit()
+        conn.close()
+        return True, f"Scheduled follow-ups for {scheduled} patients"
+    except Exception as e:
+        return False, f"Error rebuilding follow-ups: {str(e)}"
+
+def schedule_followup(patient_id: int, due_date: str) -> Tuple[bool, str]:
+    """
+    Set a patient's next follow-up date explicitly (DD/MM/YYYY or YYYY-MM-DD)
+    Returns: (success: bool, message: str)
+    """
+    try:
+        storage_date = format_date_for_storage(due_date)
+        datetime.strptime(storage_date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return False, "Invalid follow-up date"
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM patients WHERE patient_id = ? AND (is_deleted = 0 OR is_deleted IS NULL)",
+                       (patient_id,))
+        patient = cursor.fetchone()
+        if not patient:
+            conn.close()
+            return False, "Patient not found"
+        _schedule_followup(cursor, patient_id, storage_date)
+        conn.commit()
+        conn.close()
+        return True, f"Follow-up for {patient[0]} set to {format_date_for_display(storage_date)}"
+    except Exception as e:
+        return False, f"Error scheduling follow-up: {str(e)}"
+
+def clear_followup(patient_id: int) -> Tuple[bool, str]:
+    """
+    Remove a patient's pending follow-up (a new visit schedules the next one again)
+    Returns: (success: bool, message: str)
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM followups WHERE patient_id = ?', (patient_id,))
+        removed = cursor.rowcount
+        conn.commit()
+        conn.close()
+        if not removed:
+            return False, "No follow-up scheduled for this patient"
+        return True, "Follow-up cleared"
+    except Exception as e:
+        return False, f"Error clearing follow-up: {str(e)}"
+
+def get_patient_followup(patient_id: int) -> Optional[Dict]:
+    """A patient's next follow-up: {'due_date', 'due_date_formatted', 'source', 'interval_days', 'days_until'}"""
+    try:
+        conn = get_connection()
+        row = conn.execute('SELECT due_date, source, interval_days FROM followups WHERE patient_id = ?',
+                           (patient_id,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        days_until = (datetime.strptime(row[0], '%Y-%m-%d').date() - datetime.now().date()).days
+        return {'due_date': row[0], 'due_date_formatted': format_date_for_display(row[0]), 'source': row[1],
+                'interval_days': row[2], 'days_until': days_until}
+    except Exception as e:
+        print(f"Error getting patient follow-up: {str(e)}")
+        return None
+
+def get_followup_lists(today: str = None, days: int = 7, limit: int = 50) -> Dict:
+    """
+    Follow-up work lists, each a range scan of the due_date index:
+    due_today, overdue (the last `days` days), upcoming (the next `days` days), plus
+    overdue_earlier (count of follow-ups overdue for longer)
+    Entries: {'patient_id', 'name', 'phone', 'due_date', 'due_date_formatted', 'days_overdue', 'source'}
+    """
+    result = {'due_today': [], 'overdue': [], 'upcoming': [], 'overdue_earlier': 0}
+    try:
+        today_date = datetime.strptime(format_date_for_storage(today), '%Y-%m-%d').date() if today else datetime.now().date()
+        day = lambda offset: (today_date + timedelta(days=offset)).strftime('%Y-%m-%d')
+        ranges = {
+            'due_today': (day(0), day(0)),
+            'overdue': (day(-days), day(-1)),
+            'upcoming': (day(1), day(days))
+        }
+        conn = get_connection()
+        for name, (first, last) in ranges.items():
+            rows = conn.execute('''
+                SELECT f.patient_id, p.name, p.phone, f.due_date, f.source
+                FROM followups f JOIN patients p ON p.patient_id = f.patient_id
+                WHERE f.due_date BETWEEN ? AND ? AND (p.is_deleted = 0 OR p.is_deleted IS NULL)
+                ORDER BY f.due_date, p.name LIMIT ?
+            ''', (first, last, limit)).fetchall()
+            result[name] = [{
+                'patient_id': patient_id,
+                'name': patient_name,
+                'phone': phone,
+                'due_date': due_date,
+                'due_date_formatted': format_date_for_display(due_date),
+                'days_overdue': (today_date - datetime.strptime(due_date, '%Y-%m-%d').date()).days,
+                'source': source
+            } for patient_id, patient_name, phone, due_date, source in rows]
+        result['overdue_earlier'] = conn.execute("SELECT COUNT(*) FROM followups WHERE due_date < ?",
+                                                 (day(-days),)).fetchone()[0]
+        conn.close()
+        return result
+    except Exception as e:
+        print(f"Error getting follow-up lists: {str(e)}")
+        return result
+
+# ==========================================
+# DAILY QUEUE
+# ==========================================
+
+# Token lifecycle; a patient can be sent back to waiting, and a cancelled token re-opened
+QUEUE_STATUSES = ('waiting', 'in_consultation', 'done', 'cancelled')
+QUEUE_TRANSITIONS = {
+    'waiting': ('in_consultation', 'cancelled'),
+    'in_consultation': ('done', 'waiting'),
+    'done': (),
+    'cancelled': ('waiting',)
+}
+
+_QUEUE_COLUMNS = ('queue_date, token, patient_id, status, version, notes, '
+                  'checked_in_at, started_at, finished_at, updated_at')
+
+def _queue_timestamp() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def _archive_queue(cursor: sqlite3.Cursor, today: str) -> int:
+    """Move earlier days' tokens to queue_history, so queue_entries only ever holds today's"""
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO queue_history ({_QUEUE_COLUMNS})
+        SELECT {_QUEUE_COLUMNS} FROM queue_entries WHERE queue_date < ?
+    ''', (today,))
+    moved = cursor.rowcount
+    if moved:
+        cursor.execute("DELETE FROM queue_entries WHERE queue_date < ?", (today,))
+    cursor.execute("DELETE FROM queue_state WHERE queue_date < ?", (today,))
+    return moved
+
+def check_in_patient(patient_id: int, notes: str = None) -> Tuple[bool, str, Optional[int]]:
+    """
+    Add a patient to today's queue with the next token number
+    Tokens are handed out under the write lock, so receptionists checking in at the same
+    moment never share one
+    Returns: (success: bool, message: str, token: int)
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        conn = get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT name FROM patients WHERE patient_id = ? AND (is_deleted = 0 OR is_deleted IS NULL)",
+                           (patient_id,))
+            patient = cursor.fetchone()
+            if not patient:
+                cursor.execute("ROLLBACK")
+                return False, "Patient not found", None
+            cursor.execute('''
+                SELECT token FROM queue_entries
+                WHERE queue_date = ? AND patient_id = ? AND status IN ('waiting', 'in_consultation')
+            ''', (today, patient_id))
+            queued = cursor.fetchone()
+            if queued:
+                cursor.execute("ROLLBACK")
+                return False, f"{patient[0]} is already in today's queue (token {queued[0]})", queued[0]
+
+            _archive_queue(cursor, today)
+            cursor.execute('''
+                INSERT INTO queue_state (queue_date, last_token, version) VALUES (?, 1, 1)
+                ON CONFLICT(queue_date) DO UPDATE SET last_token = last_token + 1, version = version + 1
+            ''', (today,))
+            cursor.execute("SELECT last_token FROM queue_state WHERE queue_date = ?", (today,))
+            token = cursor.fetchone()[0]
+            now = _queue_timestamp()
+            cursor.execute('''
+                INSERT INTO queue_entries (queue_date, token, patient_id, status, version, notes,
+                                           checked_in_at, updated_at)
+                VALUES (?, ?, ?, 'waiting', 1, ?, ?, ?)
+            ''', (today, token, patient_id, notes, now, now))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return True, f"{patient[0]} checked in with token {token}", token
+    except Exception as e:
+        return False, f"Error checking in patient: {str(e)}", None
+
+def update_queue_entry(token: int, status: str, expected_version: int) -> Tuple[bool, str]:
+    """
+    Move one of today's tokens to a new status (optimistic concurrency)
+    expected_version is the entry's version as last shown to the user; if someone else changed
+    the entry since, nothing is written and the caller should refresh
+    Returns: (success: bool, message: str)
+    """
+    if status not in QUEUE_STATUSES:
+        return False, f"Unknown queue status '{status}'"
+    allowed_from = [current for current, targets in QUEUE_TRANSITIONS.items() if status in targets]
+    if not allowed_from:
+        return False, f"Tokens cannot be moved to '{status}'"
+    today = datetime.now().strftime('%Y-%m-%d')
+    now = _queue_timestamp()
+    conn = None
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' for _ in allowed_from)
+            cursor.execute(f'''
+                UPDATE queue_entries
+                SET status = ?, version = version + 1, updated_at = ?,
+                    started_at = CASE WHEN ? = 'in_consultation' THEN ? ELSE started_at END,
+                    finished_at = CASE WHEN ? IN ('done', 'cancelled') THEN ? END
+                WHERE queue_date = ? AND token = ? AND version = ? AND status IN ({placeholders})
+            ''', (status, now, status, now, status, now, today, token, expected_version, *allowed_from))
+            if cursor.rowcount:
+                cursor.execute("UPDATE queue_state SET version = version + 1 WHERE queue_date = ?", (today,))
+                return True, f"Token {token} is now {status.replace('_', ' ')}"
+
+            cursor.execute("SELECT status, version FROM queue_entries WHERE queue_date = ? AND token = ?",
+                           (today, token))
+            current = cursor.fetchone()
+        if not current:
+            return False, f"Token {token} is not in today's queue"
+        if current[1] != expected_version:
+            return False, (f"Token {token} was changed by someone else (now {current[0].replace('_', ' ')}); "
+                           f"please check the queue and try again")
+        return False, f"Token {token} is {current[0].replace('_', ' ')} and cannot be moved to {status.replace('_', ' ')}"
+    except Exception as e:
+        return False, f"Error updating queue: {str(e)}"
+    finally:
+        if conn:
+            conn.close()
+
+def get_queue_version(conn: sqlite3.Connection = None) -> int:
+    """
+    Change counter of today's queue (0 before the first check-in); poll this to detect updates
+    Pass a long-lived connection to make this a single primary-key read
+    """
+    own_connection = conn is None
+    try:
+        if own_connection:
+            conn = get_connection()
+        row = conn.execute("SELECT version FROM queue_state WHERE queue_date = ?",
+                           (datetime.now().strftime('%Y-%m-%d'),)).fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        print(f"Error getting queue version: {str(e)}")
+        return 0
+    finally:
+        if own_connection and conn is not None:
+            conn.close()
+
+def get_queue(queue_date: str = None) -> Dict:
+    """
+    A day's queue (today by default) in token order:
+    {'date', 'date_formatted', 'version', 'counts': {status: n}, 'entries': [...]}
+    Entries carry patient name and phone, status, version (for update_queue_entry), times and
+    wait_minutes (check-in to consultation, or until now while waiting)
+    """
+    day = format_date_for_storage(queue_date) if queue_date else datetime.now().strftime('%Y-%m-%d')
+    result = {'date': day, 'date_formatted': format_date_for_display(day), 'version': 0,
+              'counts': {status: 0 for status in QUEUE_STATUSES}, 'entries': []}
+    try:
+        conn = get_connection()
+        state = conn.execute("SELECT version FROM queue_state WHERE queue_date = ?", (day,)).fetchone()
+        # Until the first check-in of a new day, the previous day is still in queue_entries
+        rows = conn.execute(f'''
+            SELECT q.token, q.patient_id, p.name, p.phone, q.status, q.version, q.notes,
+                   q.checked_in_at, q.started_at, q.finished_at
+            FROM (SELECT {_QUEUE_COLUMNS} FROM queue_entries WHERE queue_date = ?
+                  UNION ALL
+                  SELECT {_QUEUE_COLUMNS} FROM queue_history WHERE queue_date = ?) q
+            LEFT JOIN patients p ON p.patient_id = q.patient_id
+            ORDER BY q.token
+        ''', (day, day)).fetchall()
+        conn.close()
+    except Exception as e:
+        print(f"Error getting queue: {str(e)}")
+        return result
+
+    now = datetime.now()
+    result['version'] = state[0] if state else 0
+    for token, patient_id, name, phone, status, version, notes, checked_in_at, started_at, finished_at in rows:
+        wait_minutes = None
+        try:
+            waited_until = datetime.strptime(started_at, '%Y-%m-%d %H:%M:%S') if started_at else now
+            if started_at or status == 'waiting':
+                wait_minutes = max(int((waited_until - datetime.strptime(checked_in_at, '%Y-%m-%d %H:%M:%S'))
+                                       .total_seconds() // 60), 0)
+        except (TypeError, ValueError):
+            pass
+        result['counts'][status] = result['counts'].get(status, 0) + 1
+        result['entries'].append({
+            'token': token,
+            'patient_id': patient_id,
+            'name': name,
+            'phone': phone,
+            'status': status,
+            'version': version,
+            'notes': notes,
+            'checked_in_at': checked_in_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+            'wait_minutes': wait_minutes,
+            'next_statuses': list(QUEUE_TRANSITIONS.get(status, ()))
+        })
+    return result
+
+# ==========================================
+# CHANGE LOG
+# ==========================================
+
+# Tables whose row writes are recorded in change_log by triggers, with their row id column
+CHANGE_LOG_TABLES = {
+    'patients': 'patient_id',
+    'visits': 'visit_id',
+    'deleted_records': 'deletion_id'
+}
+
+def _change_rows(rows) -> List[Dict]:
+    return [{'seq': seq, 'table': table_name, 'row_id': row_id, 'op': op, 'changed_at': changed_at}
+            for seq, table_name, row_id, op, changed_at in rows]
+
+def get_changes(after_seq: int = 0, limit: int = 1000, tables: List[str] = None) -> List[Dict]:
+    """
+    Changes recorded after after_seq, oldest first: [{'seq', 'table', 'row_id', 'op', 'changed_at'}]
+    op is 'insert', 'update' or 'delete'; one entry per row written
+    """
+    try:
+        sql = "SELECT seq, table_name, row_id, op, changed_at FROM change_log WHERE seq > ?"
+        params = [after_seq]
+        if tables:
+            sql += f" AND table_name IN ({', '.join('?' for _ in tables)})"
+            params.extend(tables)
+        conn = get_connection()
+        rows = conn.execute(sql + " ORDER BY seq LIMIT ?", params + [limit]).fetchall()
+        conn.close()
+        return _change_rows(rows)
+    except Exception as e:
+        print(f"Error reading change log: {str(e)}")
+        return []
+
+def register_change_consumer(consumer: str, from_start: bool = False) -> Tuple[bool, str]:
+    """
+    Create a named consumer; it starts at the latest change (build your structure first, then follow
+    the log) or, with from_start, at the oldest change still in the log. Existing consumers are kept
+    Returns: (success: bool, message: str)
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            if from_start:
+                start = conn.execute("SELECT COALESCE(MIN(seq), 1) - 1 FROM change_log").fetchone()[0]
+            else:
+                start = get_data_version(conn)
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO change_consumers (consumer, last_seq, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', (consumer, start))
+            created = cursor.rowcount
+        conn.close()
+        if not created:
+            return True, f"Consumer '{consumer}' already registered"
+        return True, f"Consumer '{consumer}' registered at change {start}"
+    except Exception as e:
+        return False, f"Error registering change consumer: {str(e)}"
+
+def get_consumer_offset(consumer: str) -> Optional[int]:
+    """Sequence number of the last change the consumer acknowledged (None if not registered)"""
+    try:
+        conn = get_connection()
+        row = conn.execute("SELECT last_seq FROM change_consumers WHERE consumer = ?", (consumer,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"Error getting consumer offset: {str(e)}")
+        return None
+
+def read_changes(consumer: str, limit: int = 1000, tables: List[str] = None) -> List[Dict]:
+    """The next changes after a consumer's stored offset (read again until acknowledged)"""
+    offset = get_consumer_offset(consumer)
+    if offset is None:
+        return []
+    return get_changes(offset, limit, tables)
+
+def acknowledge_changes(consumer: str, seq: int) -> Tuple[bool, str]:
+    """
+    Store that a consumer has applied every change up to seq (offsets only move forward)
+    Returns: (success: bool, message: str)
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.execute('''
+                UPDATE change_consumers SET last_seq = MAX(last_seq, ?), updated_at = CURRENT_TIMESTAMP
+                WHERE consumer = ?
+            ''', (seq, consumer))
+            updated = cursor.rowcount
+        conn.close()
+        if not updated:
+            return False, f"Consumer '{consumer}' is not registered"
+        return True, f"Consumer '{consumer}' at change {seq}"
+    except Exception as e:
+        return False, f"Error acknowledging changes: {str(e)}"
+
+def consume_changes(consumer: str, handler: Callable[[List[Dict]], None], batch_size: int = 1000,
+                    tables: List[str] = None) -> Tuple[bool, str]:
+    """
+    Feed a consumer's pending changes to handler(changes) in batches, storing the offset after each
+    batch; a handler that raises leaves its batch to be read again (at-least-once delivery)
+    Fails without calling handler if the log was pruned past the consumer's offset: rebuild the
+    derived data, then register the consumer again
+    Returns: (success: bool, message: str)
+    """
+    offset = get_consumer_offset(consumer)
+    if offset is None:
+        return False, f"Consumer '{consumer}' is not registered"
+    try:
+        conn = get_connection()
+        oldest = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+        conn.close()
+    except Exception as e:
+        return False, f"Error reading change log: {str(e)}"
+    if oldest is not None and offset < oldest - 1:
+        return False, f"Consumer '{consumer}' is behind the change log (pruned up to {oldest - 1}); rebuild and re-register it"
+
+    applied = 0
+    while True:
+        changes = get_changes(offset, batch_size, tables)
+        if not changes:
+            break
+        try:
+            handler(changes)
+        except Exception as e:
+            return False, f"Error applying changes after {offset} for '{consumer}': {str(e)}"
+        offset = changes[-1]['seq']
+        success, message = acknowledge_changes(consumer, offset)
+        if not success:
+            return False, message
+        applied += len(changes)
+        if len(changes) < batch_size:
+            break
+    return True, f"Consumer '{consumer}' applied {applied} changes (now at {offset})"
+
+def get_change_consumers() -> List[Dict]:
+    """Registered consumers with their offset and how many changes they are behind"""
+    try:
+        conn = get_connection()
+        latest = get_data_version(conn)
+        rows = conn.execute("SELECT consumer, last_seq, updated_at FROM change_consumers ORDER BY consumer").fetchall()
+        conn.close()
+        return [{'consumer': consumer, 'last_seq': last_seq, 'lag': max(latest - last_seq, 0), 'updated_at': updated_at}
+                for consumer, last_seq, updated_at in rows]
+    except Exception as e:
+        print(f"Error getting change consumers: {str(e)}")
+        return []
+
+def prune_change_log(keep_days: int = 30) -> Tuple[bool, str]:
+    """
+    Delete changes every registered consumer has acknowledged and that are older than keep_days
+    Returns: (success: bool, message: str)
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.execute('''
+                DELETE FROM change_log
+                WHERE seq <= (SELECT COALESCE(MIN(last_seq), 9223372036854775807) FROM change_consumers)
+                  AND changed_at < datetime('now', ?)
+            ''', (f'-{int(keep_days)} days',))
+            deleted = cursor.rowcount
+        conn.close()
+        return True, f"Pruned {deleted} changes from the change log"
+    except Exception as e:
+        return False, f"Error pruning change log: {str(e)}"
+
+# ==========================================
+# PATIENT MERGES
+# ==========================================
+
+# Duplicates merged into one record per call (keeps every IN (...) list small)
+MERGE_MAX_DUPLICATES = 20
+
+# Kept patient fields filled by merge rules; the rest keep the kept record's value when it has one
+MERGE_FIELDS = ('name', 'age', 'gender', 'phone', 'weight', 'conditions', 'created_date')
+
+# SQLite's default limit on host parameters per statement is 999
+_IN_CHUNK = 500
+
+def _compact_ids(ids: List[int]) -> str:
+    """Sorted integer ids as ranges: [1, 2, 3, 7] -> '1-3,7'"""
+    ranges = []
+    for value in sorted(set(ids)):
+        if ranges and value == ranges[-1][1] + 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+def _expand_ids(compact: str) -> List[int]:
+    """Inverse of _compact_ids"""
+    ids = []
+    for part in filter(None, (compact or '').split(',')):
+        start, _, end = part.partition('-')
+        ids.extend(range(int(start), int(end or start) + 1))
+    return ids
+
+def _merge_conditions(values: List[Optional[str]]) -> Optional[str]:
+    """Union of comma-separated condition lists, first spelling and order kept, case-insensitive"""
+    merged, seen = [], set()
+    for value in values:
+        for condition in (value or '').split(','):
+            condition = condition.strip()
+            if condition and condition.lower() not in seen:
+                seen.add(condition.lower())
+                merged.append(condition)
+    return ', '.join(merged) or None
+
+def _merged_fields(cursor: sqlite3.Cursor, keep: Dict, duplicates: List[Dict]) -> Dict:
+    """
+    Field values of the merged record: the kept record's name, age, gender and phone (a duplicate's
+    when it has none), the latest recorded weight, the union of conditions and the earliest registration
+    """
+    records = [keep] + duplicates
+    merged = {field: next((record[field] for record in records if record[field] not in (None, '')), None)
+              for field in ('name', 'age', 'gender', 'phone')}
+
+    patient_ids = [record['patient_id'] for record in records]
+    cursor.execute(f'''
+        SELECT weight FROM visits
+        WHERE patient_id IN ({', '.join('?' for _ in patient_ids)}) AND weight > 0
+          AND (is_deleted = 0 OR is_deleted IS NULL)
+        ORDER BY visit_date DESC, visit_id DESC LIMIT 1
+    ''', patient_ids)
+    latest = cursor.fetchone()
+    registered = sorted(records, key=lambda record: record['created_date'] or '', reverse=True)
+    merged['weight'] = latest[0] if latest else next(
+        (record['weight'] for record in registered if record['weight']), None)
+
+    merged['conditions'] = _merge_conditions([record['conditions'] for record in records])
+    merged['created_date'] = min((record['created_date'] for record in records if record['created_date']),
+                                 default=keep['created_date'])
+    return merged
+
+def _open_tokens_conflicts(cursor: sqlite3.Cursor, patient_ids: List[int], today: str) -> List[int]:
+    """
+    Today's open tokens of the merged records beyond the first one (the patient in consultation,
+    else the earliest waiting); these are cancelled so the merged patient is in the queue once
+    """
+    cursor.execute(f'''
+        SELECT token FROM queue_entries
+        WHERE queue_date = ? AND patient_id IN ({', '.join('?' for _ in patient_ids)})
+          AND status IN ('waiting', 'in_consultation')
+        ORDER BY status = 'in_consultation' DESC, token
+    ''', (today, *patient_ids))
+    return [row[0] for row in cursor.fetchall()][1:]
+
+def _queue_tokens(cursor: sqlite3.Cursor, patient_id: int) -> Dict[str, str]:
+    """A patient's tokens in the queue and its archive, as {queue_date: compact tokens}"""
+    tokens: Dict[str, List[int]] = {}
+    for table in ('queue_entries', 'queue_history'):
+        cursor.execute(f"SELECT queue_date, token FROM {table} WHERE patient_id = ?", (patient_id,))
+        for queue_date, token in cursor.fetchall():
+            tokens.setdefault(queue_date, []).append(token)
+    return {queue_date: _compact_ids(values) for queue_date, values in sorted(tokens.items())}
+
+def merge_patients(keep_patient_id: int, duplicate_ids: List[int],
+                   user_id: str = 'system') -> Tuple[bool, str, Optional[int]]:
+    """
+    Merge duplicate patient records into one, in a single transaction
+    Visits (with their terms, vitals and queue tokens) move to the kept record, whose fields are
+    filled by rule (_merged_fields); an explicit follow-up on any record wins (the earliest),
+    otherwise it is re-derived. Duplicates are soft-deleted with a deleted_records and audit_log
+    entry each, and the merge is recorded in merge_history for undo_merge
+    Returns: (success: bool, message: str, merge_id: int)
+    """
+    duplicate_ids = list(dict.fromkeys(duplicate_ids or []))
+    if not duplicate_ids:
+        return False, "No duplicate records to merge", None
+    if keep_patient_id in duplicate_ids:
+        return False, "Cannot merge a patient with themselves", None
+    if len(duplicate_ids) > MERGE_MAX_DUPLICATES:
+        return False, f"At most {MERGE_MAX_DUPLICATES} records can be merged at once", None
+
+    patient_ids = [keep_patient_id] + duplicate_ids
+    placeholders = ', '.join('?' for _ in patient_ids)
+    duplicate_placeholders = ', '.join('?' for _ in duplicate_ids)
+    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        conn = get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(f'''
+                SELECT patient_id, {', '.join(MERGE_FIELDS)} FROM patients
+                WHERE patient_id IN ({placeholders}) AND (is_deleted = 0 OR is_deleted IS NULL)
+            ''', patient_ids)
+            records = {row[0]: dict(zip(('patient_id',) + MERGE_FIELDS, row)) for row in cursor.fetchall()}
+            missing = [str(patient_id) for patient_id in patient_ids if patient_id not in records]
+            if missing:
+                cursor.execute("ROLLBACK")
+                return False, f"Patient(s) not found or deleted: {', '.join(missing)}", None
+            keep = records[keep_patient_id]
+            duplicates = [records[patient_id] for patient_id in duplicate_ids]
+
+            # Reported, not resolved: two records with a visit on the same day may be one visit entered twice
+            cursor.execute(f'''
+                SELECT COUNT(*) FROM (
+                    SELECT visit_date FROM visits
+                    WHERE patient_id IN ({placeholders}) AND (is_deleted = 0 OR is_deleted IS NULL)
+                    GROUP BY visit_date HAVING COUNT(DISTINCT patient_id) > 1
+                )
+            ''', patient_ids)
+            shared_dates = cursor.fetchone()[0]
+
+            cursor.execute("SELECT due_date FROM followups WHERE patient_id = ? AND source = 'explicit'",
+                           (keep_patient_id,))
+            row = cursor.fetchone()
+            keep_followup = row[0] if row else None
+            cursor.execute(f'''
+                SELECT patient_id, due_date FROM followups
+                WHERE patient_id IN ({duplicate_placeholders}) AND source = 'explicit'
+            ''', duplicate_ids)
+            duplicate_followups = dict(cursor.fetchall())
+
+            members = []
+            for duplicate in duplicates:
+                cursor.execute("SELECT visit_id, is_deleted FROM visits WHERE patient_id = ? ORDER BY visit_id",
+                               (duplicate['patient_id'],))
+                visits = cursor.fetchall()
+                members.append((duplicate, [visit_id for visit_id, _ in visits],
+                                sum(1 for _, is_deleted in visits if not is_deleted),
+                                _queue_tokens(cursor, duplicate['patient_id'])))
+
+            cancelled = _open_tokens_conflicts(cursor, patient_ids, today)
+            if cancelled:
+                now = _queue_timestamp()
+                cursor.execute(f'''
+                    UPDATE queue_entries
+                    SET status = 'cancelled', version = version + 1, finished_at = ?, updated_at = ?
+                    WHERE queue_date = ? AND token IN ({', '.join('?' for _ in cancelled)})
+                ''', (now, now, today, *cancelled))
+            queue_changed = bool(cancelled)
+
+            # Bulk reassignment: one statement per table for all duplicates
+            cursor.execute(f"UPDATE visits SET patient_id = ? WHERE patient_id IN ({duplicate_placeholders})",
+                           (keep_patient_id, *duplicate_ids))
+            visits_transferred = sum(active for _, _, active, _ in members)
+            for table in ('visit_terms', 'vitals', 'queue_entries', 'queue_history'):
+                cursor.execute(f"UPDATE {table} SET patient_id = ? WHERE patient_id IN ({duplicate_placeholders})",
+                               (keep_patient_id, *duplicate_ids))
+                queue_changed = queue_changed or (table == 'queue_entries' and cursor.rowcount > 0)
+            if queue_changed:
+                cursor.execute("UPDATE queue_state SET version = version + 1 WHERE queue_date = ?", (today,))
+            cursor.execute(f"DELETE FROM followups WHERE patient_id IN ({duplicate_placeholders})", duplicate_ids)
+            explicit_due_dates = [due for due in [keep_followup, *duplicate_followups.values()] if due]
+            _schedule_followup(cursor, keep_patient_id, min(explicit_due_dates) if explicit_due_dates else None)
+
+            merged = _merged_fields(cursor, keep, duplicates)
+            changed = {field: [keep[field], value] for field, value in merged.items() if value != keep[field]}
+            if changed:
+                cursor.execute(f'''
+                    UPDATE patients SET {', '.join(f'{field} = ?' for field in changed)}, updated_date = CURRENT_TIMESTAMP
+                    WHERE patient_id = ?
+                ''', (*[after for _, after in changed.values()], keep_patient_id))
+
+            cursor.execute('''
+                INSERT INTO merge_history (keep_patient_id, keep_fields, keep_followup, cancelled_tokens, merged_by)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (keep_patient_id, json.dumps(changed), keep_followup,
+                  json.dumps({today: _compact_ids(cancelled)}) if cancelled else None, user_id))
+            merge_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO merge_members (merge_id, patient_id, visit_ids, queue_tokens, followup_due)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(merge_id, duplicate['patient_id'], _compact_ids(visit_ids), json.dumps(tokens) if tokens else None,
+                   duplicate_followups.get(duplicate['patient_id']))
+                  for duplicate, visit_ids, _, tokens in members])
+
+            # Duplicates are soft-deleted (restorable only through undo_merge) and audited in this transaction
+            cursor.execute(f"UPDATE patients SET is_deleted = 1 WHERE patient_id IN ({duplicate_placeholders})",
+                           duplicate_ids)
+            reason = f"Merged into patient {keep_patient_id} (merge #{merge_id})"
+            deleted_rows, audit_rows = [], []
+            for duplicate, visit_ids, active_visits, _ in members:
+                original_data = json.dumps(dict(duplicate, visit_count_at_deletion=active_visits,
+                                                merged_into=keep_patient_id, merge_id=merge_id))
+                deleted_rows.append(('patients', duplicate['patient_id'], original_data, user_id, reason, 0))
+                audit_rows.append(('MERGE', 'patients', duplicate['patient_id'], original_data,
+                                   json.dumps({'merged_into': keep_patient_id}), user_id,
+                                   f"Merged '{duplicate['name']}' into '{merged['name']}' (merge #{merge_id}), "
+                                   f"{active_visits} visits transferred"))
+            audit_rows.append(('UPDATE', 'patients', keep_patient_id,
+                               json.dumps({field: before for field, (before, _) in changed.items()}),
+                               json.dumps({field: after for field, (_, after) in changed.items()}), user_id,
+                               f"Kept record of merge #{merge_id} ({len(duplicates)} duplicates)"))
+            cursor.executemany('''
+                INSERT INTO deleted_records (table_name, record_id, original_data, deleted_by, deletion_reason, can_restore)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', deleted_rows)
+            cursor.executemany('''
+                INSERT INTO audit_log (action, table_name, record_id, old_data, new_data, user_id, details)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', audit_rows)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        names = ', '.join(duplicate['name'] for duplicate in duplicates)
+        message = (f"Successfully merged {names} into {merged['name']}. "
+                   f"Transferred {visits_transferred} visits.")
+        if shared_dates:
+            message += f" {shared_dates} visit date(s) appear on more than one record; please review them."
+        if cancelled:
+            message += f" Cancelled duplicate queue token(s) {', '.join(map(str, cancelled))}."
+        return True, message, merge_id
+    except Exception as e:
+        return False, f"Error merging patients: {str(e)}", None
+
+def _move_tokens(cursor: sqlite3.Cursor, tokens: Dict[str, str], from_patient_id: int, to_patient_id: int) -> bool:
+    """Give queue tokens ({queue_date: compact tokens}) back to a patient; True when today's queue changed"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    changed_today = False
+    for queue_date, compact in tokens.items():
+        token_list = _expand_ids(compact)
+        for table in ('queue_entries', 'queue_history'):
+            cursor.execute(f'''
+                UPDATE {table} SET patient_id = ?
+                WHERE queue_date = ? AND patient_id = ? AND token IN ({', '.join('?' for _ in token_list)})
+            ''', (to_patient_id, queue_date, from_patient_id, *token_list))
+            changed_today = changed_today or (table == 'queue_entries' and queue_date == today and cursor.rowcount > 0)
+    return changed_today
+
+def undo_merge(merge_id: int, user_id: str = 'system') -> Tuple[bool, str]:
+    """
+    Reverse a merge in one transaction: restore the duplicates and move their visits and queue tokens
+    back. Visits added to the kept record since stay there, and kept-record fields are only restored
+    where they still hold the merged value, so edits made after the merge survive
+    Returns: (success: bool, message: str)
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        conn = get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute('''
+                SELECT keep_patient_id, keep_fields, keep_followup, cancelled_tokens, undone_at
+                FROM merge_history WHERE merge_id = ?
+            ''', (merge_id,))
+            history = cursor.fetchone()
+            if not history or history[4]:
+                cursor.execute("ROLLBACK")
+                return False, f"Merge #{merge_id} not found" if not history else f"Merge #{merge_id} was already undone"
+            keep_patient_id, keep_fields, keep_followup, cancelled_tokens, _ = history
+
+            cursor.execute(f'''
+                SELECT {', '.join(MERGE_FIELDS)} FROM patients
+                WHERE patient_id = ? AND (is_deleted = 0 OR is_deleted IS NULL)
+            ''', (keep_patient_id,))
+            keep = cursor.fetchone()
+            if not keep:
+                cursor.execute("ROLLBACK")
+                return False, f"Patient {keep_patient_id} kept by merge #{merge_id} is deleted; restore it first"
+            keep = dict(zip(MERGE_FIELDS, keep))
+
+            cursor.execute('''
+                SELECT m.patient_id, m.visit_ids, m.queue_tokens, m.followup_due, p.name, p.is_deleted
+                FROM merge_members m LEFT JOIN patients p ON p.patient_id = m.patient_id
+                WHERE m.merge_id = ? ORDER BY m.patient_id
+            ''', (merge_id,))
+            members = cursor.fetchall()
+            gone = [str(member[0]) for member in members if member[4] is None or not member[5]]
+            if gone:
+                cursor.execute("ROLLBACK")
+                return False, f"Merged record(s) {', '.join(gone)} were since removed or restored; merge #{merge_id} cannot be undone"
+
+            member_ids = [member[0] for member in members]
+            cursor.execute(f"UPDATE patients SET is_deleted = 0 WHERE patient_id IN ({', '.join('?' for _ in member_ids)})",
+                           member_ids)
+            moved_back = 0
+            queue_changed = False
+            for patient_id, visit_ids, queue_tokens, followup_due, _, _ in members:
+                visit_ids = _expand_ids(visit_ids)
+                for start in range(0, len(visit_ids), _IN_CHUNK):
+                    chunk = visit_ids[start:start + _IN_CHUNK]
+                    chunk_placeholders = ', '.join('?' for _ in chunk)
+                    cursor.execute(f'''
+                        UPDATE visits SET patient_id = ?
+                        WHERE patient_id = ? AND visit_id IN ({chunk_placeholders})
+                    ''', (patient_id, keep_patient_id, *chunk))
+                    moved_back += cursor.rowcount
+                    for table in ('visit_terms', 'vitals'):
+                        cursor.execute(f'''
+                            UPDATE {table} SET patient_id = ?
+                            WHERE patient_id = ? AND visit_id IN ({chunk_placeholders})
+                        ''', (patient_id, keep_patient_id, *chunk))
+                if queue_tokens:
+                    queue_changed = _move_tokens(cursor, json.loads(queue_tokens), keep_patient_id, patient_id) or queue_changed
+                _schedule_followup(cursor, patient_id, followup_due)
+            # Tokens cancelled by the merge re-open for patients not back in today's queue meanwhile
+            for queue_date, compact in json.loads(cancelled_tokens or '{}').items():
+                reopen = _expand_ids(compact)
+                cursor.execute(f'''
+                    UPDATE queue_entries
+                    SET status = 'waiting', version = version + 1, finished_at = NULL, updated_at = ?
+                    WHERE queue_date = ? AND status = 'cancelled' AND token IN ({', '.join('?' for _ in reopen)})
+                      AND NOT EXISTS (SELECT 1 FROM queue_entries o
+                                      WHERE o.queue_date = queue_entries.queue_date AND o.patient_id = queue_entries.patient_id
+                                        AND o.status IN ('waiting', 'in_consultation'))
+                ''', (_queue_timestamp(), queue_date, *reopen))
+                queue_changed = queue_changed or cursor.rowcount > 0
+            if queue_changed:
+                cursor.execute("UPDATE queue_state SET version = version + 1 WHERE queue_date = ?", (today,))
+
+            restored = {field: before for field, (before, after) in json.loads(keep_fields).items()
+                        if keep.get(field) == after}
+            if restored:
+                cursor.execute(f'''
+                    UPDATE patients SET {', '.join(f'{field} = ?' for field in restored)}, updated_date = CURRENT_TIMESTAMP
+                    WHERE patient_id = ?
+                ''', (*restored.values(), keep_patient_id))
+
+            # The merged explicit follow-up goes back to the records it came from, unless changed since
+            cursor.execute("SELECT due_date, source FROM followups WHERE patient_id = ?", (keep_patient_id,))
+            current = cursor.fetchone()
+            merged_due_dates = {member[3] for member in members if member[3]}
+            if current and current[1] == 'explicit' and current[0] not in merged_due_dates:
+                keep_followup = current[0]
+            _schedule_followup(cursor, keep_patient_id, keep_followup)
+
+            cursor.execute("UPDATE merge_history SET undone_at = CURRENT_TIMESTAMP, undone_by = ? WHERE merge_id = ?",
+                           (user_id, merge_id))
+            audit_rows = [('UNMERGE', 'patients', patient_id, None, json.dumps({'split_from': keep_patient_id}), user_id,
+                           f"Restored '{name}' from merge #{merge_id}")
+                          for patient_id, _, _, _, name, _ in members]
+            audit_rows.append(('UPDATE', 'patients', keep_patient_id, None, json.dumps(restored), user_id,
+                               f"Undid merge #{merge_id}, {moved_back} visits moved back"))
+            cursor.executemany('''
+                INSERT INTO audit_log (action, table_name, record_id, old_data, new_data, user_id, details)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', audit_rows)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return True, f"Undid merge #{merge_id}: restored {len(members)} records and moved {moved_back} visits back"
+    except Exception as e:
+        return False, f"Error undoing merge: {str(e)}"
+
+def get_merge_history(limit: int = 50) -> List[Dict]:
+    """
+    Recent merges, newest first: merge_id, kept patient, merged records (id, name, visits moved),
+    changed fields {field: [before, after]}, who/when, and undone_at/undone_by once undone
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute('''
+            SELECT h.merge_id, h.keep_patient_id, p.name, h.keep_fields, h.merged_by, h.merged_at,
+                   h.undone_by, h.undone_at
+            FROM merge_history h LEFT JOIN patients p ON p.patient_id = h.keep_patient_id
+            ORDER BY h.merge_id DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        merges = {}
+        for merge_id, keep_patient_id, keep_name, keep_fields, merged_by, merged_at, undone_by, undone_at in rows:
+            merges[merge_id] = {
+                'merge_id': merge_id, 'keep_patient_id': keep_patient_id, 'keep_name': keep_name,
+                'fields': json.loads(keep_fields or '{}'), 'members': [],
+                'merged_by': merged_by, 'merged_at': merged_at, 'undone_by': undone_by, 'undone_at': undone_at
+            }
+        if merges:
+            member_rows = conn.execute(f'''
+                SELECT m.merge_id, m.patient_id, p.name, m.visit_ids FROM merge_members m
+                LEFT JOIN patients p ON p.patient_id = m.patient_id
+                WHERE m.merge_id IN ({', '.join('?' for _ in merges)}) ORDER BY m.merge_id, m.patient_id
+            ''', list(merges)).fetchall()
+            for merge_id, patient_id, name, visit_ids in member_rows:
+                merges[merge_id]['members'].append({'patient_id': patient_id, 'name': name,
+                                                    'visits': len(_expand_ids(visit_ids))})
+        conn.close()
+        return list(merges.values())
+    except Exception as e:
+        print(f"Error getting merge history: {str(e)}")
+        return []
+
+# ==========================================
+# SCHEMA MIGRATIONS
+# ==========================================
+
+def _column_exists(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def _add_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if not _column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migrate_base_schema(cursor: sqlite3.Cursor):
+    """Version 1: patients, visits, audit log, soft deletion"""
+    # Create patients table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patients (
+            patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            gender TEXT NOT NULL,
+            phone TEXT UNIQUE NOT NULL,
+            weight REAL,
+            conditions TEXT,
+            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create visits table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visits (
+            visit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            visit_date DATE NOT NULL,
+            symptoms TEXT,
+            medicines TEXT,
+            diet_notes TEXT,
+            weight REAL,
+            blood_pressure TEXT,
+            notes TEXT,
+            created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
+        )
+    ''')
+    
+    # Create audit log table for enterprise tracking
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            record_id INTEGER,
+            old_data TEXT,
+            new_data TEXT,
+            user_id TEXT DEFAULT 'system',
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            details TEXT
+        )
+    ''')
+    
+    # Create soft deletion tracking
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deleted_records (
+            deletion_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            original_data TEXT NOT NULL,
+            deleted_by TEXT DEFAULT 'system',
+            deletion_reason TEXT,
+            deletion_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            can_restore BOOLEAN DEFAULT 1
+        )
+    ''')
+
+    # Add deleted flag to existing tables if not exists
+    _add_column(cursor, 'patients', 'is_deleted', 'BOOLEAN DEFAULT 0')
+    _add_column(cursor, 'visits', 'is_deleted', 'BOOLEAN DEFAULT 0')
+
+# Tables whose writes bumped the version 2 data_version counter (replaced by change_log in version 8)
+VERSIONED_TABLES = ('patients', 'visits')
+
+def _migrate_data_version(cursor: sqlite3.Cursor):
+    """Version 2: app_meta data_version stamp maintained by triggers, index for recent-patient lists"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('data_version', 0)")
+    for table in VERSIONED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE app_meta SET value = value + 1 WHERE key = 'data_version';
+                END
+            ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_created_date ON patients(created_date)")
+
+def _migrate_analytics_rollups(cursor: sqlite3.Cursor):
+    """Version 3: rollup tables maintained incrementally by modules/analytics.py"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_daily (
+            day TEXT PRIMARY KEY,
+            visits INTEGER NOT NULL DEFAULT 0,
+            first_visits INTEGER NOT NULL DEFAULT 0,
+            return_visits INTEGER NOT NULL DEFAULT 0,
+            interval_days INTEGER NOT NULL DEFAULT 0,
+            intervals INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_patients (
+            patient_id INTEGER PRIMARY KEY,
+            first_visit_date TEXT,
+            last_visit_date TEXT,
+            visits INTEGER NOT NULL DEFAULT 0,
+            last_weight REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_patient_months (
+            patient_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            PRIMARY KEY (patient_id, month)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_intervals (
+            bucket INTEGER PRIMARY KEY,
+            visits INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_weight_changes (
+            bucket REAL PRIMARY KEY,
+            visits INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _migrate_visit_terms(cursor: sqlite3.Cursor):
+    """Version 4: medicine/symptom term index over visits, backfilled from existing visits"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visit_terms (
+            field TEXT NOT NULL,
+            term TEXT NOT NULL,
+            visit_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL,
+            visit_date TEXT,
+            PRIMARY KEY (field, term, visit_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_visit_terms_visit ON visit_terms(visit_id, field, term)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_visit_terms_patient ON visit_terms(patient_id, field, term)")
+    _index_visits(cursor, '1')
+
+def _migrate_vitals(cursor: sqlite3.Cursor):
+    """Version 5: vitals time series (weight, parsed blood pressure) backfilled from existing visits"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vitals (
+            patient_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            recorded_date TEXT NOT NULL,
+            visit_id INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (patient_id, metric, recorded_date, visit_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vitals_visit ON vitals(visit_id)")
+    _index_vitals(cursor, '1')
+
+def _migrate_followups(cursor: sqlite3.Cursor):
+    """Version 6: next follow-up per patient, indexed by due date, scheduled from existing visits"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS followups (
+            patient_id INTEGER PRIMARY KEY,
+            due_date TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT 'interval',
+            visit_id INTEGER,
+            interval_days INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_followups_due ON followups(due_date)")
+    # Scheduling reads a patient's latest visits
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_visits_patient_date ON visits(patient_id, visit_date)")
+    _schedule_followups(cursor, '1')
+
+def _migrate_queue(cursor: sqlite3.Cursor):
+    """Version 7: daily queue (today's tokens), token counter per day, archive of earlier days"""
+    for table in ('queue_entries', 'queue_history'):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                queue_date TEXT NOT NULL,
+                token INTEGER NOT NULL,
                 patient_id INTEGER NOT NULL,
-                visit_date DATE NOT NULL,
-                symptoms TEXT,
-                medicines TEXT,
-                diet_notes TEXT,
-                weight REAL,
-                blood_pressure TEXT,
+                status TEXT NOT NULL DEFAULT 'waiting',
+                version INTEGER NOT NULL DEFAULT 1,
                 notes TEXT,
-                created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
-            )
-        ''')
-        
-        # Create audit log table for enterprise tracking
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                action TEXT NOT NULL,
-                table_name TEXT NOT NULL,
-                record_id INTEGER,
-                old_data TEXT,
-                new_data TEXT,
-                user_id TEXT DEFAULT 'system',
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ip_address TEXT,
-                details TEXT
-            )
+                checked_in_at TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (queue_date, token)
+            ) WITHOUT ROWID
         ''')
-        
-        # Create soft deletion tracking
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS deleted_records (
-                deletion_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                table_name TEXT NOT NULL,
-                record_id INTEGER NOT NULL,
-                original_data TEXT NOT NULL,
-                deleted_by TEXT DEFAULT 'system',
-                deletion_reason TEXT,
-                deletion_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                can_restore BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Add deleted flag to existing tables if not exists
-        cursor.execute('''
-            ALTER TABLE patients ADD COLUMN is_deleted BOOLEAN DEFAULT 0
-        ''')
-        
-        cursor.execute('''
-            ALTER TABLE visits ADD COLUMN is_deleted BOOLEAN DEFAULT 0
-        ''')
-        
-        conn.commit()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_queue_history_patient ON queue_history(patient_id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS queue_state (
+            queue_date TEXT PRIMARY KEY,
+            last_token INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _migrate_change_log(cursor: sqlite3.Cursor):
+    """
+    Version 8: change_log rows written by triggers on CHANGE_LOG_TABLES, consumer offsets;
+    the data version becomes the latest change's sequence number (continuing the old counter)
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_consumers (
+            consumer TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Sequence numbers continue from the old data_version so caches keyed on it never see a value twice
+    cursor.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'change_log', value FROM app_meta
+        WHERE key = 'data_version' AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'change_log')
+    ''')
+    cursor.execute("DELETE FROM app_meta WHERE key = 'data_version'")
+    for table in VERSIONED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event.lower()}_version")
+    for table, id_column in CHANGE_LOG_TABLES.items():
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            row = 'OLD' if event == 'DELETE' else 'NEW'
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_change
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {row}.{id_column}, '{event.lower()}');
+                END
+            ''')
+
+def _migrate_merge_history(cursor: sqlite3.Cursor):
+    """
+    Version 9: merge history for undo_merge; per merged record the visit ids (as ranges) and queue
+    tokens it gave up, per merge the kept record's changed fields and follow-up before the merge
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS merge_history (
+            merge_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            keep_patient_id INTEGER NOT NULL,
+            keep_fields TEXT NOT NULL DEFAULT '{}',
+            keep_followup TEXT,
+            cancelled_tokens TEXT,
+            merged_by TEXT DEFAULT 'system',
+            merged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            undone_by TEXT,
+            undone_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS merge_members (
+            merge_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL,
+            visit_ids TEXT NOT NULL DEFAULT '',
+            queue_tokens TEXT,
+            followup_due TEXT,
+            PRIMARY KEY (merge_id, patient_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_merge_members_patient ON merge_members(patient_id)")
+
+# Applied in order; a database at PRAGMA user_version N has the first N applied
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_data_version,
+    _migrate_analytics_rollups,
+    _migrate_visit_terms,
+    _migrate_vitals,
+    _migrate_followups,
+    _migrate_queue,
+    _migrate_change_log,
+    _migrate_merge_history,
+]
+
+def get_schema_version(db_path: str = None) -> int:
+    """Schema version of the database (number of migrations applied)"""
+    conn = get_connection(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
         conn.close()
-        return True, "Database initialized successfully"
-    
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" in str(e):
-            # Columns already exist, this is fine
-            try:
-                conn.close()
-            except:
-                pass
+
+def init_database():
+    """
+    Initialize the database and create tables if they don't exist
+    Applies any pending MIGRATIONS; a no-op costing one PRAGMA read once the schema is current
+    """
+    try:
+        conn = get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] >= len(MIGRATIONS):
+            conn.close()
             return True, "Database initialized successfully"
-        return False, f"Error initializing database: {str(e)}"
-    
+
+        # The write lock makes concurrent starters wait, then see the migrations as applied
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("PRAGMA user_version")
+            current = cursor.fetchone()[0]
+            for version, migration in enumerate(MIGRATIONS[current:], start=current + 1):
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return True, "Database initialized successfully"
+
     except Exception as e:
         return False, f"Error initializing database: {str(e)}"
 
@@ -135,7 +2012,7 @@ def add_patient(name: str, age: int, gender: str, phone: str, weight: float = No
     Returns: (success: bool, message: str, patient_id: int)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Check if phone number already exists
@@ -163,13 +2040,13 @@ def add_patient(name: str, age: int, gender: str, phone: str, weight: float = No
     except Exception as e:
         return False, f"Error adding patient: {str(e)}", 0
 
-def search_patients(search_term: str) -> List[Dict]:
+def search_patients(search_term: str) -> List[Patient]:
     """
     Search for patients by name or phone number
-    Returns list of patient dictionaries
+    Returns list of Patient rows
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Search by name or phone (case insensitive)
@@ -184,31 +2061,16 @@ def search_patients(search_term: str) -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        # Convert to list of dictionaries
-        patients = []
-        for row in results:
-            patients.append({
-                'patient_id': row[0],
-                'name': row[1],
-                'age': row[2],
-                'gender': row[3],
-                'phone': row[4],
-                'weight': row[5],
-                'conditions': row[6],
-                'created_date': row[7],
-                'created_date_formatted': format_date_for_display(row[7])
-            })
-        
-        return patients
+        return Patient.from_rows(results)
     
     except Exception as e:
         print(f"Error searching patients: {str(e)}")
         return []
 
-def get_patient_by_id(patient_id: int) -> Optional[Dict]:
+def get_patient_by_id(patient_id: int) -> Optional[Patient]:
     """Get patient details by patient ID"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -219,31 +2081,19 @@ def get_patient_by_id(patient_id: int) -> Optional[Dict]:
         result = cursor.fetchone()
         conn.close()
         
-        if result:
-            return {
-                'patient_id': result[0],
-                'name': result[1],
-                'age': result[2],
-                'gender': result[3],
-                'phone': result[4],
-                'weight': result[5],
-                'conditions': result[6],
-                'created_date': result[7],
-                'created_date_formatted': format_date_for_display(result[7])
-            }
-        return None
+        return Patient(*result) if result else None
     
     except Exception as e:
         print(f"Error getting patient: {str(e)}")
         return None
 
-def find_existing_patient_by_phone(phone: str) -> Optional[Dict]:
+def find_existing_patient_by_phone(phone: str) -> Optional[Patient]:
     """
     Check if a patient with this phone number already exists
     Returns patient data if found, None otherwise
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -255,31 +2105,19 @@ def find_existing_patient_by_phone(phone: str) -> Optional[Dict]:
         result = cursor.fetchone()
         conn.close()
         
-        if result:
-            return {
-                'patient_id': result[0],
-                'name': result[1],
-                'age': result[2],
-                'gender': result[3],
-                'phone': result[4],
-                'weight': result[5],
-                'conditions': result[6],
-                'created_date': result[7],
-                'created_date_formatted': format_date_for_display(result[7])
-            }
-        return None
+        return Patient(*result) if result else None
     
     except Exception as e:
         print(f"Error checking for existing patient: {str(e)}")
         return None
 
-def find_similar_patients(name: str, phone: str) -> List[Dict]:
+def find_similar_patients(name: str, phone: str) -> List[Patient]:
     """
     Find patients with similar names or exact phone match
     Used for duplicate detection during patient registration
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Check for exact phone match or similar name
@@ -296,21 +2134,11 @@ def find_similar_patients(name: str, phone: str) -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        patients = []
-        for row in results:
-            patients.append({
-                'patient_id': row[0],
-                'name': row[1],
-                'age': row[2],
-                'gender': row[3],
-                'phone': row[4],
-                'weight': row[5],
-                'conditions': row[6],
-                'created_date': row[7],
-                'created_date_formatted': format_date_for_display(row[7]),
-                'is_phone_match': row[4] == phone,
-                'is_name_similar': name.lower() in row[1].lower() or row[1].lower() in name.lower()
-            })
+        patients = Patient.from_rows(results)
+        lowered = name.lower()
+        for patient in patients:
+            patient['is_phone_match'] = patient.phone == phone
+            patient['is_name_similar'] = lowered in patient.name.lower() or patient.name.lower() in lowered
         
         return patients
     
@@ -318,51 +2146,14 @@ def find_similar_patients(name: str, phone: str) -> List[Dict]:
         print(f"Error finding similar patients: {str(e)}")
         return []
 
-def merge_patient_records(keep_patient_id: int, duplicate_patient_id: int) -> Tuple[bool, str]:
+def merge_patient_records(keep_patient_id: int, duplicate_patient_id: int,
+                          user_id: str = 'system') -> Tuple[bool, str]:
     """
-    Merge two patient records - transfer all visits from duplicate to keep patient, then delete duplicate
+    Merge two patient records - transfer all visits from duplicate to keep patient (see merge_patients)
     Returns: (success: bool, message: str)
     """
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get patient names for the message
-        cursor.execute('SELECT name FROM patients WHERE patient_id = ?', (keep_patient_id,))
-        keep_name = cursor.fetchone()
-        cursor.execute('SELECT name FROM patients WHERE patient_id = ?', (duplicate_patient_id,))
-        duplicate_name = cursor.fetchone()
-        
-        if not keep_name or not duplicate_name:
-            conn.close()
-            return False, "One or both patients not found"
-        
-        keep_name = keep_name[0]
-        duplicate_name = duplicate_name[0]
-        
-        # Transfer all visits from duplicate to keep patient
-        cursor.execute('''
-            UPDATE visits 
-            SET patient_id = ? 
-            WHERE patient_id = ?
-        ''', (keep_patient_id, duplicate_patient_id))
-        
-        visits_transferred = cursor.rowcount
-        
-        # Delete the duplicate patient record
-        cursor.execute('DELETE FROM patients WHERE patient_id = ?', (duplicate_patient_id,))
-        
-        conn.commit()
-        conn.close()
-        
-        message = f"Successfully merged {duplicate_name} into {keep_name}. Transferred {visits_transferred} visits."
-        return True, message
-    
-    except Exception as e:
-        if conn:
-            conn.rollback()
-            conn.close()
-        return False, f"Error merging patients: {str(e)}"
+    success, message, _ = merge_patients(keep_patient_id, [duplicate_patient_id], user_id)
+    return success, message
 
 def update_patient_info(patient_id: int, name: str = None, age: int = None, gender: str = None, 
                        phone: str = None, weight: float = None, conditions: str = None) -> Tuple[bool, str]:
@@ -371,7 +2162,7 @@ def update_patient_info(patient_id: int, name: str = None, age: int = None, gend
     Returns: (success: bool, message: str)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Build update query dynamically based on provided parameters
@@ -424,13 +2215,14 @@ def update_patient_info(patient_id: int, name: str = None, age: int = None, gend
 
 def add_visit(patient_id: int, visit_date: str, symptoms: str = None, medicines: str = None, 
               diet_notes: str = None, weight: float = None, blood_pressure: str = None, 
-              notes: str = None) -> Tuple[bool, str]:
+              notes: str = None, follow_up_date: str = None) -> Tuple[bool, str]:
     """
-    Add a new visit for a patient
+    Add a new visit for a patient and schedule their next follow-up
+    (on follow_up_date if given, otherwise from their usual interval between visits)
     Returns: (success: bool, message: str)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Verify patient exists
@@ -448,6 +2240,10 @@ def add_visit(patient_id: int, visit_date: str, symptoms: str = None, medicines:
                               weight, blood_pressure, notes)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (patient_id, storage_date, symptoms, medicines, diet_notes, weight, blood_pressure, notes))
+        visit_id = cursor.lastrowid
+        _index_visits(cursor, 'v.visit_id = ?', (visit_id,))
+        _index_vitals(cursor, 'v.visit_id = ?', (visit_id,))
+        _schedule_followup(cursor, patient_id, format_date_for_storage(follow_up_date) if follow_up_date else None)
         
         conn.commit()
         conn.close()
@@ -457,13 +2253,13 @@ def add_visit(patient_id: int, visit_date: str, symptoms: str = None, medicines:
     except Exception as e:
         return False, f"Error adding visit: {str(e)}"
 
-def get_patient_visits(patient_id: int) -> List[Dict]:
+def get_patient_visits(patient_id: int) -> List[Visit]:
     """
     Get all visits for a specific patient
-    Returns list of visit dictionaries sorted by date (newest first)
+    Returns list of Visit rows sorted by date (newest first)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -477,32 +2273,16 @@ def get_patient_visits(patient_id: int) -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        # Convert to list of dictionaries
-        visits = []
-        for row in results:
-            visits.append({
-                'visit_id': row[0],
-                'visit_date': row[1],
-                'visit_date_formatted': format_date_for_display(row[1]),
-                'symptoms': row[2],
-                'medicines': row[3],
-                'diet_notes': row[4],
-                'weight': row[5],
-                'blood_pressure': row[6],
-                'notes': row[7],
-                'created_timestamp': row[8]
-            })
-        
-        return visits
+        return Visit.from_rows(results)
     
     except Exception as e:
         print(f"Error getting patient visits: {str(e)}")
         return []
 
-def get_all_patients() -> List[Dict]:
+def get_all_patients() -> List[Patient]:
     """Get all patients from the database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -514,22 +2294,7 @@ def get_all_patients() -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        # Convert to list of dictionaries
-        patients = []
-        for row in results:
-            patients.append({
-                'patient_id': row[0],
-                'name': row[1],
-                'age': row[2],
-                'gender': row[3],
-                'phone': row[4],
-                'weight': row[5],
-                'conditions': row[6],
-                'created_date': row[7],
-                'created_date_formatted': format_date_for_display(row[7])
-            })
-        
-        return patients
+        return Patient.from_rows(results)
     
     except Exception as e:
         print(f"Error getting all patients: {str(e)}")
@@ -539,7 +2304,7 @@ def update_patient(patient_id: int, name: str = None, age: int = None, gender: s
                   phone: str = None, weight: float = None, conditions: str = None) -> Tuple[bool, str]:
     """Update patient information"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Build dynamic update query
@@ -593,7 +2358,7 @@ def get_patient_weight_progression(patient_id: int) -> List[Dict]:
     Returns list of weight records with dates
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Get initial weight from patient registration
@@ -611,27 +2376,22 @@ def get_patient_weight_progression(patient_id: int) -> List[Dict]:
                 'type': 'Registration'
             })
         
-        # Get weights from visits
+        # Visit weights from the vitals series (already in date order by its primary key)
         cursor.execute('''
-            SELECT visit_date, weight FROM visits 
-            WHERE patient_id = ? AND weight IS NOT NULL
-            ORDER BY visit_date ASC
+            SELECT recorded_date, value FROM vitals
+            WHERE patient_id = ? AND metric = 'weight'
+            ORDER BY recorded_date, visit_id
         ''', (patient_id,))
         
-        visit_weights = cursor.fetchall()
-        
-        for row in visit_weights:
-            weight_records.append({
-                'date': row[0],
-                'weight': row[1],
-                'type': 'Visit'
-            })
+        visit_weights = [{'date': row[0], 'weight': row[1], 'type': 'Visit'} for row in cursor.fetchall()]
         
         conn.close()
         
-        # Sort by date
-        weight_records.sort(key=lambda x: x['date'])
-        return weight_records
+        # Registration weight goes in front of the visits on or after its date
+        if weight_records:
+            position = bisect_left(visit_weights, weight_records[0]['date'], key=lambda record: record['date'])
+            visit_weights.insert(position, weight_records[0])
+        return visit_weights
     
     except Exception as e:
         print(f"Error getting weight progression: {str(e)}")
@@ -640,7 +2400,7 @@ def get_patient_weight_progression(patient_id: int) -> List[Dict]:
 def get_patient_visit_count(patient_id: int) -> int:
     """Get the total number of visits for a patient"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT COUNT(*) FROM visits WHERE patient_id = ?", (patient_id,))
@@ -688,7 +2448,7 @@ def get_patient_summary(patient_id: int) -> Dict:
         print(f"Error getting patient summary: {str(e)}")
         return None
 
-def search_patients_with_visit_info(search_term: str) -> List[Dict]:
+def search_patients_with_visit_info(search_term: str) -> List[Patient]:
     """Search patients and include visit count information"""
     try:
         patients = search_patients(search_term)
@@ -708,7 +2468,7 @@ def search_patients_with_visit_info(search_term: str) -> List[Dict]:
 def get_database_stats() -> Dict:
     """Get basic statistics about the database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Get patient count
@@ -751,6 +2511,48 @@ def get_database_stats() -> Dict:
             'recent_visits': 0
         }
 
+def get_data_version(conn: sqlite3.Connection = None) -> int:
+    """
+    Sequence number of the latest change_log entry (every patient/visit/deletion write adds one);
+    cache clinic data keyed on it. Read from sqlite_sequence, so pruning the log never lowers it.
+    Pass a long-lived connection to make this a single small-table read
+    """
+    own_connection = conn is None
+    try:
+        if own_connection:
+            conn = get_connection()
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        print(f"Error getting data version: {str(e)}")
+        return 0
+    finally:
+        if own_connection and conn is not None:
+            conn.close()
+
+def get_recent_patients(limit: int = 5) -> List[Patient]:
+    """Most recently registered active patients"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT patient_id, name, age, gender, phone, weight, conditions, created_date
+            FROM patients
+            WHERE is_deleted = 0 OR is_deleted IS NULL
+            ORDER BY created_date DESC
+            LIMIT ?
+        ''', (limit,))
+
+        results = cursor.fetchall()
+        conn.close()
+
+        return Patient.from_rows(results)
+
+    except Exception as e:
+        print(f"Error getting recent patients: {str(e)}")
+        return []
+
 # ==========================================
 # ENTERPRISE AUDIT AND DELETION SYSTEM
 # ==========================================
@@ -762,7 +2564,7 @@ def log_audit_action(action: str, table_name: str, record_id: int = None,
     Log all database actions for enterprise audit trail
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -784,7 +2586,7 @@ def soft_delete_patient(patient_id: int, reason: str = None, user_id: str = 'sys
     Returns: (success: bool, message: str)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Get patient data before deletion
@@ -828,6 +2630,9 @@ def soft_delete_patient(patient_id: int, reason: str = None, user_id: str = 'sys
             SET is_deleted = 1 
             WHERE patient_id = ?
         ''', (patient_id,))
+        cursor.execute('DELETE FROM visit_terms WHERE patient_id = ?', (patient_id,))
+        cursor.execute('DELETE FROM vitals WHERE patient_id = ?', (patient_id,))
+        cursor.execute('DELETE FROM followups WHERE patient_id = ?', (patient_id,))
         
         # Log in deleted_records table
         cursor.execute('''
@@ -862,7 +2667,7 @@ def hard_delete_patient(patient_id: int, confirmation_code: str, user_id: str =
         return False, f"Invalid confirmation code. Required: {expected_code}"
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Get patient data before deletion
@@ -891,6 +2696,15 @@ def hard_delete_patient(patient_id: int, confirmation_code: str, user_id: str =
         # Delete all visits permanently
         cursor.execute('DELETE FROM visits WHERE patient_id = ?', (patient_id,))
         deleted_visits = cursor.rowcount
+        cursor.execute('DELETE FROM visit_terms WHERE patient_id = ?', (patient_id,))
+        cursor.execute('DELETE FROM vitals WHERE patient_id = ?', (patient_id,))
+        cursor.execute('DELETE FROM followups WHERE patient_id = ?', (patient_id,))
+        cursor.execute('SELECT DISTINCT queue_date FROM queue_entries WHERE patient_id = ?', (patient_id,))
+        queue_dates = [row[0] for row in cursor.fetchall()]
+        cursor.execute('DELETE FROM queue_entries WHERE patient_id = ?', (patient_id,))
+        cursor.executemany('UPDATE queue_state SET version = version + 1 WHERE queue_date = ?',
+                           [(queue_date,) for queue_date in queue_dates])
+        cursor.execute('DELETE FROM queue_history WHERE patient_id = ?', (patient_id,))
         
         # Delete patient permanently
         cursor.execute('DELETE FROM patients WHERE patient_id = ?', (patient_id,))
@@ -917,7 +2731,7 @@ def soft_delete_visit(visit_id: int, reason: str = None, user_id: str = 'system'
     Returns: (success: bool, message: str)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Get visit data
@@ -948,6 +2762,9 @@ def soft_delete_visit(visit_id: int, reason: str = None, user_id: str = 'system'
         
         # Mark visit as deleted
         cursor.execute('UPDATE visits SET is_deleted = 1 WHERE visit_id = ?', (visit_id,))
+        cursor.execute('DELETE FROM visit_terms WHERE visit_id = ?', (visit_id,))
+        cursor.execute('DELETE FROM vitals WHERE visit_id = ?', (visit_id,))
+        _reschedule_after_visit_removed(cursor, visit_data[1], visit_id)
         
         # Log in deleted_records
         cursor.execute('''
@@ -977,7 +2794,7 @@ def restore_deleted_patient(patient_id: int, user_id: str = 'system') -> Tuple[b
     Returns: (success: bool, message: str)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Check if patient is deleted
@@ -990,12 +2807,25 @@ def restore_deleted_patient(patient_id: int, user_id: str = 'system') -> Tuple[b
         
         patient_name = patient_data[0]
         
+        # A merged record comes back through undo_merge, which also returns its visits
+        cursor.execute('''
+            SELECT h.merge_id, h.keep_patient_id FROM merge_members m JOIN merge_history h ON h.merge_id = m.merge_id
+            WHERE m.patient_id = ? AND h.undone_at IS NULL
+        ''', (patient_id,))
+        merge = cursor.fetchone()
+        if merge:
+            conn.close()
+            return False, f"Patient '{patient_name}' was merged into patient {merge[1]}; undo merge #{merge[0]} instead"
+        
         # Restore patient
         cursor.execute('UPDATE patients SET is_deleted = 0 WHERE patient_id = ?', (patient_id,))
         
         # Restore all visits
         cursor.execute('UPDATE visits SET is_deleted = 0 WHERE patient_id = ?', (patient_id,))
         restored_visits = cursor.rowcount
+        _index_visits(cursor, 'v.patient_id = ?', (patient_id,))
+        _index_vitals(cursor, 'v.patient_id = ?', (patient_id,))
+        _schedule_followup(cursor, patient_id)
         
         conn.commit()
         conn.close()
@@ -1012,16 +2842,17 @@ def restore_deleted_patient(patient_id: int, user_id: str = 'system') -> Tuple[b
             conn.close()
         return False, f"Error restoring patient: {str(e)}"
 
-def get_deleted_records(limit: int = 50) -> List[Dict]:
+def get_deleted_records(limit: int = 50) -> List[DeletedRecord]:
     """
     Get list of deleted records for management
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT dr.*, 
+            SELECT dr.deletion_id, dr.table_name, dr.record_id, dr.original_data, dr.deleted_by,
+                   dr.deletion_reason, dr.deletion_timestamp, dr.can_restore,
                    CASE 
                        WHEN dr.table_name = 'patients' THEN 
                            (SELECT name FROM patients WHERE patient_id = dr.record_id)
@@ -1035,36 +2866,24 @@ def get_deleted_records(limit: int = 50) -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        deleted_records = []
-        for row in results:
-            deleted_records.append({
-                'deletion_id': row[0],
-                'table_name': row[1],
-                'record_id': row[2],
-                'original_data': row[3],
-                'deleted_by': row[4],
-                'deletion_reason': row[5],
-                'deletion_timestamp': row[6],
-                'can_restore': bool(row[7]),
-                'record_name': row[8]
-            })
-        
-        return deleted_records
+        return DeletedRecord.from_rows(results)
         
     except Exception as e:
         print(f"Error getting deleted records: {str(e)}")
         return []
 
-def get_audit_log(limit: int = 100) -> List[Dict]:
+def get_audit_log(limit: int = 100) -> List[AuditEntry]:
     """
     Get audit log for enterprise compliance
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT * FROM audit_log
+            SELECT log_id, action, table_name, record_id, old_data, new_data, user_id,
+                   timestamp, ip_address, details
+            FROM audit_log
             ORDER BY timestamp DESC
             LIMIT ?
         ''', (limit,))
@@ -1072,32 +2891,17 @@ def get_audit_log(limit: int = 100) -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        audit_logs = []
-        for row in results:
-            audit_logs.append({
-                'log_id': row[0],
-                'action': row[1],
-                'table_name': row[2],
-                'record_id': row[3],
-                'old_data': row[4],
-                'new_data': row[5],
-                'user_id': row[6],
-                'timestamp': row[7],
-                'ip_address': row[8],
-                'details': row[9]
-            })
-        
-        return audit_logs
+        return AuditEntry.from_rows(results)
         
     except Exception as e:
         print(f"Error getting audit log: {str(e)}")
         return []
 
 # Update existing functions to exclude deleted records
-def get_all_patients() -> List[Dict]:
+def get_all_patients() -> List[Patient]:
     """Get all non-deleted patients"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -1110,21 +2914,7 @@ def get_all_patients() -> List[Dict]:
         results = cursor.fetchall()
         conn.close()
         
-        patients = []
-        for row in results:
-            patients.append({
-                'patient_id': row[0],
-                'name': row[1],
-                'age': row[2],
-                'gender': row[3],
-                'phone': row[4],
-                'weight': row[5],
-                'conditions': row[6],
-                'created_date': row[7],
-                'created_date_formatted': format_date_for_display(row[7])
-            })
-        
-        return patients
+        return Patient.from_rows(results)
     
     except Exception as e:
         print(f"Error getting all patients: {str(e)}")
@@ -0,0 +1,276 @@
+"""
+Live events for Ayurvedic Clinic Management System
+One publisher thread per worker follows the change log and the queue version and fans events out to
+every open event stream: stats deltas, new patients and visits, and queue changes. However many tabs
+are open, a worker runs the same two small reads per tick and the stats queries once per change.
+Each open stream holds a worker thread, so streams are short and capped per worker; past the cap
+clients get a 503 and poll instead.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, jsonify
+
+from modules import database
+
+# Events buffered per stream; a stream that falls this far behind is closed (the browser reconnects)
+SUBSCRIBER_BUFFER = 100
+
+# New patients/visits reported per change; a bulk import only announces the first few
+MAX_NEW_ITEMS = 20
+CHANGES_PER_CHECK = 500
+
+# After a write in this worker, look for its commit this often for up to FAST_CHECKS ticks
+FAST_CHECK_INTERVAL = 0.1
+FAST_CHECKS = 10
+
+TOPICS = ('stats', 'patient', 'visit', 'queue')
+
+# Seconds a client turned away at the stream cap is asked to wait (Retry-After)
+STREAM_RETRY_AFTER = 30
+
+_WRITE_STATEMENT = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b.*\b(patients|visits|queue_entries)\b',
+                              re.IGNORECASE | re.DOTALL)
+
+class Subscriber:
+    """One open event stream: a bounded queue of (event_id, topic, data) for the chosen topics"""
+
+    def __init__(self, topics: Iterable[str]):
+        self.topics = frozenset(topics)
+        self.events = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self.closed = False
+
+    def put(self, event: Tuple[int, str, Dict]):
+        if self.closed or event[1] not in self.topics:
+            return
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.closed = True  # too slow; dropping it beats holding events for it forever
+
+    def get(self, timeout: float) -> Optional[Tuple[int, str, Dict]]:
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventPublisher:
+    """Per-worker change watcher; the thread starts with the first subscriber and idles without one"""
+
+    def __init__(self, poll_interval: float = 1.0, max_subscribers: int = 0):
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self._reset()
+
+    def _reset(self):
+        """Fresh state for this process (locks and threads do not survive a gunicorn fork)"""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers: List[Subscriber] = []
+        self._thread = None
+        self._event_id = 0
+        self._data_version = None
+        self._queue_version = None
+        self._stats: Dict = {}
+        self._queue: Dict = {}
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='event-publisher', daemon=True)
+            self._thread.start()
+
+    def subscribe(self, topics: Iterable[str] = TOPICS) -> Optional[Subscriber]:
+        """
+        Open a stream; it starts with a snapshot of the current stats and queue (when subscribed to)
+        Returns None when this worker already has max_subscribers streams open (0 = no limit)
+        """
+        subscriber = Subscriber(topics)
+        with self._lock:
+            self._ensure_thread()
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                return None
+            if self._stats:
+                subscriber.put((self._event_id, 'stats', dict(self._stats)))
+            if self._queue:
+                subscriber.put((self._event_id, 'queue', dict(self._queue)))
+            self._subscribers.append(subscriber)
+        self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.closed = True
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers) if self._pid == os.getpid() else 0
+
+    def notify(self):
+        """A write happened in this worker: check for it now instead of at the next tick"""
+        self._wake.set()
+
+    def _publish(self, topic: str, data: Dict):
+        with self._lock:
+            self._event_id += 1
+            event = (self._event_id, topic, data)
+            for subscriber in list(self._subscribers):
+                subscriber.put(event)
+                if subscriber.closed:
+                    self._subscribers.remove(subscriber)
+
+    def _run(self):
+        conn = None
+        fast_checks = 0
+        while True:
+            woken = self._wake.wait(FAST_CHECK_INTERVAL if fast_checks else self.poll_interval)
+            if woken:
+                self._wake.clear()
+                fast_checks = FAST_CHECKS
+            if not self.subscriber_count():
+                # Nobody listening: forget the state so the next stream starts from a fresh snapshot
+                self._data_version = self._queue_version = None
+                self._stats, self._queue = {}, {}
+                fast_checks = 0
+                continue
+            try:
+                if conn is None:
+                    conn = database.get_connection()
+                changed = self._check(conn)
+            except Exception as e:
+                print(f"Error publishing events: {str(e)}")
+                if conn is not None:
+                    conn.close()
+                conn, changed = None, False
+            fast_checks = 0 if changed else max(fast_checks - 1, 0)
+
+    def _check(self, conn) -> bool:
+        """Publish whatever changed since the last check; returns whether anything did"""
+        changed = False
+        data_version = database.get_data_version(conn)
+        if data_version != self._data_version:
+            previous_version, self._data_version = self._data_version, data_version
+            self._publish_data_changes(conn, previous_version)
+            changed = True
+
+        queue_version = database.get_queue_version(conn)
+        if queue_version != self._queue_version:
+            self._queue_version = queue_version
+            clinic_queue = database.get_queue()
+            self._queue = {'date': clinic_queue['date'], 'version': clinic_queue['version'],
+                           'counts': clinic_queue['counts']}
+            self._publish('queue', dict(self._queue))
+            changed = True
+        return changed
+
+    def _publish_data_changes(self, conn, previous_version: Optional[int]):
+        stats = database.get_database_stats()
+        delta = {key: value for key, value in stats.items() if self._stats.get(key) != value}
+        self._stats = stats
+        if delta:
+            self._publish('stats', delta)
+
+        # The first check in this worker only sets the starting point in the change log
+        if previous_version is None:
+            return
+        inserted = {'patients': [], 'visits': []}
+        for change in database.get_changes(previous_version, CHANGES_PER_CHECK, list(inserted)):
+            if change['op'] == 'insert' and change['seq'] <= self._data_version:
+                inserted[change['table']].append(change['row_id'])
+        for patient in _patients(conn, inserted['patients'][:MAX_NEW_ITEMS]):
+            self._publish('patient', patient)
+        for visit in _visits(conn, inserted['visits'][:MAX_NEW_ITEMS]):
+            self._publish('visit', visit)
+
+def _patients(conn, patient_ids: List[int]) -> List[Dict]:
+    if not patient_ids:
+        return []
+    rows = conn.execute(f'''
+        SELECT patient_id, name, created_date FROM patients
+        WHERE patient_id IN ({', '.join('?' for _ in patient_ids)}) AND (is_deleted = 0 OR is_deleted IS NULL)
+        ORDER BY patient_id
+    ''', patient_ids).fetchall()
+    return [{'patient_id': patient_id, 'name': name,
+             'created_date_formatted': database.format_date_for_display(created_date)}
+            for patient_id, name, created_date in rows]
+
+def _visits(conn, visit_ids: List[int]) -> List[Dict]:
+    if not visit_ids:
+        return []
+    rows = conn.execute(f'''
+        SELECT v.visit_id, v.patient_id, p.name, v.visit_date
+        FROM visits v JOIN patients p ON p.patient_id = v.patient_id
+        WHERE v.visit_id IN ({', '.join('?' for _ in visit_ids)}) AND (v.is_deleted = 0 OR v.is_deleted IS NULL)
+        ORDER BY v.visit_id
+    ''', visit_ids).fetchall()
+    return [{'visit_id': visit_id, 'patient_id': patient_id, 'name': name,
+             'visit_date_formatted': database.format_date_for_display(visit_date)}
+            for visit_id, patient_id, name, visit_date in rows]
+
+publisher = EventPublisher()
+
+def format_event(event_id: int, topic: str, data: Dict) -> str:
+    """One server-sent event"""
+    return f"id: {event_id}\nevent: {topic}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream(subscriber: Subscriber, duration: float = 5, retry: float = 3.0, keepalive: float = 15.0):
+    """
+    Server-sent events body for a streaming response: sends events as the publisher produces them
+    and a comment line while idle, and ends after duration seconds (or when the subscriber falls
+    too far behind) so the browser reconnects
+    """
+    try:
+        yield f"retry: {int(retry * 1000)}\n\n"
+        deadline = time.monotonic() + duration
+        while not subscriber.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = subscriber.get(min(keepalive, remaining))
+            if event:
+                yield format_event(*event)
+            elif time.monotonic() < deadline:
+                yield ": keepalive\n\n"  # keeps proxies from closing an idle connection
+    finally:
+        publisher.unsubscribe(subscriber)
+
+def stream_response(topics: Iterable[str], duration: float) -> Response:
+    """
+    text/event-stream response for the given topics, or 503 with Retry-After when the worker is at
+    its stream cap (EventSource gives up on a 503, and the page falls back to polling)
+    """
+    subscriber = publisher.subscribe(topics)
+    if subscriber is None:
+        response = jsonify({'error': 'Too many open event streams; poll instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response
+    response = Response(event_stream(subscriber, duration), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also frees the slot when the body is never iterated (client gone before the first byte)
+    response.call_on_close(lambda: publisher.unsubscribe(subscriber))
+    return response
+
+def _wake_on_write(sql, duration, rows, parameters, connection):
+    if rows and _WRITE_STATEMENT.match(sql):
+        publisher.notify()
+
+def init_events(app: Flask, poll_interval: float = 1.0, max_streams: int = 2):
+    """
+    Set the publisher's check interval and per-worker stream cap (0 = no limit), and wake it on
+    this worker's own patient/visit/queue writes
+    """
+    publisher.poll_interval = poll_interval
+    publisher.max_subscribers = max_streams
+    database.add_query_listener(_wake_on_write)
+    app.extensions['event_publisher'] = publisher
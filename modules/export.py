@@ -0,0 +1,221 @@
+"""
+Data export utilities for Ayurvedic Clinic Management System
+Streams patients, visits and audit log as CSV or JSONL with constant memory
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from modules import database
+
+# Rows fetched from SQLite (and encoded) per chunk
+EXPORT_BATCH_SIZE = 500
+
+# Exportable tables: columns, the date column used for range filters, and ordering
+EXPORT_DATASETS = {
+    'patients': {
+        'table': 'patients',
+        'columns': ['patient_id', 'name', 'age', 'gender', 'phone', 'weight',
+                    'conditions', 'created_date', 'updated_date', 'is_deleted'],
+        'date_column': 'created_date',
+        'order_by': 'patient_id',
+        'soft_delete': True
+    },
+    'visits': {
+        'table': 'visits',
+        'columns': ['visit_id', 'patient_id', 'visit_date', 'symptoms', 'medicines',
+                    'diet_notes', 'weight', 'blood_pressure', 'notes',
+                    'created_timestamp', 'is_deleted'],
+        'date_column': 'visit_date',
+        'order_by': 'visit_id',
+        'soft_delete': True
+    },
+    'audit_log': {
+        'table': 'audit_log',
+        'columns': ['log_id', 'action', 'table_name', 'record_id', 'old_data',
+                    'new_data', 'user_id', 'timestamp', 'ip_address', 'details'],
+        'date_column': 'timestamp',
+        'order_by': 'log_id',
+        'soft_delete': False
+    }
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+
+def validate_export_request(dataset: str, fmt: str, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> Tuple[bool, List[str]]:
+    """
+    Validate export parameters
+    Returns: (is_valid: bool, error_messages: List[str])
+    """
+    errors = []
+
+    if dataset not in EXPORT_DATASETS:
+        errors.append(f"Unknown dataset '{dataset}'. Choose from: {', '.join(EXPORT_DATASETS)}")
+
+    if fmt not in EXPORT_FORMATS:
+        errors.append(f"Unknown format '{fmt}'. Choose from: {', '.join(EXPORT_FORMATS)}")
+
+    parsed = {}
+    for label, value in (('Start date', start_date), ('End date', end_date)):
+        if value:
+            try:
+                parsed[label] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                errors.append(f"{label} must be in YYYY-MM-DD format")
+
+    if len(parsed) == 2 and parsed['Start date'] > parsed['End date']:
+        errors.append("Start date cannot be after end date")
+
+    return len(errors) == 0, errors
+
+def build_export_query(dataset: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       include_deleted: bool = False) -> Tuple[str, List]:
+    """Build the SELECT statement and parameters for a dataset export"""
+    spec = EXPORT_DATASETS[dataset]
+    conditions = []
+    params = []
+
+    if start_date:
+        conditions.append(f"{spec['date_column']} >= ?")
+        params.append(start_date)
+    if end_date:
+        # Compare against the next day so timestamps on the end date are included
+        conditions.append(f"{spec['date_column']} < date(?, '+1 day')")
+        params.append(end_date)
+    if spec['soft_delete'] and not include_deleted:
+        conditions.append("(is_deleted = 0 OR is_deleted IS NULL)")
+
+    query = f"SELECT {', '.join(spec['columns'])} FROM {spec['table']}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {spec['order_by']}"
+
+    return query, params
+
+def iter_export_rows(dataset: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     include_deleted: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield batches of rows for a dataset straight from the SQLite cursor
+    Only one batch is held in memory at a time
+    """
+    query, params = build_export_query(dataset, start_date, end_date, include_deleted)
+
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def _encode_batches(dataset: str, fmt: str, batches: Iterator[List[tuple]]) -> Iterator[str]:
+    """Encode row batches as CSV or JSONL text chunks"""
+    columns = EXPORT_DATASETS[dataset]['columns']
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    else:
+        for rows in batches:
+            yield ''.join(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                for row in rows
+            )
+
+def stream_export(dataset: str, fmt: str = 'csv', start_date: Optional[str] = None,
+                  end_date: Optional[str] = None, include_deleted: bool = False,
+                  compress: bool = False) -> Iterator[bytes]:
+    """
+    Stream an export as encoded bytes, optionally gzip-compressed on the fly
+    Suitable for a chunked HTTP response or writing to a file
+    """
+    batches = iter_export_rows(dataset, start_date, end_date, include_deleted)
+    chunks = _encode_batches(dataset, fmt, batches)
+
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def get_export_filename(dataset: str, fmt: str, compress: bool = False) -> str:
+    """Build a download filename such as patients_20250101.csv.gz"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{dataset}_{timestamp}.{fmt}"
+    return filename + '.gz' if compress else filename
+
+def export_to_file(dataset: str, output_path: str, fmt: str = 'csv', start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, include_deleted: bool = False,
+                   compress: bool = False) -> Tuple[bool, str]:
+    """
+    Export a dataset to a file
+    Returns: (success: bool, message: str)
+    """
+    is_valid, errors = validate_export_request(dataset, fmt, start_date, end_date)
+    if not is_valid:
+        return False, "; ".join(errors)
+
+    try:
+        row_count = 0
+        batches = iter_export_rows(dataset, start_date, end_date, include_deleted)
+
+        def counted(batches):
+            nonlocal row_count
+            for rows in batches:
+                row_count += len(rows)
+                yield rows
+
+        chunks = _encode_batches(dataset, fmt, counted(batches))
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+        with open(output_path, 'wb') as f:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                f.write(compressor.compress(data) if compressor else data)
+            if compressor:
+                f.write(compressor.flush())
+
+        return True, f"Exported {row_count} {dataset} rows to {output_path}"
+
+    except Exception as e:
+        return False, f"Export failed: {str(e)}"
+
+def get_export_counts() -> Dict[str, int]:
+    """Get row counts per exportable dataset for the export page"""
+    counts = {}
+    try:
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        for dataset, spec in EXPORT_DATASETS.items():
+            cursor.execute(f"SELECT COUNT(*) FROM {spec['table']}")
+            counts[dataset] = cursor.fetchone()[0]
+        conn.close()
+    except Exception as e:
+        print(f"Error getting export counts: {str(e)}")
+    return counts
@@ -5,6 +5,7 @@ Rotating educational content for patients
 
 import random
 from datetime import datetime
+from functools import lru_cache
 
 AYURVEDIC_HEALTH_FACTS = [
     {
@@ -112,15 +113,16 @@ GENERAL_HEALTH_TIPS = [
     }
 ]
 
+@lru_cache(maxsize=4)
+def _daily_picks(day: str):
+    """Today's fact and tip; a per-day Random keeps them stable without reseeding the global random module"""
+    return (random.Random(day).choice(AYURVEDIC_HEALTH_FACTS + GENERAL_HEALTH_TIPS),
+            random.Random(day).choice(AYURVEDIC_HEALTH_FACTS))
+
 def get_daily_health_fact():
     """Get a random health fact for the day"""
-    all_facts = AYURVEDIC_HEALTH_FACTS + GENERAL_HEALTH_TIPS
-    
     # Use date as seed for consistent daily fact
-    today = datetime.now().strftime('%Y-%m-%d')
-    random.seed(today)
-    
-    return random.choice(all_facts)
+    return _daily_picks(datetime.now().strftime('%Y-%m-%d'))[0]
 
 def get_random_health_fact():
     """Get a completely random health fact"""
@@ -134,6 +136,4 @@ def get_health_facts_by_category(category):
 
 def get_ayurvedic_tip_of_day():
     """Get daily Ayurvedic tip"""
-    today = datetime.now().strftime('%Y-%m-%d')
-    random.seed(today)
-    return random.choice(AYURVEDIC_HEALTH_FACTS)
\ No newline at end of file
+    return _daily_picks(datetime.now().strftime('%Y-%m-%d'))[1]
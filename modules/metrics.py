@@ -0,0 +1,351 @@
+"""
+Request metrics for Ayurvedic Clinic Management System
+Records per-endpoint latency, status counts and database usage, shared across gunicorn workers
+"""
+
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, Response, g, has_request_context, request
+
+from modules import database, query_stats
+from modules.auth import login_required
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+# Per-worker snapshot files live here; /metrics merges them
+METRICS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'metrics')
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# Help text for counters registered by other modules through increment_counter()
+COUNTER_HELP = {}
+
+class WorkerMetrics:
+    """In-memory metrics for this worker process, periodically written to its snapshot file"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}      # "endpoint|method|status" -> count
+        self.latency = {}       # endpoint -> {'buckets': [...], 'sum': float, 'count': int}
+        self.db = {}            # endpoint -> {'queries': int, 'seconds': float, 'buckets': [...]}
+        self.counters = {}      # name -> {JSON-encoded labels: count}
+        self.in_flight = 0
+        self.last_flush = 0.0
+
+    def observe_request(self, endpoint: str, method: str, status: int, duration: float,
+                        query_count: int, query_seconds: float):
+        with self.lock:
+            key = f"{endpoint}|{method}|{status}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            latency = self.latency.setdefault(
+                endpoint, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            _observe(latency, LATENCY_BUCKETS, duration)
+
+            db = self.db.setdefault(
+                endpoint, {'queries': 0, 'seconds': 0.0, 'buckets': [0] * len(QUERY_COUNT_BUCKETS),
+                           'sum': 0.0, 'count': 0})
+            db['queries'] += query_count
+            db['seconds'] += query_seconds
+            _observe(db, QUERY_COUNT_BUCKETS, query_count)
+
+    def increment(self, name: str, labels: Dict[str, str], value: float = 1):
+        label_key = json.dumps(labels, sort_keys=True)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[label_key] = series.get(label_key, 0) + value
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'requests': dict(self.requests),
+                'latency': json.loads(json.dumps(self.latency)),
+                'db': json.loads(json.dumps(self.db)),
+                'counters': json.loads(json.dumps(self.counters)),
+                'queries': query_stats.snapshot(),
+                'in_flight': self.in_flight
+            }
+
+_metrics = WorkerMetrics()
+
+def _observe(histogram: Dict, bounds: Tuple, value: float):
+    """Add a value to a cumulative-at-render histogram (buckets store non-cumulative counts)"""
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            histogram['buckets'][index] += 1
+            break
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+def increment_counter(name: str, labels: Optional[Dict[str, str]] = None, value: float = 1,
+                      help_text: Optional[str] = None):
+    """Increment a named counter exposed on /metrics (used by other modules, e.g. rate limiting)"""
+    if help_text:
+        COUNTER_HELP[name] = help_text
+    _metrics.increment(name, labels or {}, value)
+
+# ==========================================
+# SNAPSHOT FILES (CROSS-WORKER AGGREGATION)
+# ==========================================
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"worker_{pid}.json")
+
+def flush_metrics(force: bool = False, interval: float = 5.0) -> None:
+    """Write this worker's metrics to its snapshot file (atomically), at most every `interval` seconds"""
+    now = time.monotonic()
+    if not force and now - _metrics.last_flush < interval:
+        return
+    _metrics.last_flush = now
+
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        snapshot = _metrics.snapshot()
+        path = _snapshot_path(snapshot['pid'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error writing metrics snapshot: {str(e)}")
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _merge(total: Dict, snapshot: Dict):
+    """Add one worker snapshot into a running total"""
+    for key, count in snapshot.get('requests', {}).items():
+        total['requests'][key] = total['requests'].get(key, 0) + count
+
+    for section in ('latency', 'db'):
+        for endpoint, values in snapshot.get(section, {}).items():
+            current = total[section].get(endpoint)
+            if current is None:
+                total[section][endpoint] = json.loads(json.dumps(values))
+                continue
+            for field, value in values.items():
+                if field == 'buckets':
+                    current['buckets'] = [a + b for a, b in zip(current['buckets'], value)]
+                else:
+                    current[field] = current.get(field, 0) + value
+
+    for name, series in snapshot.get('counters', {}).items():
+        target = total['counters'].setdefault(name, {})
+        for labels, value in series.items():
+            target[labels] = target.get(labels, 0) + value
+
+    query_stats.merge_stats(total['queries'], snapshot.get('queries', {}))
+
+def _empty_totals() -> Dict:
+    return {'requests': {}, 'latency': {}, 'db': {}, 'counters': {}, 'queries': {}, 'in_flight': 0}
+
+def _retire_dead_workers(dead_paths: List[str]):
+    """Fold snapshots of exited workers into retired.json so files do not pile up"""
+    if not dead_paths or fcntl is None:
+        return
+    lock_path = os.path.join(METRICS_DIR, '.lock')
+    retired_path = os.path.join(METRICS_DIR, 'retired.json')
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            retired = _empty_totals()
+            if os.path.exists(retired_path):
+                with open(retired_path) as f:
+                    _merge(retired, json.load(f))
+            for path in dead_paths:
+                if not os.path.exists(path):
+                    continue  # another worker retired it first
+                with open(path) as f:
+                    _merge(retired, json.load(f))
+                os.remove(path)
+            tmp_path = f"{retired_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(retired, f)
+            os.replace(tmp_path, retired_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def collect_metrics() -> Tuple[Dict, int]:
+    """
+    Merge the snapshots of every worker (live and retired)
+    Returns: (totals: Dict, live_workers: int)
+    """
+    flush_metrics(force=True)
+    totals = _empty_totals()
+    live_workers = 0
+    dead_paths = []
+
+    if not os.path.isdir(METRICS_DIR):
+        return totals, live_workers
+
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(METRICS_DIR, filename)
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        _merge(totals, snapshot)
+        if filename.startswith('worker_'):
+            if _pid_alive(snapshot.get('pid', 0)):
+                live_workers += 1
+                totals['in_flight'] += snapshot.get('in_flight', 0)
+            else:
+                dead_paths.append(path)
+
+    try:
+        _retire_dead_workers(dead_paths)
+    except Exception as e:
+        print(f"Error retiring metrics snapshots: {str(e)}")
+
+    return totals, live_workers
+
+# ==========================================
+# PROMETHEUS TEXT FORMAT
+# ==========================================
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+def _histogram_lines(name: str, bounds: Tuple, values: Dict, **labels) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(bounds, values['buckets']):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {values['count']}")
+    lines.append(f"{name}_sum{_labels(**labels)} {values['sum']:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {values['count']}")
+    return lines
+
+def render_prometheus() -> str:
+    """Render merged metrics in the Prometheus text exposition format"""
+    totals, live_workers = collect_metrics()
+    lines = [
+        "# HELP clinic_http_requests_total HTTP requests by endpoint, method and status",
+        "# TYPE clinic_http_requests_total counter"
+    ]
+    for key, count in sorted(totals['requests'].items()):
+        endpoint, method, status = key.split('|')
+        lines.append(f"clinic_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+    lines += [
+        "# HELP clinic_http_request_duration_seconds Request latency by endpoint",
+        "# TYPE clinic_http_request_duration_seconds histogram"
+    ]
+    for endpoint, values in sorted(totals['latency'].items()):
+        lines += _histogram_lines('clinic_http_request_duration_seconds', LATENCY_BUCKETS, values,
+                                  endpoint=endpoint)
+
+    lines += [
+        "# HELP clinic_db_queries_per_request Database statements executed per request",
+        "# TYPE clinic_db_queries_per_request histogram"
+    ]
+    for endpoint, values in sorted(totals['db'].items()):
+        lines += _histogram_lines('clinic_db_queries_per_request', QUERY_COUNT_BUCKETS, values,
+                                  endpoint=endpoint)
+
+    lines += [
+        "# HELP clinic_db_query_duration_seconds_total Time spent in database statements by endpoint",
+        "# TYPE clinic_db_query_duration_seconds_total counter"
+    ]
+    for endpoint, values in sorted(totals['db'].items()):
+        lines.append(f"clinic_db_query_duration_seconds_total{_labels(endpoint=endpoint)} {values['seconds']:.6f}")
+
+    for name, series in sorted(totals['counters'].items()):
+        lines.append(f"# HELP {name} {COUNTER_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for label_key, value in sorted(series.items()):
+            labels = json.loads(label_key)
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    lines += [
+        "# HELP clinic_http_requests_in_flight Requests currently being served",
+        "# TYPE clinic_http_requests_in_flight gauge",
+        f"clinic_http_requests_in_flight {totals['in_flight']}",
+        "# HELP clinic_workers Worker processes reporting metrics",
+        "# TYPE clinic_workers gauge",
+        f"clinic_workers {live_workers}"
+    ]
+    return '\n'.join(lines) + '\n'
+
+# ==========================================
+# FLASK MIDDLEWARE
+# ==========================================
+
+def _on_query(sql: str, duration: float, rows: int, parameters=None, connection=None):
+    """Query listener: attribute statement time to the current request"""
+    stats = g.get('_db_stats') if has_request_context() else None
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += duration
+
+def init_metrics(app: Flask, flush_interval: float = 5.0, token: Optional[str] = None):
+    """Wrap every request with timing/counting hooks and add the /metrics endpoint"""
+    database.add_query_listener(_on_query)
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started = time.perf_counter()
+        g._db_stats = [0, 0.0]
+        g._status = 500
+        with _metrics.lock:
+            _metrics.in_flight += 1
+
+    @app.after_request
+    def _record_status(response):
+        g._status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request(exc):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        query_count, query_seconds = g.pop('_db_stats', [0, 0.0])
+        endpoint = request.endpoint or 'unmatched'
+        status = 500 if exc is not None else g.pop('_status', 500)
+
+        with _metrics.lock:
+            _metrics.in_flight -= 1
+        _metrics.observe_request(endpoint, request.method, status, duration, query_count, query_seconds)
+        flush_metrics(interval=flush_interval)
+
+    def metrics_endpoint():
+        """Prometheus scrape endpoint aggregated across all workers"""
+        if token:
+            supplied = request.headers.get('Authorization', '').replace('Bearer ', '', 1) or request.args.get('token')
+            if not hmac.compare_digest(supplied or '', token):
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    # Without a scrape token the counters are for signed-in staff only
+    app.add_url_rule('/metrics', 'metrics_endpoint', metrics_endpoint if token else login_required(metrics_endpoint))
@@ -0,0 +1,233 @@
+"""
+On-demand request profiler for Ayurvedic Clinic Management System
+Profiles selected requests with cProfile plus a stack sampler and stores the results for admins
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import Flask, g, request, session
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stored profiles: <id>.json (summary + folded stacks) and <id>.prof (raw pstats)
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'profiles')
+
+# Oldest profiles are removed beyond this many
+MAX_STORED_PROFILES = 50
+
+# Functions kept in the per-function summary
+SUMMARY_LIMIT = 60
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_FLAG = '_profile'
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}_[0-9]{6}_[0-9a-f]{8}$')
+
+# Endpoints never profiled (the profile pages themselves and static files)
+SKIP_ENDPOINTS = ('static', 'admin_profiles', 'admin_profile_detail', 'admin_profile_download')
+
+class StackSampler(threading.Thread):
+    """Samples one thread's call stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{_short_filename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            # The sampler reports the root first, matching the folded format of flamegraph.pl
+            key = ';'.join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self) -> Dict[str, int]:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+def _short_filename(path: str) -> str:
+    """Trim project / site-packages / stdlib prefixes so frames read like module paths"""
+    marker = 'site-packages' + os.sep
+    if marker in path:
+        path = path.split(marker, 1)[1]
+    elif path.startswith(PROJECT_ROOT):
+        path = path[len(PROJECT_ROOT) + 1:]
+    else:
+        path = os.path.basename(path)
+    return path.replace(os.sep, '/')
+
+class RequestProfile:
+    """cProfile + stack sampler running for the duration of one request"""
+
+    def __init__(self, sample_interval: float, trigger: str):
+        self.trigger = trigger
+        self.profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        import cProfile  # only loaded once a request is actually profiled
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), sample_interval)
+        self.started = time.perf_counter()
+
+    def start(self):
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+        self.stacks = self.sampler.stop()
+
+def _function_summary(profiler, limit: int = SUMMARY_LIMIT) -> List[Dict]:
+    """Per-function rows (calls, own time, cumulative time) ordered by cumulative time"""
+    import pstats
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{_short_filename(filename)}:{line}({name})" if line else name,
+            'calls': ncalls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3)
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+def save_profile(profile: RequestProfile, metadata: Dict) -> Optional[str]:
+    """Write a finished profile to PROFILE_DIR and prune old ones; returns the profile id"""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, profile.profile_id)
+        profile.profiler.dump_stats(base + '.prof')
+        record = dict(metadata)
+        record.update({
+            'id': profile.profile_id,
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(profile.duration * 1000, 2),
+            'samples': profile.sampler.samples,
+            'summary': _function_summary(profile.profiler),
+            'folded': profile.stacks
+        })
+        with open(base + '.json', 'w') as f:
+            json.dump(record, f)
+        _prune_profiles()
+        return profile.profile_id
+    except Exception as e:
+        print(f"Error saving request profile: {str(e)}")
+        return None
+
+def _prune_profiles():
+    names = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for profile_id in names[:-MAX_STORED_PROFILES]:
+        for extension in ('.json', '.prof'):
+            path = os.path.join(PROFILE_DIR, profile_id + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_profiles() -> List[Dict]:
+    """Stored profiles, newest first (metadata only)"""
+    profiles = []
+    if not os.path.isdir(PROFILE_DIR):
+        return profiles
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        record.pop('summary', None)
+        record.pop('folded', None)
+        profiles.append(record)
+    return profiles
+
+def get_profile(profile_id: str) -> Optional[Dict]:
+    """Load one stored profile, or None if the id is unknown/invalid"""
+    if not PROFILE_ID_PATTERN.match(profile_id or ''):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + '.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def get_profile_path(profile_id: str, extension: str) -> Optional[str]:
+    """Path of a stored raw profile file (.prof), or None"""
+    if not PROFILE_ID_PATTERN.match(profile_id or ''):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + extension)
+    return path if os.path.exists(path) else None
+
+def folded_stacks_text(profile: Dict) -> str:
+    """Folded stacks in the text format read by flamegraph.pl and speedscope"""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(profile.get('folded', {}).items()))
+
+def top_stacks(profile: Dict, limit: int = 15) -> List[Dict]:
+    """Most frequently sampled stacks, for the admin page"""
+    total = sum(profile.get('folded', {}).values()) or 1
+    stacks = sorted(profile.get('folded', {}).items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'frames': stack.split(';'), 'samples': count, 'percent': round(count * 100 / total, 1)}
+            for stack, count in stacks]
+
+def _profiling_requested() -> bool:
+    """Explicit opt-in: a logged-in user sending the header or query flag"""
+    if 'logged_in' not in session:
+        return False
+    return request.headers.get(PROFILE_HEADER) == '1' or request.args.get(PROFILE_QUERY_FLAG) == '1'
+
+def init_profiler(app: Flask, sample_rate: float = 0.0, sample_interval_ms: float = 5.0):
+    """Profile requests on demand (header / query flag) and a random fraction of all requests"""
+
+    @app.before_request
+    def _start_profile():
+        if request.endpoint in SKIP_ENDPOINTS:
+            return
+        if _profiling_requested():
+            trigger = 'requested'
+        elif sample_rate > 0 and random.random() < sample_rate:
+            trigger = 'sampled'
+        else:
+            return
+        g._profile = RequestProfile(sample_interval_ms / 1000.0, trigger)
+        g._profile.start()
+
+    @app.after_request
+    def _tag_profile(response):
+        profile = g.get('_profile')
+        if profile is not None:
+            g._profile_status = response.status_code
+            response.headers['X-Profile-Id'] = profile.profile_id
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        profile.stop()
+        save_profile(profile, {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint or 'unmatched',
+            'status': 500 if exc is not None else g.pop('_profile_status', 500),
+            'trigger': profile.trigger
+        })
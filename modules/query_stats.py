@@ -0,0 +1,138 @@
+"""
+Query statistics for Ayurvedic Clinic Management System
+Aggregates database statements by fingerprint and logs slow queries with their query plan
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from modules import database
+
+logger = logging.getLogger('clinic.slow_query')
+
+# Statements slower than this (seconds) are logged with EXPLAIN QUERY PLAN
+SLOW_QUERY_THRESHOLD = 0.1
+
+# Distinct fingerprints tracked per worker; anything beyond is counted under OTHER_FINGERPRINT
+MAX_FINGERPRINTS = 500
+OTHER_FINGERPRINT = '<other statements>'
+
+# Fingerprinting: literals become ?, whitespace collapses, IN lists shrink to one placeholder
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL_PATTERN = re.compile(r'\b\d+(?:\.\d+)?\b')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+IN_LIST_PATTERN = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+
+_lock = threading.Lock()
+_stats = {}  # fingerprint -> {'calls', 'total_seconds', 'max_seconds', 'rows', 'slow_calls'}
+
+def fingerprint_sql(sql: str) -> str:
+    """Normalize a statement so calls differing only in literal values group together"""
+    normalized = STRING_LITERAL_PATTERN.sub('?', sql)
+    normalized = NUMBER_LITERAL_PATTERN.sub('?', normalized)
+    normalized = WHITESPACE_PATTERN.sub(' ', normalized).strip()
+    return IN_LIST_PATTERN.sub('IN (?+)', normalized)
+
+def explain_query_plan(connection, sql: str, parameters=None) -> List[str]:
+    """Return the EXPLAIN QUERY PLAN lines for a statement (empty if it cannot be explained)"""
+    if parameters is None:
+        # executemany(): bind NULLs, the plan does not depend on the values
+        parameters = [None] * sql.count('?')
+    try:
+        # A plain cursor, so the EXPLAIN itself is not reported to the query listeners
+        cursor = connection.cursor(factory=sqlite3.Cursor)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+        plan = [row[3] for row in cursor.fetchall()]
+        cursor.close()
+        return plan
+    except Exception:
+        return []
+
+def describe_parameters(parameters) -> str:
+    """Count and types of bound parameters, never their values"""
+    if parameters is None:
+        return 'executemany'
+    if isinstance(parameters, dict):
+        return f"{len(parameters)} named ({', '.join(sorted(type(value).__name__ for value in parameters.values()))})"
+    if not parameters:
+        return 'none'
+    return f"{len(parameters)} ({', '.join(type(value).__name__ for value in parameters)})"
+
+def record_query(sql: str, duration: float, rows: int, parameters=None, connection=None):
+    """Query listener: aggregate per fingerprint and log statements over the threshold"""
+    fingerprint = fingerprint_sql(sql)
+    slow = duration >= SLOW_QUERY_THRESHOLD
+
+    with _lock:
+        entry = _stats.get(fingerprint)
+        if entry is None:
+            if len(_stats) >= MAX_FINGERPRINTS:
+                fingerprint = OTHER_FINGERPRINT
+                entry = _stats.get(fingerprint)
+            if entry is None:
+                entry = _stats[fingerprint] = {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                               'rows': 0, 'slow_calls': 0}
+        entry['calls'] += 1
+        entry['total_seconds'] += duration
+        entry['max_seconds'] = max(entry['max_seconds'], duration)
+        entry['rows'] += rows
+        entry['slow_calls'] += slow
+
+    if slow:
+        plan = explain_query_plan(connection, sql, parameters) if connection is not None else []
+        # Parameter values are patient data (names, phones, complaints); log only their shape
+        logger.warning("Slow query (%.1f ms, %d rows): %s | params: %s | plan: %s",
+                       duration * 1000, rows, fingerprint, describe_parameters(parameters),
+                       '; '.join(plan) or 'unavailable')
+
+def enable_query_stats(slow_query_ms: Optional[float] = None):
+    """Start recording statement statistics, optionally overriding the slow-query threshold"""
+    global SLOW_QUERY_THRESHOLD
+    if slow_query_ms is not None:
+        SLOW_QUERY_THRESHOLD = slow_query_ms / 1000.0
+    database.add_query_listener(record_query)
+
+def snapshot() -> Dict:
+    """Copy of this worker's statistics (written to the metrics snapshot file)"""
+    with _lock:
+        return {fingerprint: dict(entry) for fingerprint, entry in _stats.items()}
+
+def reset_query_stats():
+    """Clear this worker's statistics"""
+    with _lock:
+        _stats.clear()
+
+def merge_stats(total: Dict, other: Dict):
+    """Add one worker's statistics into a running total"""
+    for fingerprint, entry in other.items():
+        current = total.get(fingerprint)
+        if current is None:
+            total[fingerprint] = dict(entry)
+            continue
+        for field in ('calls', 'total_seconds', 'rows', 'slow_calls'):
+            current[field] = current.get(field, 0) + entry.get(field, 0)
+        current['max_seconds'] = max(current.get('max_seconds', 0.0), entry.get('max_seconds', 0.0))
+
+def get_top_queries(stats: Dict, limit: int = 20, order_by: str = 'total_seconds') -> List[Dict]:
+    """Rank statements by total time (or calls / max_seconds / rows) for the admin page"""
+    ranked = []
+    for fingerprint, entry in stats.items():
+        calls = entry.get('calls', 0)
+        ranked.append({
+            'fingerprint': fingerprint,
+            'calls': calls,
+            'total_ms': round(entry.get('total_seconds', 0.0) * 1000, 2),
+            'mean_ms': round(entry.get('total_seconds', 0.0) * 1000 / calls, 3) if calls else 0,
+            'max_ms': round(entry.get('max_seconds', 0.0) * 1000, 2),
+            'rows': entry.get('rows', 0),
+            'rows_per_call': round(entry.get('rows', 0) / calls, 1) if calls else 0,
+            'slow_calls': entry.get('slow_calls', 0),
+            '_sort': entry.get(order_by, 0)
+        })
+    ranked.sort(key=lambda item: item['_sort'], reverse=True)
+    for item in ranked:
+        del item['_sort']
+    return ranked[:limit]
@@ -0,0 +1,154 @@
+"""
+Rate limiting for Ayurvedic Clinic Management System
+Token buckets per client IP and per session, shared by all gunicorn workers through a small SQLite store
+"""
+
+import math
+import os
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, Response, request, session
+
+from modules import database, metrics
+
+# Bucket store (separate from clinic.db so throttling never waits on clinic writes)
+RATELIMIT_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'ratelimit.db')
+
+# Buckets untouched for this long are full again and can be dropped
+STALE_BUCKET_SECONDS = 24 * 3600
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_limit(limit: str) -> Tuple[int, float]:
+    """Parse "10/minute" or "5/30second" into (burst capacity, period in seconds)"""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*', limit or '')
+    if not match:
+        raise ValueError(f"Invalid rate limit '{limit}', expected e.g. '10/minute'")
+    count, multiplier, unit = match.groups()
+    return int(count), PERIODS[unit] * int(multiplier or 1)
+
+def parse_rule(rule: str) -> Tuple[Optional[str], str]:
+    """Split a rule key "POST login" into (method, endpoint); a bare endpoint matches every method"""
+    parts = rule.split()
+    if len(parts) == 2:
+        return parts[0].upper(), parts[1]
+    return None, rule.strip()
+
+def init_ratelimit_store() -> Tuple[bool, str]:
+    """Create the buckets table if needed"""
+    try:
+        os.makedirs(os.path.dirname(RATELIMIT_DB), exist_ok=True)
+        conn = database.get_connection(RATELIMIT_DB)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                bucket_key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+        return True, "Rate limit store ready"
+    except Exception as e:
+        return False, f"Error initializing rate limit store: {str(e)}"
+
+def take_token(bucket_keys: List[str], capacity: int, period: float) -> Tuple[bool, float]:
+    """
+    Take one token from every bucket, or from none if any of them is empty
+    Returns: (allowed, seconds until a token is available)
+    Errors fail open so a broken store never locks staff out
+    """
+    now = time.time()
+    refill_rate = capacity / period
+    try:
+        conn = database.get_connection(RATELIMIT_DB)
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        # IMMEDIATE takes the write lock up front so concurrent workers cannot both spend the last token
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ', '.join('?' for _ in bucket_keys)
+            cursor.execute(f"SELECT bucket_key, tokens, updated FROM buckets WHERE bucket_key IN ({placeholders})",
+                           bucket_keys)
+            stored = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+            levels = {}
+            for key in bucket_keys:
+                tokens, updated = stored.get(key, (capacity, now))
+                levels[key] = min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+
+            lowest = min(levels.values())
+            allowed = lowest >= 1
+            if allowed:
+                cursor.executemany('''
+                    INSERT INTO buckets (bucket_key, tokens, updated) VALUES (?, ?, ?)
+                    ON CONFLICT(bucket_key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+                ''', [(key, level - 1, now) for key, level in levels.items()])
+            if random.random() < 0.01:
+                cursor.execute("DELETE FROM buckets WHERE updated < ?", (now - STALE_BUCKET_SECONDS,))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Error checking rate limit: {str(e)}")
+        return True, 0.0
+
+    return allowed, 0.0 if allowed else (1 - lowest) / refill_rate
+
+def reset_rate_limits() -> None:
+    """Empty every bucket (e.g. after a false alarm)"""
+    try:
+        conn = database.get_connection(RATELIMIT_DB)
+        with conn:
+            conn.execute("DELETE FROM buckets")
+        conn.close()
+    except Exception as e:
+        print(f"Error resetting rate limits: {str(e)}")
+
+def _client_buckets(rule: str) -> List[str]:
+    keys = [f"{rule}|ip:{request.remote_addr or 'unknown'}"]
+    session_key = getattr(session, 'key', None)
+    if session_key:
+        keys.append(f"{rule}|session:{session_key}")
+    return keys
+
+def init_rate_limits(app: Flask, limits: Dict[str, str]):
+    """
+    Throttle the endpoints listed in limits, e.g. {'POST login': '10/minute', 'add_visit_route': '30/minute'}
+    Requests over the limit get 429 with Retry-After and are counted on /metrics
+    """
+    rules = {}
+    for rule, limit in limits.items():
+        if not limit:
+            continue
+        method, endpoint = parse_rule(rule)
+        rules.setdefault(endpoint, []).append((method, rule, *parse_limit(limit)))
+    if not rules:
+        return
+
+    success, message = init_ratelimit_store()
+    if not success:
+        print(message)
+        return
+
+    @app.before_request
+    def _apply_rate_limits():
+        for method, rule, capacity, period in rules.get(request.endpoint, ()):
+            if method and method != request.method:
+                continue
+            allowed, retry_after = take_token(_client_buckets(rule), capacity, period)
+            metrics.increment_counter('clinic_rate_limit_checks_total', {'rule': rule},
+                                      help_text='Requests checked against a rate limit')
+            if not allowed:
+                metrics.increment_counter('clinic_rate_limited_total', {'rule': rule},
+                                          help_text='Requests rejected with 429 by the rate limiter')
+                wait = max(1, math.ceil(retry_after))
+                return Response(f"Too many requests. Please wait {wait} seconds and try again.\n",
+                                status=429, mimetype='text/plain', headers={'Retry-After': str(wait)})
@@ -0,0 +1,343 @@
+"""
+Server-side sessions for Ayurvedic Clinic Management System
+Session data lives in a local SQLite store; the cookie only carries an opaque token. Each worker keeps
+decoded session data in an LRU and checks it against the row's version on every request
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, request
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from modules import database
+
+# Session store (kept apart from clinic.db so backups and restores never touch logins)
+SESSIONS_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'sessions.db')
+
+# Sliding expiry is only written back once this much of the lifetime has passed, not on every request
+REFRESH_FRACTION = 0.1
+
+def session_key(token: str) -> str:
+    """Store key for a cookie token; only the hash is stored, so the sessions table cannot be replayed"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its store key and whether it changed during the request"""
+
+    def __init__(self, initial=None, token: Optional[str] = None, expires: float = 0.0):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.token = token
+        self.key = session_key(token) if token else None
+        self.expires = expires
+        self.modified = False
+        self.regenerate = False
+
+class SessionCache:
+    """
+    Thread-safe LRU of session key -> (data, version)
+    Only valid together with a store read: an entry is used when the row still has that version
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key: str, version: int) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] != version:
+                # Written by another worker since we cached it
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, data: Dict, version: int):
+        with self.lock:
+            self.entries[key] = (data, version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+_cache = SessionCache()
+
+# ==========================================
+# SESSION STORE
+# ==========================================
+
+def init_session_store() -> Tuple[bool, str]:
+    """Create the sessions table if needed"""
+    try:
+        os.makedirs(os.path.dirname(SESSIONS_DB), exist_ok=True)
+        conn = database.get_connection(SESSIONS_DB)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                user_id TEXT,
+                created REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                expires REAL NOT NULL,
+                ip_address TEXT,
+                user_agent TEXT
+            )
+        ''')
+        # Bumped on every data write, so a worker can tell whether its cached copy is current
+        if 'version' not in [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]:
+            conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)")
+        conn.commit()
+        conn.close()
+        return True, "Session store ready"
+    except Exception as e:
+        return False, f"Error initializing session store: {str(e)}"
+
+def load_session(key: str) -> Optional[Tuple[Dict, float]]:
+    """
+    Session data and expiry for an id; None when missing, expired or revoked (in any worker)
+    Always checks the store: a primary-key read of version and expiry, plus the data itself only
+    when this worker's cached copy is missing or out of date
+    """
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        row = conn.execute("SELECT version, expires FROM sessions WHERE session_key = ? AND expires > ?",
+                           (key, time.time())).fetchone()
+        if row is None:
+            conn.close()
+            _cache.discard(key)
+            return None
+        version, expires = row
+        data = _cache.get(key, version)
+        if data is None:
+            row = conn.execute("SELECT data, version FROM sessions WHERE session_key = ?", (key,)).fetchone()
+            if row is not None:
+                data, version = json.loads(row[0]), row[1]
+                _cache.put(key, data, version)
+        conn.close()
+    except Exception as e:
+        print(f"Error loading session: {str(e)}")
+        return None
+    if data is None:
+        return None
+    # Callers get their own copy; the cached one must not change under other requests
+    return dict(data), expires
+
+def store_session(key: str, data: Dict, expires: float, ip_address: str = None, user_agent: str = None):
+    """Insert or replace a session row and refresh the LRU"""
+    now = time.time()
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        with conn:
+            conn.execute('''
+                INSERT INTO sessions (session_key, data, user_id, created, last_seen, expires, ip_address, user_agent)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(session_key) DO UPDATE SET
+                    data = excluded.data, user_id = excluded.user_id,
+                    last_seen = excluded.last_seen, expires = excluded.expires, version = version + 1
+            ''', (key, json.dumps(data), data.get('user_mobile'), now, now, expires, ip_address,
+                  (user_agent or '')[:200]))
+            version = conn.execute("SELECT version FROM sessions WHERE session_key = ?", (key,)).fetchone()[0]
+        conn.close()
+        _cache.put(key, dict(data), version)
+    except Exception as e:
+        print(f"Error saving session: {str(e)}")
+
+def touch_session(key: str, expires: float):
+    """Extend a session's expiry without rewriting its data"""
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        with conn:
+            conn.execute("UPDATE sessions SET last_seen = ?, expires = ? WHERE session_key = ?",
+                         (time.time(), expires, key))
+        conn.close()
+    except Exception as e:
+        print(f"Error refreshing session: {str(e)}")
+
+def revoke_session(key: str) -> bool:
+    """Delete one session; every worker sees it gone on the next request"""
+    _cache.discard(key)
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        with conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE session_key = ?", (key,)).rowcount
+        conn.close()
+        return deleted > 0
+    except Exception as e:
+        print(f"Error revoking session: {str(e)}")
+        return False
+
+def revoke_user_sessions(user_id: str, keep_key: str = None) -> int:
+    """Delete every session of a user (optionally keeping the current one); returns how many"""
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        with conn:
+            keys = [row[0] for row in conn.execute(
+                "SELECT session_key FROM sessions WHERE user_id = ? AND session_key != ?",
+                (user_id, keep_key or ''))]
+            conn.executemany("DELETE FROM sessions WHERE session_key = ?", [(key,) for key in keys])
+        conn.close()
+        for key in keys:
+            _cache.discard(key)
+        return len(keys)
+    except Exception as e:
+        print(f"Error revoking user sessions: {str(e)}")
+        return 0
+
+def sweep_expired_sessions() -> int:
+    """Delete expired sessions; returns how many were removed"""
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        with conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),)).rowcount
+        conn.close()
+        return deleted
+    except Exception as e:
+        print(f"Error sweeping sessions: {str(e)}")
+        return 0
+
+def _format_timestamp(ts: float) -> str:
+    return time.strftime('%d/%m/%Y %H:%M', time.localtime(ts))
+
+def list_active_sessions() -> List[Dict]:
+    """Signed-in sessions that have not expired, most recently used first"""
+    try:
+        conn = database.get_connection(SESSIONS_DB)
+        rows = conn.execute('''
+            SELECT session_key, user_id, created, last_seen, expires, ip_address, user_agent
+            FROM sessions
+            WHERE expires > ? AND user_id IS NOT NULL
+            ORDER BY last_seen DESC
+        ''', (time.time(),)).fetchall()
+        conn.close()
+    except Exception as e:
+        print(f"Error listing sessions: {str(e)}")
+        return []
+
+    return [{
+        'session_key': row[0],
+        'user_id': row[1],
+        'created': _format_timestamp(row[2]),
+        'last_seen': _format_timestamp(row[3]),
+        'expires': _format_timestamp(row[4]),
+        'ip_address': row[5] or '',
+        'user_agent': row[6] or ''
+    } for row in rows]
+
+# ==========================================
+# FLASK INTEGRATION
+# ==========================================
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing data server-side; the cookie holds only a random token"""
+
+    def __init__(self, lifetime: timedelta):
+        self.lifetime = lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            loaded = load_session(session_key(token))
+            if loaded is not None:
+                data, expires = loaded
+                return ServerSession(data, token=token, expires=expires)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            # Cleared (logout) or never used: forget it server-side and drop the cookie
+            if session.key:
+                revoke_session(session.key)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        expires = now + self.lifetime
+        if session.key is None or session.regenerate:
+            if session.key:
+                revoke_session(session.key)
+            session.token = secrets.token_urlsafe(32)
+            session.key = session_key(session.token)
+            session.modified = True
+
+        if session.modified:
+            store_session(session.key, dict(session), expires, request.remote_addr,
+                          request.headers.get('User-Agent'))
+        elif session.expires - now < self.lifetime * (1 - REFRESH_FRACTION):
+            touch_session(session.key, expires)
+        else:
+            return
+
+        response.vary.add('Cookie')
+        response.set_cookie(name, session.token, expires=expires, domain=domain, path=path,
+                            httponly=self.get_cookie_httponly(app), secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+def regenerate_session(session: SessionMixin):
+    """Issue a fresh session token at the end of this request (call on login to prevent fixation)"""
+    if isinstance(session, ServerSession):
+        session.regenerate = True
+        session.modified = True
+
+def _sweep_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        sweep_expired_sessions()
+
+_sweeper = None
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+def _ensure_sweeper(interval: float):
+    """Start the expiry sweeper in this process (threads do not survive a gunicorn fork)"""
+    global _sweeper, _sweeper_pid
+    if _sweeper_pid == os.getpid() and _sweeper.is_alive():
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid() and _sweeper.is_alive():
+            return
+        _sweeper = threading.Thread(target=_sweep_loop, args=(interval,), name='session-sweeper', daemon=True)
+        _sweeper.start()
+        _sweeper_pid = os.getpid()
+
+def init_sessions(app: Flask, lifetime_hours: float = 12, cache_size: int = 1024,
+                  sweep_interval: float = 600):
+    """Replace the cookie session with the server-side store and start the expiry sweeper"""
+    success, message = init_session_store()
+    if not success:
+        print(message)
+        return
+
+    _cache.max_entries = cache_size
+    app.session_interface = ServerSessionInterface(timedelta(hours=lifetime_hours))
+
+    @app.before_request
+    def _start_session_sweeper():
+        _ensure_sweeper(sweep_interval)
@@ -5,7 +5,20 @@ Provides comprehensive data validation functions
 
 import re
 from typing import Dict, List, Tuple, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+
+# Precompiled patterns shared by the single-record and batch validators
+NAME_PATTERN = re.compile(r"^[a-zA-Z\s.',-]+$")
+BP_PATTERN = re.compile(r'^(\d{2,3})/(\d{2,3})$')
+NON_DIGIT_PATTERN = re.compile(r'[^\d]')
+UNSAFE_CHARS_PATTERN = re.compile(r'[<>"]')
+
+VALID_GENDERS = ('male', 'female', 'other')
+
+# Visit and follow-up dates come from date inputs; registration dates may also be typed DD/MM/YYYY
+DATE_FORMAT = '%Y-%m-%d'
+REGISTRATION_DATE_FORMATS = (DATE_FORMAT, '%d/%m/%Y')
+VISIT_TEXT_FIELDS = ('symptoms', 'medicines', 'diet_notes', 'notes')
 
 def validate_patient_data(name: str, age: int, gender: str, phone: str, 
                          weight: Optional[float] = None, conditions: Optional[str] = None) -> Tuple[bool, List[str]]:
@@ -22,7 +35,7 @@ def validate_patient_data(name: str, age: int, gender: str, phone: str,
         errors.append("Patient name must be at least 2 characters long")
     elif len(name.strip()) > 100:
         errors.append("Patient name cannot exceed 100 characters")
-    elif not re.match(r"^[a-zA-Z\s.',-]+$", name.strip()):
+    elif not NAME_PATTERN.match(name.strip()):
         errors.append("Patient name can only contain letters, spaces, and common punctuation")
     
     # Age validation
@@ -36,8 +49,7 @@ def validate_patient_data(name: str, age: int, gender: str, phone: str,
         errors.append("Age cannot exceed 150 years")
     
     # Gender validation
-    valid_genders = ['male', 'female', 'other']
-    if not gender or gender.lower() not in valid_genders:
+    if not gender or gender.lower() not in VALID_GENDERS:
         errors.append("Please select a valid gender (Male, Female, or Other)")
     
     # Phone validation
@@ -45,7 +57,7 @@ def validate_patient_data(name: str, age: int, gender: str, phone: str,
         errors.append("Phone number is required")
     else:
         # Remove all non-digit characters for validation
-        phone_digits = re.sub(r'[^\d]', '', phone.strip())
+        phone_digits = NON_DIGIT_PATTERN.sub('', phone.strip())
         if len(phone_digits) != 10:
             errors.append("Phone number must be exactly 10 digits")
         elif not phone_digits.isdigit():
@@ -83,7 +95,7 @@ def validate_visit_data(visit_date: str, symptoms: Optional[str] = None,
         errors.append("Visit date is required")
     else:
         try:
-            visit_date_obj = datetime.strptime(visit_date, '%Y-%m-%d').date()
+            visit_date_obj = datetime.strptime(visit_date, DATE_FORMAT).date()
             today = date.today()
             
             # Check if date is too far in the future
@@ -111,8 +123,7 @@ def validate_visit_data(visit_date: str, symptoms: Optional[str] = None,
     
     # Blood pressure validation (optional)
     if blood_pressure and blood_pressure.strip():
-        bp_pattern = r'^\d{2,3}/\d{2,3}$'
-        if not re.match(bp_pattern, blood_pressure.strip()):
+        if not BP_PATTERN.match(blood_pressure.strip()):
             errors.append("Blood pressure must be in format: 120/80")
         else:
             try:
@@ -157,6 +168,29 @@ def validate_search_term(search_term: str) -> Tuple[bool, List[str]]:
     
     return len(errors) == 0, errors
 
+def validate_follow_up_date(follow_up_date: str, visit_date: Optional[str] = None) -> Tuple[bool, List[str]]:
+    """
+    Validate a follow-up date (YYYY-MM-DD): after the visit it follows, at most a year ahead
+    Returns: (is_valid: bool, error_messages: List[str])
+    """
+    errors = []
+    
+    try:
+        follow_up = datetime.strptime(follow_up_date, DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return False, ["Invalid follow-up date. Please use a valid date"]
+    
+    try:
+        after = datetime.strptime(visit_date, DATE_FORMAT).date() if visit_date else date.today()
+    except ValueError:
+        after = date.today()
+    if follow_up <= after:
+        errors.append("Follow-up date must be after the visit")
+    elif (follow_up - date.today()).days > 365:
+        errors.append("Follow-up date cannot be more than a year ahead")
+    
+    return len(errors) == 0, errors
+
 def sanitize_input(text: str) -> str:
     """
     Sanitize text input to prevent issues
@@ -168,7 +202,7 @@ def sanitize_input(text: str) -> str:
     text = text.strip()
     
     # Remove any potentially harmful characters (basic XSS prevention)
-    text = re.sub(r'[<>"]', '', text)
+    text = UNSAFE_CHARS_PATTERN.sub('', text)
     
     return text
 
@@ -180,7 +214,7 @@ def format_phone_number(phone: str) -> str:
         return ""
     
     # Remove all non-digit characters
-    phone_digits = re.sub(r'[^\d]', '', phone.strip())
+    phone_digits = NON_DIGIT_PATTERN.sub('', phone.strip())
     
     # Return 10-digit format
     if len(phone_digits) == 10:
@@ -214,4 +248,202 @@ def get_validation_summary(errors: List[str]) -> Dict[str, any]:
         'message': f"Please fix {len(errors)} error{'s' if len(errors) > 1 else ''}:",
         'errors': errors,
         'error_count': len(errors)
-    }
\ No newline at end of file
+    }
+
+# ==========================================
+# BATCH (VECTORIZED) VALIDATION
+# ==========================================
+
+def require_pandas(feature: str = 'Batch validation'):
+    """
+    Import pandas lazily so single-record validation (and modules importing this helper) never pay
+    for it at startup; feature names what needs it in the error
+    """
+    try:
+        import pandas as pd
+        return pd
+    except ImportError:
+        raise ImportError(f"{feature} requires pandas. Install it with: pip install pandas")
+
+def require_numpy(feature: str):
+    """Import NumPy lazily, for features that need arrays but not DataFrames"""
+    try:
+        import numpy as np
+        return np
+    except ImportError:
+        raise ImportError(f"{feature} requires numpy. Install it with: pip install numpy")
+
+def _as_frame(data):
+    """Accept a DataFrame, a dict of column arrays or a list of record dicts"""
+    pd = require_pandas()
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.DataFrame(data)
+
+def _text_column(df, column: str):
+    """Return a stripped string column, or empty strings if the column is missing"""
+    pd = require_pandas()
+    if column not in df.columns:
+        return pd.Series([''] * len(df), index=df.index, dtype=object)
+    values = df[column].astype(object).where(df[column].notna(), '')
+    return values.astype(str).str.strip()
+
+def parse_date_column(values, formats: Tuple[str, ...] = (DATE_FORMAT,)):
+    """Parse date strings in the first matching of formats into datetimes (NaT when invalid)"""
+    pd = require_pandas()
+    parsed = pd.to_datetime(values, format=formats[0], errors='coerce')
+    for date_format in formats[1:]:
+        parsed = parsed.fillna(pd.to_datetime(values, format=date_format, errors='coerce'))
+    return parsed
+
+def collect_row_errors(length: int, checks: List[Tuple]) -> List[List[str]]:
+    """
+    Turn (boolean mask, message) pairs into per-row error lists
+    Only rows that fail a check are touched, so clean batches cost almost nothing
+    """
+    import numpy as np
+
+    row_errors = [[] for _ in range(length)]
+    for mask, message in checks:
+        for position in np.flatnonzero(np.asarray(mask, dtype=bool)):
+            row_errors[position].append(message)
+    return row_errors
+
+def prepare_patient_batch(data) -> Tuple[object, List[List[str]]]:
+    """
+    Normalize and validate many patient records at once
+    Applies the same rules as validate_patient_data using column-wise operations
+    Returns: (normalized DataFrame, per-row error lists)
+    """
+    pd = require_pandas()
+    df = _as_frame(data)
+
+    name = _text_column(df, 'name')
+    gender = _text_column(df, 'gender').str.title()
+    phone_text = _text_column(df, 'phone')
+    phone = phone_text.str.replace(NON_DIGIT_PATTERN, '', regex=True)
+    conditions = _text_column(df, 'conditions')
+    age_text = _text_column(df, 'age')
+    age = pd.to_numeric(age_text, errors='coerce')
+    weight_text = _text_column(df, 'weight')
+    weight = pd.to_numeric(weight_text, errors='coerce')
+    reg_text = _text_column(df, 'registration_date')
+    reg_date = parse_date_column(reg_text, REGISTRATION_DATE_FORMATS)
+
+    name_length = name.str.len()
+    checks = [
+        (name_length == 0, "Patient name is required"),
+        ((name_length > 0) & (name_length < 2), "Patient name must be at least 2 characters long"),
+        (name_length > 100, "Patient name cannot exceed 100 characters"),
+        ((name_length >= 2) & (name_length <= 100) & ~name.str.fullmatch(NAME_PATTERN),
+         "Patient name can only contain letters, spaces, and common punctuation"),
+        (age_text == '', "Patient age is required"),
+        ((age.isna() & (age_text != '')) | (age % 1 > 0), "Age must be a valid number"),
+        (age < 0, "Age cannot be negative"),
+        (age > 150, "Age cannot exceed 150 years"),
+        (~gender.str.lower().isin(VALID_GENDERS), "Please select a valid gender (Male, Female, or Other)"),
+        (phone_text == '', "Phone number is required"),
+        ((phone_text != '') & (phone.str.len() != 10), "Phone number must be exactly 10 digits"),
+        ((phone.str.len() == 10) & phone.str.startswith('0'), "Phone number cannot start with 0"),
+        (weight.isna() & (weight_text != ''), "Weight must be a valid number"),
+        (weight <= 0, "Weight must be greater than 0"),
+        (weight > 500, "Weight cannot exceed 500 kg"),
+        (conditions.str.len() > 500, "Medical conditions description cannot exceed 500 characters"),
+        (reg_date.isna() & (reg_text != ''), "Registration date must be YYYY-MM-DD or DD/MM/YYYY")
+    ]
+
+    normalized = pd.DataFrame({
+        'name': name,
+        'age': age,
+        'gender': gender,
+        'phone': phone,
+        'weight': weight,
+        'conditions': conditions,
+        'registration_date': reg_date.dt.strftime('%Y-%m-%d')
+    })
+    return normalized, collect_row_errors(len(df), checks)
+
+def prepare_visit_batch(data, max_future_days: int = 7,
+                        max_past_days: Optional[int] = 3650) -> Tuple[object, List[List[str]]]:
+    """
+    Normalize and validate many visit records at once
+    Applies the same rules as validate_visit_data; pass max_past_days=None to allow old visits
+    Returns: (normalized DataFrame, per-row error lists)
+    """
+    pd = require_pandas()
+    df = _as_frame(data)
+
+    date_text = _text_column(df, 'visit_date')
+    visit_date = parse_date_column(date_text)
+    weight_text = _text_column(df, 'weight')
+    weight = pd.to_numeric(weight_text, errors='coerce')
+    blood_pressure = _text_column(df, 'blood_pressure')
+    bp_parts = blood_pressure.str.extract(BP_PATTERN).astype(float)
+    systolic, diastolic = bp_parts[0], bp_parts[1]
+
+    today = pd.Timestamp(date.today())
+    checks = [
+        (date_text == '', "Visit date is required"),
+        (visit_date.isna() & (date_text != ''), "Invalid date format. Please use a valid date"),
+        (visit_date > today + timedelta(days=max_future_days),
+         f"Visit date cannot be more than {max_future_days} days in the future"),
+        (weight.isna() & (weight_text != ''), "Weight must be a valid number"),
+        (weight <= 0, "Weight must be greater than 0"),
+        (weight > 500, "Weight cannot exceed 500 kg"),
+        ((blood_pressure != '') & systolic.isna(), "Blood pressure must be in format: 120/80"),
+        ((systolic < 50) | (systolic > 300), "Systolic pressure must be between 50-300"),
+        ((diastolic < 30) | (diastolic > 200), "Diastolic pressure must be between 30-200"),
+        (systolic <= diastolic, "Systolic pressure must be higher than diastolic")
+    ]
+    if max_past_days is not None:
+        checks.append((visit_date < today - timedelta(days=max_past_days),
+                       f"Visit date cannot be more than {max_past_days // 365} years in the past"))
+
+    text_fields = {}
+    for field in VISIT_TEXT_FIELDS:
+        text_fields[field] = _text_column(df, field)
+        label = field.replace('_', ' ').title()
+        checks.append((text_fields[field].str.len() > 1000, f"{label} cannot exceed 1000 characters"))
+
+    normalized = pd.DataFrame({
+        'visit_date': visit_date.dt.strftime('%Y-%m-%d'),
+        'weight': weight,
+        'blood_pressure': blood_pressure,
+        **text_fields
+    })
+    return normalized, collect_row_errors(len(df), checks)
+
+def validate_patient_batch(data) -> List[List[str]]:
+    """
+    Validate many patient records (DataFrame, dict of columns or list of dicts)
+    Returns one error list per row; an empty list means the row is valid
+    """
+    return prepare_patient_batch(data)[1]
+
+def validate_visit_batch(data, max_future_days: int = 7, max_past_days: Optional[int] = 3650) -> List[List[str]]:
+    """
+    Validate many visit records (DataFrame, dict of columns or list of dicts)
+    Returns one error list per row; an empty list means the row is valid
+    """
+    return prepare_visit_batch(data, max_future_days, max_past_days)[1]
+
+def get_batch_validation_summary(row_errors: List[List[str]]) -> Dict[str, any]:
+    """
+    Create a summary of batch validation results for API responses
+    """
+    invalid_rows = [
+        {'row': index, 'errors': errors}
+        for index, errors in enumerate(row_errors) if errors
+    ]
+    error_counts = {}
+    for entry in invalid_rows:
+        for error in entry['errors']:
+            error_counts[error] = error_counts.get(error, 0) + 1
+
+    return {
+        'is_valid': not invalid_rows,
+        'total_rows': len(row_errors),
+        'valid_rows': len(row_errors) - len(invalid_rows),
+        'invalid_rows': invalid_rows,
+        'error_counts': error_counts
+    }
@@ -0,0 +1,76 @@
+"""
+Visit timeline computations for Ayurvedic Clinic Management System
+Loads a patient's visits into a DataFrame once and derives visit numbers, return-visit flags,
+days between visits and weight changes column-wise (shared by the Streamlit and Flask views)
+"""
+
+from typing import Dict, List
+
+from modules.validation import require_pandas
+
+TIMELINE_FIELDS = ('visit_number', 'is_return_visit', 'days_since_previous', 'previous_weight', 'weight_change')
+
+def _as_dict(visit) -> Dict:
+    return visit.to_dict() if hasattr(visit, 'to_dict') else dict(visit)
+
+def build_visit_timeline(visits):
+    """
+    Compute the timeline for visits in get_patient_visits order (newest first)
+    Returns a DataFrame in the same order with the visit columns plus:
+      visit_number         1 for the first visit, counting up
+      is_return_visit      every visit after the first
+      days_since_previous  days since the visit before it (NaN for the first)
+      previous_weight      last weight recorded before this visit (forward-filled over visits without one)
+      weight_change        weight minus previous_weight (NaN when either is missing)
+    """
+    pd = require_pandas('Visit timelines')
+    import numpy as np
+
+    df = pd.DataFrame([_as_dict(visit) for visit in visits])
+    if df.empty:
+        return pd.DataFrame(columns=list(TIMELINE_FIELDS))
+
+    # Oldest first, so "previous" is simply the row above
+    timeline = df.iloc[::-1].reset_index(drop=True)
+
+    dates = pd.to_datetime(timeline['visit_date'], format='%Y-%m-%d', errors='coerce')
+    weights = pd.to_numeric(timeline['weight'], errors='coerce')
+    weights = weights.where(weights != 0)  # 0 means "not recorded", as elsewhere in the app
+
+    timeline['visit_number'] = np.arange(1, len(timeline) + 1)
+    timeline['is_return_visit'] = timeline['visit_number'] > 1
+    timeline['days_since_previous'] = dates.diff().dt.days
+    timeline['previous_weight'] = weights.shift(1).ffill()
+    timeline['weight_change'] = (weights - timeline['previous_weight']).round(1)
+
+    return timeline.iloc[::-1].reset_index(drop=True)
+
+def visit_timeline_records(visits) -> List[Dict]:
+    """
+    Visits as dicts (newest first) with the timeline fields added, ready for templates
+    Missing values are None and day counts are ints
+    """
+    visits = list(visits)
+    if not visits:
+        return []
+
+    timeline = build_visit_timeline(visits)
+    columns = {field: timeline[field].tolist() for field in TIMELINE_FIELDS}
+
+    records = []
+    for position, visit in enumerate(visits):
+        record = _as_dict(visit)
+        for field in TIMELINE_FIELDS:
+            value = columns[field][position]
+            record[field] = None if value != value else value  # NaN -> None
+        if record['days_since_previous'] is not None:
+            record['days_since_previous'] = int(record['days_since_previous'])
+        record['visit_number'] = int(record['visit_number'])
+        record['is_return_visit'] = bool(record['is_return_visit'])
+        records.append(record)
+    return records
+
+def get_visit_timeline(patient_id: int) -> List[Dict]:
+    """A patient's visits (newest first) with timeline fields"""
+    from modules.database import get_patient_visits
+    return visit_timeline_records(get_patient_visits(patient_id))
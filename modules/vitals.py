@@ -0,0 +1,139 @@
+"""
+Vitals charts for Ayurvedic Clinic Management System
+Downsamples a patient's weight/blood pressure series for charts (LTTB or time buckets) and
+computes trend statistics (least-squares slope, moving average)
+"""
+
+from datetime import date
+from typing import Dict
+
+from modules.database import VITAL_METRICS, get_patient_vitals
+from modules.validation import require_numpy
+
+# Charts never need more points than this; long-term patients are downsampled to it
+DEFAULT_MAX_POINTS = 120
+
+DOWNSAMPLE_METHODS = ('lttb', 'bucket')
+
+def lttb_indices(x, y, threshold: int):
+    """
+    Largest-Triangle-Three-Buckets: indices of threshold points that keep the visual shape of (x, y)
+    Always keeps the first and last point; x must be sorted
+    """
+    np = require_numpy('Vitals charts')
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries over the interior points (the first and last point are fixed)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        # Twice the triangle area formed with the previous pick and the next bucket's average
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+def bucket_average(x, y, buckets: int):
+    """Average x and y over equal-width time buckets (empty buckets dropped); returns (x, y) arrays"""
+    np = require_numpy('Vitals charts')
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if buckets >= len(x) or len(x) < 2 or x[0] == x[-1]:
+        return x, y
+    positions = np.minimum(((x - x[0]) / (x[-1] - x[0]) * buckets).astype(int), buckets - 1)
+    counts = np.bincount(positions, minlength=buckets)
+    filled = counts > 0
+    sum_x = np.bincount(positions, weights=x, minlength=buckets)
+    sum_y = np.bincount(positions, weights=y, minlength=buckets)
+    return sum_x[filled] / counts[filled], sum_y[filled] / counts[filled]
+
+def moving_average(y, window: int):
+    """Trailing mean over the last window readings (fewer at the start)"""
+    np = require_numpy('Vitals charts')
+    y = np.asarray(y, dtype=float)
+    if window <= 1 or len(y) == 0:
+        return y
+    totals = np.cumsum(np.insert(y, 0, 0.0))
+    upper = np.arange(1, len(y) + 1)
+    lower = np.maximum(upper - window, 0)
+    return (totals[upper] - totals[lower]) / (upper - lower)
+
+def trend_statistics(days, values) -> Dict:
+    """Summary of a series measured on day numbers: counts, range, change and least-squares slope"""
+    np = require_numpy('Vitals charts')
+    days = np.asarray(days, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {'count': 0}
+    stats = {
+        'count': int(len(values)),
+        'first': round(float(values[0]), 2),
+        'last': round(float(values[-1]), 2),
+        'min': round(float(values.min()), 2),
+        'max': round(float(values.max()), 2),
+        'mean': round(float(values.mean()), 2),
+        'change': round(float(values[-1] - values[0]), 2),
+        'span_days': int(days[-1] - days[0]),
+        'slope_per_30_days': None
+    }
+    if len(values) >= 2 and days[-1] > days[0]:
+        slope = np.polyfit(days - days[0], values, 1)[0]
+        stats['slope_per_30_days'] = round(float(slope) * 30, 2)
+    return stats
+
+def get_vitals_series(patient_id: int, metric: str = 'weight', max_points: int = DEFAULT_MAX_POINTS,
+                      method: str = 'lttb', window: int = 3, start_date: str = None,
+                      end_date: str = None) -> Dict:
+    """
+    Chart-ready series of one vital: at most max_points points (LTTB keeps peaks and dips, 'bucket'
+    averages equal time slices), a moving average over the plotted points and trend statistics over
+    every reading
+    """
+    if metric not in VITAL_METRICS:
+        raise ValueError(f"Unknown vital '{metric}'")
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'")
+
+    np = require_numpy('Vitals charts')
+    readings = []
+    for reading in get_patient_vitals(patient_id, metric, start_date, end_date):
+        try:
+            readings.append((date.fromisoformat(reading['date'][:10]).toordinal(), reading['value']))
+        except ValueError:
+            continue  # visit dates that are not YYYY-MM-DD cannot be placed on the time axis
+    days = np.array([day for day, _ in readings], dtype=float)
+    values = np.array([value for _, value in readings], dtype=float)
+
+    if method == 'lttb':
+        keep = lttb_indices(days, values, max_points)
+        plot_days, plot_values = days[keep], values[keep]
+    else:
+        plot_days, plot_values = bucket_average(days, values, max_points)
+
+    return {
+        'metric': metric,
+        'method': method,
+        'readings': len(readings),
+        'points': [{'date': date.fromordinal(int(round(day))).isoformat(), 'value': round(float(value), 1)}
+                   for day, value in zip(plot_days, plot_values)],
+        'moving_average': [round(float(value), 2) for value in moving_average(plot_values, window)],
+        'stats': trend_statistics(days, values)
+    }
+
+def get_vitals_overview(patient_id: int, max_points: int = DEFAULT_MAX_POINTS) -> Dict[str, Dict]:
+    """get_vitals_series for every metric (weight, systolic, diastolic)"""
+    return {metric: get_vitals_series(patient_id, metric, max_points) for metric in VITAL_METRICS}
@@ -0,0 +1,65 @@
+"""
+Worker warmup for Ayurvedic Clinic Management System
+Does the first-request work (template compilation, database page-in, daily content) ahead of traffic
+Shared steps (templates, pandas) run once in the gunicorn master when the app is preloaded, so the
+forked workers share that memory; per-worker steps run after the fork
+"""
+
+import time
+from typing import Dict
+
+from flask import Flask
+
+def warm_templates(app: Flask) -> int:
+    """Compile every template into the Jinja cache; returns how many were loaded"""
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as e:
+            print(f"Error precompiling template {name}: {str(e)}")
+    return count
+
+def warm_database() -> None:
+    """Run the dashboard queries once so SQLite pages and schema are loaded in this process"""
+    from modules.database import get_database_stats, get_all_patients
+    get_database_stats()
+    get_all_patients()
+
+def warm_daily_content() -> None:
+    """Pick today's health fact and tip (cached per day)"""
+    from modules.health_facts import get_daily_health_fact, get_ayurvedic_tip_of_day
+    get_daily_health_fact()
+    get_ayurvedic_tip_of_day()
+
+def warm_visit_timeline() -> None:
+    """Import pandas for the visit timeline so the first patient page does not pay for it"""
+    from modules.visit_timeline import build_visit_timeline
+    build_visit_timeline([])
+
+def warm_shared(app: Flask) -> Dict[str, float]:
+    """Warm what forked workers can inherit (before the fork); returns milliseconds spent per step"""
+    return _run_steps(app, [('templates', lambda: warm_templates(app)),
+                            ('visit timeline', warm_visit_timeline)])
+
+def warm_worker(app: Flask, include_shared: bool = True) -> Dict[str, float]:
+    """
+    Warm everything a fresh worker needs; returns milliseconds spent per step
+    Pass include_shared=False when warm_shared() already ran in the master
+    """
+    timings = warm_shared(app) if include_shared else {}
+    timings.update(_run_steps(app, [('database', warm_database), ('daily content', warm_daily_content)]))
+    return timings
+
+def _run_steps(app: Flask, steps) -> Dict[str, float]:
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                step()
+        except Exception as e:
+            print(f"Error warming {name}: {str(e)}")
+        timings[name] = (time.perf_counter() - started) * 1000
+    return timings
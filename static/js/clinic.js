@@ -0,0 +1,75 @@
+// Ayurvedic Clinic - shared behaviour for pages extending base.html
+
+// Help modal function
+function showHelp() {
+    var helpModal = new bootstrap.Modal(document.getElementById('helpModal'));
+    helpModal.show();
+}
+
+// Auto-focus search inputs
+document.addEventListener('DOMContentLoaded', function() {
+    const searchInput = document.querySelector('input[name="q"]');
+    if (searchInput) {
+        searchInput.focus();
+    }
+
+    // Focus first empty required field in forms
+    const firstEmptyRequired = document.querySelector('input[required]:not([value]):not([readonly])');
+    if (firstEmptyRequired && !searchInput) {
+        firstEmptyRequired.focus();
+    }
+});
+
+// Auto-hide flash messages after 5 seconds
+document.addEventListener('DOMContentLoaded', function() {
+    const alerts = document.querySelectorAll('.alert:not(.alert-info)');
+    alerts.forEach(function(alert) {
+        if (!alert.querySelector('.btn-close')) {
+            // Add close button if not present
+            const closeBtn = document.createElement('button');
+            closeBtn.type = 'button';
+            closeBtn.className = 'btn-close';
+            closeBtn.setAttribute('data-bs-dismiss', 'alert');
+            closeBtn.setAttribute('aria-label', 'Close');
+            alert.appendChild(closeBtn);
+        }
+
+        // Auto-hide success and error messages after 5 seconds
+        if (alert.classList.contains('alert-success') || alert.classList.contains('alert-error')) {
+            setTimeout(function() {
+                if (alert.parentNode) {
+                    alert.remove();
+                }
+            }, 5000);
+        }
+    });
+});
+
+// Improve form validation feedback
+document.addEventListener('DOMContentLoaded', function() {
+    const forms = document.querySelectorAll('form');
+    forms.forEach(function(form) {
+        form.addEventListener('submit', function(e) {
+            const requiredFields = form.querySelectorAll('input[required], select[required], textarea[required]');
+            let isValid = true;
+
+            requiredFields.forEach(function(field) {
+                if (!field.value.trim()) {
+                    field.classList.add('is-invalid');
+                    isValid = false;
+                } else {
+                    field.classList.remove('is-invalid');
+                }
+            });
+
+            if (!isValid) {
+                e.preventDefault();
+                const firstInvalid = form.querySelector('.is-invalid');
+                if (firstInvalid) {
+                    firstInvalid.focus();
+                    firstInvalid.scrollIntoView({ behavior: 'smooth', block: 'center' });
+                }
+            }
+        });
+    });
+});
@@ -0,0 +1,54 @@
+"""
+Shared fixtures: the Flask app runs against a copy of data/clinic.db in a temporary directory,
+with every other store (sessions, rate limits, metrics, profiles, backups) beside it
+"""
+
+import itertools
+import os
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_phone_numbers = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    from modules import backup, database, metrics, profiler, ratelimit, sessions
+
+    tmp = str(tmp_path_factory.mktemp('clinic'))
+    db_path = os.path.join(tmp, 'clinic.db')
+    shutil.copy(os.path.join(ROOT, 'data', 'clinic.db'), db_path)
+    database.DB_PATH = backup.DB_PATH = db_path
+    backup.BACKUP_DIR = os.path.join(tmp, 'backups')
+    ratelimit.RATELIMIT_DB = os.path.join(tmp, 'ratelimit.db')
+    metrics.METRICS_DIR = os.path.join(tmp, 'metrics')
+    profiler.PROFILE_DIR = os.path.join(tmp, 'profiles')
+    sessions.SESSIONS_DB = os.path.join(tmp, 'sessions.db')
+    database.init_database()
+
+    import flask_app
+    return flask_app.app
+
+@pytest.fixture
+def client(app):
+    """Test client logged in with the development credentials"""
+    from config import Config
+
+    client = app.test_client()
+    response = client.post('/login', data={'mobile': Config.CLINIC_MOBILE, 'pin': Config.CLINIC_PIN})
+    assert response.status_code == 302
+    return client
+
+@pytest.fixture
+def make_patient(app):
+    """Factory adding a patient with a fresh phone number; returns its patient_id"""
+    from modules import database
+
+    def make(name='Test Patient', age=40, gender='Female', **fields):
+        phone = f"8{next(_phone_numbers):09d}"
+        success, message, patient_id = database.add_patient(name, age, gender, phone, **fields)
+        assert success, message
+        return patient_id
+    return make
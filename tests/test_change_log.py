@@ -0,0 +1,113 @@
+"""
+Change-log offset rules the event publisher and the dashboard caches rely on: offsets only move
+forward, a failed batch is delivered again, and pruning never lowers the data version
+"""
+
+import pytest
+
+from modules import database
+
+@pytest.fixture
+def no_consumers(app):
+    """Start without consumers left over from other tests (they hold back pruning)"""
+    conn = database.get_connection()
+    with conn:
+        conn.execute("DELETE FROM change_consumers")
+    conn.close()
+
+def _age_change_log():
+    """Make every logged change old enough for prune_change_log"""
+    conn = database.get_connection()
+    with conn:
+        conn.execute("UPDATE change_log SET changed_at = '2000-01-01 00:00:00'")
+    conn.close()
+
+def test_new_consumer_starts_at_the_latest_change(make_patient):
+    make_patient('Before Registration')
+    assert database.register_change_consumer('starts-late')[0]
+    assert database.get_consumer_offset('starts-late') == database.get_data_version()
+    assert database.read_changes('starts-late') == []
+
+def test_offsets_only_move_forward(make_patient):
+    assert database.register_change_consumer('forward-only')[0]
+    make_patient('Offset One')
+    make_patient('Offset Two')
+    latest = database.get_data_version()
+
+    assert database.acknowledge_changes('forward-only', latest)[0]
+    assert database.acknowledge_changes('forward-only', latest - 1)[0]
+    assert database.get_consumer_offset('forward-only') == latest
+
+    # Registering again keeps the stored offset
+    database.register_change_consumer('forward-only', from_start=True)
+    assert database.get_consumer_offset('forward-only') == latest
+
+def test_unregistered_consumer_is_refused(app):
+    assert not database.acknowledge_changes('never-registered', 1)[0]
+    assert not database.consume_changes('never-registered', lambda changes: None)[0]
+
+def test_failed_batch_is_read_again(make_patient):
+    assert database.register_change_consumer('at-least-once')[0]
+    start = database.get_consumer_offset('at-least-once')
+    make_patient('Batch One')
+    make_patient('Batch Two')
+
+    calls = []
+    def fail_second_batch(changes):
+        calls.append([change['seq'] for change in changes])
+        if len(calls) == 2:
+            raise RuntimeError('handler failed')
+
+    success, message = database.consume_changes('at-least-once', fail_second_batch, batch_size=1,
+                                                tables=['patients'])
+    assert not success and 'handler failed' in message
+    # The first batch was acknowledged, the failed one was not
+    assert database.get_consumer_offset('at-least-once') == calls[0][0]
+
+    received = []
+    assert database.consume_changes('at-least-once', received.extend, tables=['patients'])[0]
+    assert received[0]['seq'] == calls[1][0]
+    assert database.get_consumer_offset('at-least-once') == received[-1]['seq'] > start
+
+def test_prune_keeps_unacknowledged_changes(no_consumers, make_patient):
+    assert database.register_change_consumer('slow-reader')[0]
+    offset = database.get_consumer_offset('slow-reader')
+    make_patient('Not Yet Read')
+    _age_change_log()
+
+    assert database.prune_change_log(keep_days=1)[0]
+    pending = database.read_changes('slow-reader')
+    assert pending and pending[0]['seq'] == offset + 1
+
+def test_consumer_pruned_past_its_offset_is_rejected(no_consumers, make_patient):
+    make_patient('Pruned Away')
+    assert database.register_change_consumer('restored-from-backup')[0]
+    offset = database.get_consumer_offset('restored-from-backup')
+    make_patient('Also Pruned')
+    assert database.acknowledge_changes('restored-from-backup', database.get_data_version())[0]
+    _age_change_log()
+    assert database.prune_change_log(keep_days=1)[0]
+    make_patient('After Prune')
+
+    # An offset from before the prune (e.g. restored from an old backup) cannot be served
+    conn = database.get_connection()
+    with conn:
+        conn.execute("UPDATE change_consumers SET last_seq = ? WHERE consumer = 'restored-from-backup'", (offset,))
+    conn.close()
+
+    handled = []
+    success, message = database.consume_changes('restored-from-backup', handled.append)
+    assert not success and 'behind the change log' in message
+    assert handled == []
+
+def test_prune_keeps_the_data_version(no_consumers, make_patient):
+    make_patient('Version Check')
+    version = database.get_data_version()
+    _age_change_log()
+
+    assert database.prune_change_log(keep_days=1)[0]
+    assert database.get_changes(0) == []
+    assert database.get_data_version() == version
+
+    make_patient('After Empty Log')
+    assert database.get_data_version() > version
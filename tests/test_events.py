@@ -0,0 +1,44 @@
+"""
+Dashboard updates: /api/dashboard polling with ETag/304, and the per-worker cap on event streams
+"""
+
+import pytest
+
+from modules.events import publisher
+
+def test_unchanged_dashboard_is_not_modified(client):
+    first = client.get('/api/dashboard')
+    assert first.status_code == 200
+    assert set(first.get_json()) == {'stats', 'queue'}
+
+    second = client.get('/api/dashboard', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+
+def test_streams_are_off_by_default(client):
+    assert client.get('/api/events').status_code == 404
+
+@pytest.fixture
+def one_stream(app, monkeypatch):
+    import flask_app
+
+    monkeypatch.setattr(flask_app.config, 'EVENT_STREAM_SECONDS', 0.5)
+    monkeypatch.setattr(flask_app.config, 'QUEUE_STREAM_SECONDS', 0.5)
+    monkeypatch.setattr(publisher, 'max_subscribers', 1)
+
+def test_streams_past_the_cap_get_503(client, one_stream):
+    first = client.get('/api/events', buffered=False)
+    assert first.status_code == 200
+    assert first.mimetype == 'text/event-stream'
+
+    for url in ('/api/events', '/api/queue/stream'):
+        refused = client.get(url)
+        assert refused.status_code == 503
+        assert int(refused.headers['Retry-After']) > 0
+
+    # Closing the response frees the slot even though its body was never read
+    first.close()
+    assert publisher.subscriber_count() == 0
+    again = client.get('/api/events')
+    assert again.status_code == 200
+    assert again.get_data(as_text=True).startswith('retry:')
+    assert publisher.subscriber_count() == 0
@@ -0,0 +1,128 @@
+"""
+Merging duplicate patients and undoing it: what moves, which fields change and what comes back
+"""
+
+from datetime import date
+
+import pytest
+
+from modules import database
+
+TODAY = date.today().isoformat()
+
+def _owners(table, visit_ids):
+    """patient_id of every row of table belonging to these visits"""
+    conn = database.get_connection()
+    rows = conn.execute(f"SELECT DISTINCT patient_id FROM {table} WHERE visit_id IN ({', '.join('?' for _ in visit_ids)})",
+                        visit_ids).fetchall()
+    conn.close()
+    return {row[0] for row in rows}
+
+def _visit_ids(patient_id):
+    conn = database.get_connection()
+    rows = conn.execute("SELECT visit_id FROM visits WHERE patient_id = ? ORDER BY visit_id", (patient_id,)).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+def _patient(patient_id):
+    conn = database.get_connection()
+    row = conn.execute("SELECT conditions, weight, created_date, is_deleted FROM patients WHERE patient_id = ?",
+                       (patient_id,)).fetchone()
+    conn.close()
+    return dict(zip(('conditions', 'weight', 'created_date', 'is_deleted'), row))
+
+def _token_owner(token):
+    conn = database.get_connection()
+    row = conn.execute("SELECT patient_id FROM queue_entries WHERE queue_date = ? AND token = ?", (TODAY, token)).fetchone()
+    conn.close()
+    return row[0]
+
+@pytest.fixture
+def duplicates(make_patient):
+    """A kept record and two duplicates, each duplicate with a visit (terms and vitals) and one in the queue"""
+    keep = make_patient('Asha Kumari', conditions='Vata imbalance', registration_date='2024-03-01')
+    first = make_patient('Asha K', conditions='Acidity', registration_date='2023-06-15')
+    second = make_patient('Asha Kumari', conditions='acidity, Insomnia', registration_date='2024-01-10')
+    assert database.add_visit(first, '2024-07-01', symptoms='Headache', medicines='Brahmi',
+                              weight=61.5, blood_pressure='120/80')[0]
+    assert database.add_visit(second, '2024-08-01', symptoms='Sleeplessness', medicines='Ashwagandha',
+                              weight=62.0, blood_pressure='118/76')[0]
+    success, message, token = database.check_in_patient(second)
+    assert success, message
+    return keep, first, second, token
+
+def test_three_way_merge_and_undo(duplicates):
+    keep, first, second, token = duplicates
+    visits = {first: _visit_ids(first), second: _visit_ids(second)}
+
+    success, message, merge_id = database.merge_patients(keep, [first, second], 'test')
+    assert success, message
+    moved = visits[first] + visits[second]
+    assert set(_visit_ids(keep)) >= set(moved)
+    assert _owners('visit_terms', moved) == {keep}
+    assert _owners('vitals', moved) == {keep}
+    assert _token_owner(token) == keep
+    merged = _patient(keep)
+    assert merged['conditions'] == 'Vata imbalance, Acidity, Insomnia'
+    assert merged['created_date'] == '2023-06-15'
+    assert merged['weight'] == 62.0
+    assert _patient(first)['is_deleted'] == 1 and _patient(second)['is_deleted'] == 1
+
+    # Merged records come back only through undo_merge
+    success, message = database.restore_deleted_patient(first)
+    assert not success and f'undo merge #{merge_id}' in message
+
+    # Edited after the merge: undo must keep this value
+    assert database.update_patient_info(keep, conditions='Vata imbalance (resolved)')[0]
+
+    success, message = database.undo_merge(merge_id, 'test')
+    assert success, message
+    for patient_id, visit_ids in visits.items():
+        assert _visit_ids(patient_id) == visit_ids
+        assert _owners('visit_terms', visit_ids) == {patient_id}
+        assert _owners('vitals', visit_ids) == {patient_id}
+        assert _patient(patient_id)['is_deleted'] == 0
+    assert _token_owner(token) == second
+    restored = _patient(keep)
+    assert restored['created_date'] == '2024-03-01'
+    assert restored['weight'] is None
+    assert restored['conditions'] == 'Vata imbalance (resolved)'
+
+    success, message = database.undo_merge(merge_id, 'test')
+    assert not success and 'already undone' in message
+
+def test_merge_rejects_self_and_missing_ids(make_patient):
+    keep = make_patient('Self Merge')
+    other = make_patient('Other Record')
+    history = len(database.get_merge_history(1000))
+
+    success, message, merge_id = database.merge_patients(keep, [other, keep])
+    assert not success and merge_id is None and 'themselves' in message
+    success, message, _ = database.merge_patients(keep, [other, 99999999])
+    assert not success and '99999999' in message
+    success, message, _ = database.merge_patients(keep, [])
+    assert not success
+
+    assert _patient(other)['is_deleted'] == 0
+    assert len(database.get_merge_history(1000)) == history
+
+def test_undo_unknown_merge(app):
+    success, message = database.undo_merge(99999999)
+    assert not success and 'not found' in message
+
+def test_merge_links_do_not_merge(app, client, make_patient):
+    keep = make_patient('Link Keep')
+    other = make_patient('Link Duplicate')
+    url = f'/merge_patients?keep_id={keep}&duplicate_id={other}'
+
+    anonymous = app.test_client().get(url)
+    assert anonymous.status_code == 302 and '/login' in anonymous.headers['Location']
+    response = client.get(url)
+    assert response.status_code == 302 and '/admin/merges' in response.headers['Location']
+    assert _patient(other)['is_deleted'] == 0
+
+    form = client.get(response.headers['Location'])
+    assert f'value="{keep}"'.encode() in form.data and f'value="{other}"'.encode() in form.data
+
+    client.post('/admin/merges', data={'keep_id': keep, 'duplicate_ids': str(other)})
+    assert _patient(other)['is_deleted'] == 1
@@ -0,0 +1,21 @@
+"""
+/metrics is never public: a bearer token when METRICS_TOKEN is set, otherwise a signed-in session
+"""
+
+from flask import Flask
+
+from modules.metrics import init_metrics
+
+def test_metrics_need_a_session_without_token(app, client):
+    assert app.test_client().get('/metrics').status_code == 302
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+def test_metrics_need_the_token_when_set():
+    token_app = Flask(__name__)
+    init_metrics(token_app, token='scrape-secret')
+    scraper = token_app.test_client()
+    assert scraper.get('/metrics').status_code == 401
+    assert scraper.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert scraper.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
@@ -0,0 +1,62 @@
+"""
+/api/queue answers 304 while the queue is unchanged, whatever encoding its ETag was sent in
+"""
+
+import pytest
+
+from modules import database
+
+@pytest.fixture
+def busy_queue(app):
+    """Enough patients checked in that the queue JSON is over the compression threshold"""
+    conn = database.get_connection()
+    patient_ids = [row[0] for row in conn.execute(
+        "SELECT patient_id FROM patients WHERE is_deleted = 0 OR is_deleted IS NULL LIMIT 10")]
+    conn.close()
+    for patient_id in patient_ids:
+        database.check_in_patient(patient_id, 'Follow-up consultation for the queue ETag test')
+
+def test_unchanged_queue_is_not_modified(client):
+    first = client.get('/api/queue')
+    assert first.status_code == 200
+
+    second = client.get('/api/queue', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+
+def test_compressed_etag_is_not_modified(client, busy_queue):
+    first = client.get('/api/queue', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'].endswith('-gzip"')
+
+    # The browser sends back the ETag it was given, suffix and all
+    second = client.get('/api/queue', headers={'Accept-Encoding': 'gzip',
+                                               'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+
+def test_changed_queue_is_sent_again(client):
+    etag = client.get('/api/queue', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    stale = etag.replace('-gzip"', '9-gzip"') if etag.endswith('-gzip"') else etag.rstrip('"') + '9"'
+    assert client.get('/api/queue', headers={'Accept-Encoding': 'gzip',
+                                             'If-None-Match': stale}).status_code == 200
+
+def test_queue_page_polls_by_default(client):
+    page = client.get('/queue')
+    assert page.status_code == 200
+    assert b'/api/queue' in page.data and b'EventSource(' not in page.data
+    assert client.get('/api/queue/stream').status_code == 404
+
+def test_hard_delete_bumps_only_the_dates_it_touched(make_patient):
+    patient_id = make_patient('Queue Delete')
+    assert database.check_in_patient(patient_id)[0]
+    today = database.get_queue()['date']
+    conn = database.get_connection()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO queue_state (queue_date, last_token, version) VALUES ('2000-01-01', 3, 7)")
+    today_version = database.get_queue_version()
+
+    success, message = database.hard_delete_patient(patient_id, f"DELETE-{patient_id}-PERMANENT")
+    assert success, message
+    assert database.get_queue_version() == today_version + 1
+    assert conn.execute("SELECT version FROM queue_state WHERE queue_date = '2000-01-01'").fetchone()[0] == 7
+    assert conn.execute("SELECT version FROM queue_state WHERE queue_date = ?", (today,)).fetchone()[0] == today_version + 1
+    conn.close()
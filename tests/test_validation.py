@@ -0,0 +1,65 @@
+"""
+Batch validation must accept and reject exactly what the single-record validators do,
+so a file import can never store values the forms would refuse
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from modules.validation import (
+    validate_patient_batch, validate_patient_data, validate_visit_batch, validate_visit_data
+)
+
+TODAY = date.today()
+
+VISITS = [
+    {'visit_date': TODAY.isoformat()},
+    {'visit_date': (TODAY - timedelta(days=30)).isoformat(), 'weight': 62.5, 'blood_pressure': '120/80'},
+    {'visit_date': TODAY.strftime('%d/%m/%Y')},
+    {'visit_date': 'yesterday'},
+    {'visit_date': ''},
+    {'visit_date': (TODAY + timedelta(days=30)).isoformat()},
+    {'visit_date': (TODAY - timedelta(days=4000)).isoformat()},
+    {'visit_date': TODAY.isoformat(), 'blood_pressure': '120 / 80'},
+    {'visit_date': TODAY.isoformat(), 'blood_pressure': '120/ 80'},
+    {'visit_date': TODAY.isoformat(), 'blood_pressure': ' 130/85 '},
+    {'visit_date': TODAY.isoformat(), 'blood_pressure': '80/120'},
+    {'visit_date': TODAY.isoformat(), 'blood_pressure': '1200/80'},
+    {'visit_date': TODAY.isoformat(), 'weight': -3},
+    {'visit_date': TODAY.isoformat(), 'weight': 600},
+    {'visit_date': TODAY.isoformat(), 'symptoms': 'x' * 1001},
+]
+
+PATIENTS = [
+    {'name': 'Asha Rao', 'age': 40, 'gender': 'Female', 'phone': '9876543210'},
+    {'name': 'A', 'age': 40, 'gender': 'Female', 'phone': '9876543210'},
+    {'name': 'Asha <b>', 'age': 40, 'gender': 'Female', 'phone': '9876543210'},
+    {'name': 'Ravi Kumar', 'age': 151, 'gender': 'Male', 'phone': '9876543210'},
+    {'name': 'Ravi Kumar', 'age': 30, 'gender': 'Unknown', 'phone': '9876543210'},
+    {'name': 'Ravi Kumar', 'age': 30, 'gender': 'male', 'phone': '98765-43210'},
+    {'name': 'Ravi Kumar', 'age': 30, 'gender': 'Male', 'phone': '0876543210'},
+    {'name': 'Ravi Kumar', 'age': 30, 'gender': 'Male', 'phone': '98765'},
+    {'name': 'Ravi Kumar', 'age': 30, 'gender': 'Male', 'phone': '9876543210', 'weight': 0},
+    {'name': 'Ravi Kumar', 'age': 30, 'gender': 'Male', 'phone': '9876543210', 'conditions': 'x' * 501},
+]
+
+@pytest.mark.parametrize('visit', VISITS, ids=lambda visit: repr(visit)[:60])
+def test_visit_batch_matches_single_record(visit):
+    _, single_errors = validate_visit_data(
+        visit['visit_date'], visit.get('symptoms'), None, None, visit.get('weight'), visit.get('blood_pressure'), None)
+    batch_errors = validate_visit_batch([visit])[0]
+    assert sorted(batch_errors) == sorted(single_errors)
+
+@pytest.mark.parametrize('patient', PATIENTS, ids=lambda patient: repr(patient)[:60])
+def test_patient_batch_matches_single_record(patient):
+    _, single_errors = validate_patient_data(
+        patient['name'], patient['age'], patient['gender'], patient['phone'],
+        patient.get('weight'), patient.get('conditions'))
+    batch_errors = validate_patient_batch([patient])[0]
+    assert sorted(batch_errors) == sorted(single_errors)
+
+def test_registration_dates_accept_the_form_formats():
+    rows = [{'name': 'Asha Rao', 'age': 40, 'gender': 'Female', 'phone': '9876543210',
+             'registration_date': value} for value in ('2024-05-01', '01/05/2024', '2024/05/01')]
+    assert [bool(errors) for errors in validate_patient_batch(rows)] == [False, False, True]